@@ -5,8 +5,13 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timedelta
 from ..db.supabase import supabase_client
+from ..db.repositories import user_repository
+from .cache import auth_cache
+from ..metrics import AUTH_SECONDS
 from loguru import logger
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -57,27 +62,48 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         raise credentials_exception
     
     try:
-        # Get user from Supabase
-        result = supabase_client.auth.get_user(token)
-        if not result.user:
-            raise credentials_exception
-        
-        # Get user role from database
-        user_data = supabase_client.table("users").select("*").eq("id", result.user.id).execute()
-        if not user_data.data:
-            raise credentials_exception
-        
-        user = user_data.data[0]
-        return User(
-            id=user["id"],
-            email=user["email"],
-            role=user["role"],
-            is_active=user["is_active"]
+        # Resolved users are cached per token until the cache TTL or the token's exp
+        return await auth_cache.get_or_load(
+            token,
+            token_data.user_id,
+            payload.get("exp"),
+            lambda: load_user(token)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting user: {str(e)}")
         raise credentials_exception
 
+async def load_user(token: str) -> User:
+    """Resolve the token's user and role from Supabase"""
+    # Get user from Supabase
+    started = time.perf_counter()
+    try:
+        result = await asyncio.to_thread(supabase_client.auth.get_user, token)
+    except Exception:
+        AUTH_SECONDS.labels("error").observe(time.perf_counter() - started)
+        raise
+    AUTH_SECONDS.labels("ok").observe(time.perf_counter() - started)
+    if not result.user:
+        raise ValueError("Unknown user")
+    
+    # Get user role from database
+    user = await user_repository.get(result.user.id)
+    if not user:
+        raise ValueError("User not found")
+    
+    return User(
+        id=user["id"],
+        email=user["email"],
+        role=user["role"],
+        is_active=user["is_active"]
+    )
+
+def invalidate_user(user_id: str):
+    """Forget cached credentials of a user; call after changing their role or is_active"""
+    auth_cache.invalidate_user(user_id)
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
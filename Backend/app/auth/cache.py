@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple, TypeVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Auth Cache Configuration
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+T = TypeVar("T")
+
+class AuthCache:
+    """Caches resolved users per token for a short TTL, never past the token's exp
+
+    Concurrent first requests with the same token share a single lookup.
+    Each user has a generation, bumped by invalidate_user; a lookup started
+    under an older generation is neither stored nor shared with later
+    callers, so a lookup in flight can't restore a role that was just
+    changed. Invalidation is per process: other workers keep their entries
+    until the TTL expires them.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[str, object, float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        # token key -> (lookup task, generation of its user when it started)
+        self._inflight: Dict[str, Tuple[asyncio.Task, int]] = {}
+        self._generations: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Raw tokens are never kept in memory longer than the request
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            user_id = entry[0]
+            keys = self._by_user.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[user_id]
+
+    def _store(self, key: str, user_id: str, value: object, expires_at: float):
+        self._remove(key)
+        self._entries[key] = (user_id, value, expires_at)
+        self._by_user.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    async def get_or_load(
+        self,
+        token: str,
+        user_id: str,
+        exp: Optional[float],
+        loader: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Return the cached value for a token or load it once for all concurrent callers"""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[2] > time.time():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            self._remove(key)
+
+        generation = self._generations.get(user_id, 0)
+        task, started = self._inflight.get(key, (None, None))
+        if task is not None and started == generation:
+            self.hits += 1
+        else:
+            self.misses += 1
+            # Run the lookup as its own task so a caller cancelled mid-lookup
+            # doesn't cancel it for the others waiting on the same token
+            task = asyncio.ensure_future(self._load(key, user_id, exp, loader, generation))
+            self._inflight[key] = (task, generation)
+            # Mark a failure as retrieved when every waiter was cancelled
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(task)
+
+    async def _load(
+        self,
+        key: str,
+        user_id: str,
+        exp: Optional[float],
+        loader: Callable[[], Awaitable[T]],
+        generation: int
+    ) -> T:
+        try:
+            value = await loader()
+            # Invalidated while loading: the value may predate the change, so serve it only to this lookup's callers
+            if self._generations.get(user_id, 0) == generation:
+                expires_at = time.time() + self.ttl
+                if exp is not None:
+                    expires_at = min(expires_at, exp)
+                self._store(key, user_id, value, expires_at)
+            return value
+        finally:
+            if self._inflight.get(key, (None, None))[1] == generation:
+                del self._inflight[key]
+
+    def invalidate_user(self, user_id: str):
+        """Drop every cached token of a user, e.g. after their role or is_active changes"""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        for key in list(self._by_user.get(user_id, ())):
+            self._remove(key)
+
+    def invalidate_token(self, token: str):
+        self._remove(self._key(token))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+# Initialize the auth cache
+auth_cache = AuthCache()
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import random
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import httpx
+from loguru import logger
+from dotenv import load_dotenv
+from ..metrics import DB_SECONDS
+
+load_dotenv()
+
+# Database Configuration
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "postgrest")  # "postgrest" or "memory"
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "50"))
+DB_MAX_KEEPALIVE = int(os.getenv("DB_MAX_KEEPALIVE", "20"))
+DB_RETRIES = int(os.getenv("DB_RETRIES", "3"))
+DB_RETRY_BACKOFF = float(os.getenv("DB_RETRY_BACKOFF", "0.2"))
+
+# (column, operator, value); operators follow PostgREST: eq, neq, gt, gte, lt, lte, in, is.
+# ("", "or", [[filter, ...], ...]) matches rows meeting every filter of any one group.
+Filter = Tuple[str, str, Any]
+# (column, descending)
+Order = Tuple[str, bool]
+
+class DatabaseError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+def format_value(value: Any) -> str:
+    """Render a filter value the way PostgREST expects it in a query string"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    return str(value)
+
+class Database:
+    """Async data access to PostgREST-style tables; see PostgrestDatabase and InMemoryDatabase"""
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Iterable[Filter] = (),
+        order: Sequence[Order] = (),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> List[dict]:
+        raise NotImplementedError
+
+    async def insert(self, table: str, rows: List[dict], timeout: Optional[float] = None) -> List[dict]:
+        raise NotImplementedError
+
+    async def update(self, table: str, values: dict, filters: Iterable[Filter], timeout: Optional[float] = None) -> List[dict]:
+        raise NotImplementedError
+
+    async def delete(self, table: str, filters: Iterable[Filter], timeout: Optional[float] = None) -> List[dict]:
+        raise NotImplementedError
+
+    async def rpc(self, function: str, params: Optional[dict] = None, timeout: Optional[float] = None) -> Any:
+        raise NotImplementedError
+
+    async def ping(self):
+        """Check that the database answers"""
+        await self.select("users", "id", limit=1)
+
+    async def close(self):
+        pass
+
+class PostgrestDatabase(Database):
+    """PostgREST client over a pooled keep-alive HTTP connection, with per-call timeouts and retries"""
+
+    RETRY_STATUS_CODES = {408, 429, 502, 503, 504}
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        timeout: float = DB_TIMEOUT,
+        max_connections: int = DB_MAX_CONNECTIONS,
+        max_keepalive: int = DB_MAX_KEEPALIVE,
+        retries: int = DB_RETRIES,
+        backoff: float = DB_RETRY_BACKOFF,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self._client = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=30
+            ),
+            transport=transport
+        )
+
+    @staticmethod
+    def _filter_value(operator: str, value: Any, quote: bool = False) -> str:
+        if operator == "in":
+            return f"({','.join(format_value(item) for item in value)})"
+        value = format_value(value)
+        # Values inside or=(...) are quoted so commas and parentheses stay literal
+        return f'"{value}"' if quote and operator != "is" else value
+
+    @classmethod
+    def _or_param(cls, groups: List[List[Filter]]) -> str:
+        conditions = []
+        for group in groups:
+            parts = [f"{column}.{operator}.{cls._filter_value(operator, value, quote=True)}" for column, operator, value in group]
+            conditions.append(parts[0] if len(parts) == 1 else f"and({','.join(parts)})")
+        return f"({','.join(conditions)})"
+
+    @classmethod
+    def _filter_params(cls, filters: Iterable[Filter]) -> List[Tuple[str, str]]:
+        params = []
+        for column, operator, value in filters:
+            if operator == "or":
+                params.append(("or", cls._or_param(value)))
+            else:
+                params.append((column, f"{operator}.{cls._filter_value(operator, value)}"))
+        return params
+
+    async def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """One HTTP round-trip, timed per table or function"""
+        started = time.perf_counter()
+        try:
+            response = await self._client.request(method, path, **kwargs)
+        except httpx.TransportError:
+            DB_SECONDS.labels(method, path.strip("/"), "error").observe(time.perf_counter() - started)
+            raise
+        DB_SECONDS.labels(method, path.strip("/"), response.status_code).observe(time.perf_counter() - started)
+        return response
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[List[Tuple[str, str]]] = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        idempotent: bool = True
+    ) -> Any:
+        """Send a request, retrying transient failures with exponential backoff and jitter"""
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(
+                    method,
+                    path,
+                    params=params,
+                    json=json,
+                    headers=headers,
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+                )
+                if response.status_code in self.RETRY_STATUS_CODES and idempotent and attempt < self.retries:
+                    raise DatabaseError(response.text, response.status_code)
+                if response.status_code >= 400:
+                    raise DatabaseError(f"{method} {path} failed: {response.text}", response.status_code)
+                return response.json() if response.content else None
+            except (httpx.TransportError, DatabaseError) as e:
+                # Writes are only retried when the request never reached the server
+                retryable = isinstance(e, httpx.ConnectError) or (
+                    idempotent and (isinstance(e, httpx.TransportError) or e.status_code in self.RETRY_STATUS_CODES)
+                )
+                if not retryable or attempt >= self.retries:
+                    if isinstance(e, DatabaseError):
+                        raise
+                    raise DatabaseError(f"{method} {path} failed: {str(e)}") from e
+                attempt += 1
+                delay = self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+                logger.warning(f"Retrying {method} {path} in {delay:.2f}s (attempt {attempt}): {str(e)}")
+                await asyncio.sleep(delay)
+
+    async def select(self, table, columns="*", filters=(), order=(), limit=None, offset=None, timeout=None):
+        params = [("select", columns)] + self._filter_params(filters)
+        if order:
+            params.append(("order", ",".join(f"{column}.{'desc' if desc else 'asc'}" for column, desc in order)))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        if offset is not None:
+            params.append(("offset", str(offset)))
+        return await self._request("GET", f"/{table}", params=params, timeout=timeout)
+
+    async def insert(self, table, rows, timeout=None):
+        return await self._request(
+            "POST",
+            f"/{table}",
+            json=rows,
+            headers={"Prefer": "return=representation"},
+            timeout=timeout,
+            idempotent=False
+        )
+
+    async def update(self, table, values, filters, timeout=None):
+        return await self._request(
+            "PATCH",
+            f"/{table}",
+            params=self._filter_params(filters),
+            json=values,
+            headers={"Prefer": "return=representation"},
+            timeout=timeout
+        )
+
+    async def delete(self, table, filters, timeout=None):
+        return await self._request(
+            "DELETE",
+            f"/{table}",
+            params=self._filter_params(filters),
+            headers={"Prefer": "return=representation"},
+            timeout=timeout
+        )
+
+    async def rpc(self, function, params=None, timeout=None):
+        return await self._request("POST", f"/rpc/{function}", json=params or {}, timeout=timeout)
+
+    async def close(self):
+        await self._client.aclose()
+
+def create_database(backend: str = DATABASE_BACKEND) -> Database:
+    """Build the configured database backend"""
+    if backend == "memory":
+        from .memory import InMemoryDatabase
+        logger.warning("Using in-memory database; data is lost on restart")
+        return InMemoryDatabase()
+    if backend != "postgrest":
+        raise ValueError(f"Unknown database backend: {backend}")
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("Supabase URL and Key must be set in environment variables")
+    return PostgrestDatabase(SUPABASE_URL, SUPABASE_KEY)
+
+# Initialize the database
+db = create_database()
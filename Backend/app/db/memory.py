@@ -0,0 +1,122 @@
+import asyncio
+import copy
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from .database import Database, DatabaseError, format_value
+
+def _comparable(value: Any) -> Any:
+    """Compare timestamps as ISO strings, the way they are stored"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _matches(row: dict, column: str, operator: str, value: Any) -> bool:
+    if operator == "or":
+        return any(all(_matches(row, *condition) for condition in group) for group in value)
+    current = row.get(column)
+    if operator == "is":
+        return format_value(current) == format_value(value)
+    if operator == "in":
+        return current in [_comparable(item) for item in value]
+    if current is None:
+        return False
+
+    value = _comparable(value)
+    if isinstance(current, str) and not isinstance(value, str):
+        value = format_value(value)
+    if operator == "eq":
+        return current == value
+    if operator == "neq":
+        return current != value
+    if operator == "gt":
+        return current > value
+    if operator == "gte":
+        return current >= value
+    if operator == "lt":
+        return current < value
+    if operator == "lte":
+        return current <= value
+    raise DatabaseError(f"Unsupported filter operator: {operator}")
+
+class InMemoryDatabase(Database):
+    """In-process stand-in for PostgREST, for tests and benchmarks
+
+    Rows get an id and created_at/updated_at timestamps on insert like the
+    real tables, and RPC functions can be registered as Python callables.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[dict]]] = None):
+        self.tables: Dict[str, List[dict]] = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.functions: Dict[str, Callable[..., Any]] = {}
+        self.calls = 0
+
+    def register_rpc(self, name: str, function: Callable[..., Any]):
+        self.functions[name] = function
+
+    def _rows(self, table: str, filters) -> List[dict]:
+        return [
+            row for row in self.tables.get(table, [])
+            if all(_matches(row, column, operator, value) for column, operator, value in filters)
+        ]
+
+    @staticmethod
+    def _project(row: dict, columns: str) -> dict:
+        if columns.strip() == "*":
+            return copy.deepcopy(row)
+        return {column.strip(): copy.deepcopy(row.get(column.strip())) for column in columns.split(",")}
+
+    async def _tick(self):
+        # Yield to the loop like a network call would
+        self.calls += 1
+        await asyncio.sleep(0)
+
+    async def select(self, table, columns="*", filters=(), order=(), limit=None, offset=None, timeout=None):
+        await self._tick()
+        rows = self._rows(table, list(filters))
+        for column, desc in reversed(list(order)):
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        if offset:
+            rows = rows[offset:]
+        if limit is not None:
+            rows = rows[:limit]
+        return [self._project(row, columns) for row in rows]
+
+    async def insert(self, table, rows, timeout=None):
+        await self._tick()
+        now = datetime.now(timezone.utc).isoformat()
+        rows = [{"id": str(uuid.uuid4()), "created_at": now, "updated_at": now, **copy.deepcopy(row)} for row in rows]
+        # Like a primary key violation in PostgREST: the whole insert fails with 409
+        ids = {row["id"] for row in self.tables.get(table, [])}
+        for row in rows:
+            if row["id"] in ids:
+                raise DatabaseError(f'duplicate key value violates unique constraint "{table}_pkey"', 409)
+            ids.add(row["id"])
+        self.tables.setdefault(table, []).extend(rows)
+        return copy.deepcopy(rows)
+
+    async def update(self, table, values, filters, timeout=None):
+        await self._tick()
+        now = datetime.now(timezone.utc).isoformat()
+        updated = []
+        for row in self._rows(table, list(filters)):
+            row.update(copy.deepcopy(values))
+            row["updated_at"] = now
+            updated.append(copy.deepcopy(row))
+        return updated
+
+    async def delete(self, table, filters, timeout=None):
+        await self._tick()
+        matched = self._rows(table, list(filters))
+        ids = {id(row) for row in matched}
+        self.tables[table] = [row for row in self.tables.get(table, []) if id(row) not in ids]
+        return [copy.deepcopy(row) for row in matched]
+
+    async def rpc(self, function, params=None, timeout=None):
+        await self._tick()
+        if function not in self.functions:
+            raise DatabaseError(f"Function {function} not found", 404)
+        return self.functions[function](self, **(params or {}))
+
+    async def ping(self):
+        await self._tick()
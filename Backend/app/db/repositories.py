@@ -0,0 +1,258 @@
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from loguru import logger
+from .database import Database, DatabaseError, Filter, db
+from ..auth.cache import auth_cache
+
+class IncidentRepository:
+    """Data access for the incidents table"""
+
+    table = "incidents"
+
+    def __init__(self, database: Database):
+        self.db = database
+
+    @staticmethod
+    def window_filters(start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[Filter]:
+        filters = []
+        if start_date:
+            filters.append(("created_at", "gte", start_date))
+        if end_date:
+            filters.append(("created_at", "lte", end_date))
+        return filters
+
+    async def create(self, incident: dict) -> dict:
+        rows = await self.db.insert(self.table, [incident])
+        return rows[0]
+
+    async def create_many(self, incidents: List[dict]) -> List[dict]:
+        """Insert many incidents in a single round-trip"""
+        if not incidents:
+            return []
+        return await self.db.insert(self.table, incidents)
+
+    async def get(self, incident_id: str) -> Optional[dict]:
+        rows = await self.db.select(self.table, filters=[("id", "eq", incident_id)], limit=1)
+        return rows[0] if rows else None
+
+    async def get_many(self, incident_ids: List[str]) -> List[dict]:
+        return await self.db.select(self.table, filters=[("id", "in", incident_ids)])
+
+    async def page(
+        self,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None,
+        filters: List[Filter] = (),
+        columns: str = "*"
+    ) -> List[dict]:
+        """Newest-first page of incidents, continuing after a (created_at, id) keyset"""
+        filters = list(filters)
+        if after is not None:
+            created_at, incident_id = after
+            filters.append(("", "or", [
+                [("created_at", "lt", created_at)],
+                [("created_at", "eq", created_at), ("id", "lt", incident_id)]
+            ]))
+        return await self.db.select(
+            self.table,
+            columns,
+            filters=filters,
+            order=[("created_at", True), ("id", True)],
+            limit=limit
+        )
+
+    async def scan(self, columns: str = "*", page_size: int = 1000, filters: List[Filter] = ()) -> AsyncIterator[List[dict]]:
+        """Yield every matching incident page by page, paginating on id so no page is re-read"""
+        last_id = None
+        while True:
+            keyset = [("id", "gt", last_id)] if last_id is not None else []
+            page = await self.db.select(self.table, columns, filters=[*filters, *keyset], order=[("id", False)], limit=page_size)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last_id = page[-1]["id"]
+
+    async def update(self, incident_id: str, values: dict) -> Optional[dict]:
+        rows = await self.db.update(self.table, values, [("id", "eq", incident_id)])
+        return rows[0] if rows else None
+
+    async def delete(self, incident_id: str) -> Optional[dict]:
+        rows = await self.db.delete(self.table, [("id", "eq", incident_id)])
+        return rows[0] if rows else None
+
+class UserRepository:
+    """Data access for the users table"""
+
+    table = "users"
+
+    def __init__(self, database: Database):
+        self.db = database
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        rows = await self.db.select(self.table, filters=[("id", "eq", user_id)], limit=1)
+        return rows[0] if rows else None
+
+    async def update(self, user_id: str, values: dict) -> Optional[dict]:
+        """Update a user; cached credentials are dropped so role or is_active changes apply at once"""
+        rows = await self.db.update(self.table, values, [("id", "eq", user_id)])
+        auth_cache.invalidate_user(user_id)
+        return rows[0] if rows else None
+
+class MediaRepository:
+    """Data access for content-addressed media (see sql/media.sql)
+
+    media_objects has one row per stored file, keyed by its SHA-256;
+    media_refs has one row per user holding a reference to it. Adding and
+    releasing references go through the add_media_ref and release_media_ref
+    functions, which lock the object row so workers can't delete an object
+    another worker is referencing. Without the functions installed the same
+    steps run as separate requests, safe only within one process.
+    """
+
+    objects_table = "media_objects"
+    refs_table = "media_refs"
+
+    def __init__(self, database: Database):
+        self.db = database
+        self._missing_functions = set()
+
+    async def _rpc(self, function: str, params: dict) -> Tuple[bool, object]:
+        """(True, result) of a database function, or (False, None) when it isn't installed"""
+        if function in self._missing_functions:
+            return False, None
+        try:
+            return True, await self.db.rpc(function, params)
+        except DatabaseError as e:
+            if e.status_code != 404:
+                raise
+            self._missing_functions.add(function)
+            logger.warning(f"Database function {function} not found; media references are only safe within one worker")
+            return False, None
+
+    async def get_object(self, sha256: str) -> Optional[dict]:
+        rows = await self.db.select(self.objects_table, filters=[("sha256", "eq", sha256)], limit=1)
+        return rows[0] if rows else None
+
+    async def create_object(self, media_object: dict) -> dict:
+        rows = await self.db.insert(self.objects_table, [media_object])
+        return rows[0]
+
+    async def update_object(self, sha256: str, values: dict, key: Optional[str] = None) -> Optional[dict]:
+        """Update an object, only while it is still stored under key when given"""
+        filters = [("sha256", "eq", sha256)]
+        if key is not None:
+            filters.append(("key", "eq", key))
+        rows = await self.db.update(self.objects_table, values, filters)
+        return rows[0] if rows else None
+
+    async def delete_object(self, sha256: str) -> Optional[dict]:
+        rows = await self.db.delete(self.objects_table, [("sha256", "eq", sha256)])
+        return rows[0] if rows else None
+
+    async def get_ref(self, user_id: str, sha256: str) -> Optional[dict]:
+        rows = await self.db.select(
+            self.refs_table, filters=[("user_id", "eq", user_id), ("sha256", "eq", sha256)], limit=1
+        )
+        return rows[0] if rows else None
+
+    async def create_ref(self, user_id: str, sha256: str, filename: Optional[str] = None) -> dict:
+        rows = await self.db.insert(self.refs_table, [{"user_id": user_id, "sha256": sha256, "filename": filename}])
+        return rows[0]
+
+    async def delete_ref(self, user_id: str, sha256: str) -> Optional[dict]:
+        rows = await self.db.delete(self.refs_table, [("user_id", "eq", user_id), ("sha256", "eq", sha256)])
+        return rows[0] if rows else None
+
+    async def has_refs(self, sha256: str) -> bool:
+        rows = await self.db.select(self.refs_table, "id", filters=[("sha256", "eq", sha256)], limit=1)
+        return bool(rows)
+
+    async def add_ref(self, user_id: str, sha256: str, filename: Optional[str] = None) -> bool:
+        """Reference a stored object for user_id; False when the object doesn't exist (any more)"""
+        found, added = await self._rpc("add_media_ref", {"p_user_id": user_id, "p_sha256": sha256, "p_filename": filename})
+        if found:
+            return bool(added)
+        if await self.get_object(sha256) is None:
+            return False
+        if await self.get_ref(user_id, sha256) is None:
+            await self.create_ref(user_id, sha256, filename)
+        return True
+
+    async def release_ref(self, user_id: str, sha256: str) -> Tuple[bool, Optional[dict]]:
+        """Drop user_id's reference: (whether it existed, the object row if that was the last reference and it was deleted)"""
+        found, result = await self._rpc("release_media_ref", {"p_user_id": user_id, "p_sha256": sha256})
+        if found:
+            return bool(result["released"]), result.get("object")
+        if await self.delete_ref(user_id, sha256) is None:
+            return False, None
+        if await self.has_refs(sha256):
+            return True, None
+        return True, await self.delete_object(sha256)
+
+class AnalyticsRepository:
+    """Incident aggregates computed by the database (see sql/analytics.sql)
+
+    When the RPC functions are not installed the aggregates are counted
+    here instead, fetching only the columns they need.
+    """
+
+    def __init__(self, database: Database):
+        self.db = database
+        self._missing_functions = set()
+
+    async def _aggregate(self, function: str, params: dict, fallback: Callable[[], Awaitable[List[dict]]]) -> List[dict]:
+        if function not in self._missing_functions:
+            try:
+                return await self.db.rpc(function, params)
+            except DatabaseError as e:
+                if e.status_code != 404:
+                    raise
+                self._missing_functions.add(function)
+                logger.warning(f"Database function {function} not found, aggregating in the API instead")
+        return await fallback()
+
+    async def _columns(self, columns: str, start_date: datetime, end_date: datetime) -> List[dict]:
+        filters = IncidentRepository.window_filters(start_date, end_date)
+        return await self.db.select(IncidentRepository.table, columns, filters=filters)
+
+    async def hourly_counts(self, start_date: datetime, end_date: datetime) -> List[dict]:
+        async def fallback():
+            rows = await self._columns("created_at", start_date, end_date)
+            counts = Counter(datetime.fromisoformat(row["created_at"]).hour for row in rows if row["created_at"])
+            return [{"hour": hour, "count": count} for hour, count in sorted(counts.items())]
+
+        params = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+        return await self._aggregate("incident_counts_by_hour", params, fallback)
+
+    async def severity_counts(self, start_date: datetime, end_date: datetime) -> List[dict]:
+        async def fallback():
+            rows = await self._columns("severity", start_date, end_date)
+            counts = Counter(row["severity"] for row in rows if row["severity"] is not None)
+            return [{"severity": severity, "count": count} for severity, count in sorted(counts.items())]
+
+        params = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+        return await self._aggregate("incident_counts_by_severity", params, fallback)
+
+    async def location_hotspots(self, start_date: datetime, end_date: datetime, limit: int) -> List[dict]:
+        async def fallback():
+            rows = await self._columns("latitude,longitude,location", start_date, end_date)
+            counts = Counter(
+                (row["latitude"], row["longitude"], row["location"]) for row in rows
+                if None not in (row["latitude"], row["longitude"], row["location"])
+            )
+            return [
+                {"latitude": latitude, "longitude": longitude, "location": location, "count": count}
+                for (latitude, longitude, location), count in counts.most_common(limit)
+            ]
+
+        params = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat(), "max_results": limit}
+        return await self._aggregate("incident_location_hotspots", params, fallback)
+
+# Initialize the repositories
+incident_repository = IncidentRepository(db)
+user_repository = UserRepository(db)
+media_repository = MediaRepository(db)
+analytics_repository = AnalyticsRepository(db)
@@ -0,0 +1,42 @@
+-- Aggregation functions for the analytics endpoints, exposed by PostgREST as
+-- /rest/v1/rpc/<name>. Run once in the Supabase SQL editor.
+-- AnalyticsRepository falls back to client-side counting when they are missing.
+
+create index if not exists incidents_created_at_idx on public.incidents (created_at);
+-- Keyset pagination of GET /api/incidents walks (created_at, id) newest first
+create index if not exists incidents_created_at_id_idx on public.incidents (created_at desc, id desc);
+
+create or replace function public.incident_counts_by_hour(start_date timestamptz, end_date timestamptz)
+returns table (hour integer, count bigint)
+language sql stable
+as $$
+    select extract(hour from created_at)::integer as hour, count(*) as count
+    from public.incidents
+    where created_at >= start_date and created_at <= end_date
+    group by 1
+    order by 1;
+$$;
+
+create or replace function public.incident_counts_by_severity(start_date timestamptz, end_date timestamptz)
+returns table (severity text, count bigint)
+language sql stable
+as $$
+    select severity, count(*) as count
+    from public.incidents
+    where created_at >= start_date and created_at <= end_date and severity is not null
+    group by 1
+    order by 1;
+$$;
+
+create or replace function public.incident_location_hotspots(start_date timestamptz, end_date timestamptz, max_results integer)
+returns table (latitude double precision, longitude double precision, location text, count bigint)
+language sql stable
+as $$
+    select latitude, longitude, location, count(*) as count
+    from public.incidents
+    where created_at >= start_date and created_at <= end_date
+        and latitude is not null and longitude is not null and location is not null
+    group by 1, 2, 3
+    order by count desc
+    limit max_results;
+$$;
@@ -0,0 +1,72 @@
+-- Content-addressed media storage. Run once in the Supabase SQL editor.
+-- An object is stored once per SHA-256 however many users upload it, and is
+-- deleted from storage when its last reference is removed.
+
+create table if not exists public.media_objects (
+    sha256 text primary key,
+    key text not null,
+    content_type text not null,
+    size bigint not null,
+    -- derivative name -> storage key, filled in by the background generator
+    derivatives jsonb not null default '{}'::jsonb,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.media_refs (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null,
+    sha256 text not null references public.media_objects (sha256) on delete cascade,
+    filename text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now(),
+    unique (user_id, sha256)
+);
+
+create index if not exists media_refs_sha256_idx on public.media_refs (sha256);
+
+-- Reference and release run in one transaction each and lock the object row,
+-- so an object is never deleted while another API worker is referencing it.
+
+-- Returns false when the object doesn't exist, so the caller stores it again
+create or replace function public.add_media_ref(p_user_id uuid, p_sha256 text, p_filename text)
+returns boolean
+language plpgsql
+as $$
+begin
+    perform 1 from public.media_objects where sha256 = p_sha256 for share;
+    if not found then
+        return false;
+    end if;
+    insert into public.media_refs (user_id, sha256, filename)
+    values (p_user_id, p_sha256, p_filename)
+    on conflict (user_id, sha256) do nothing;
+    return true;
+end;
+$$;
+
+-- Returns {"released": whether the reference existed, "object": the deleted
+-- object row when this was its last reference, otherwise null}
+create or replace function public.release_media_ref(p_user_id uuid, p_sha256 text)
+returns jsonb
+language plpgsql
+as $$
+declare
+    deleted public.media_objects;
+begin
+    -- Waits for concurrent add_media_ref calls, whose references the checks below then see
+    perform 1 from public.media_objects where sha256 = p_sha256 for update;
+    delete from public.media_refs where user_id = p_user_id and sha256 = p_sha256;
+    if not found then
+        return jsonb_build_object('released', false, 'object', null);
+    end if;
+    delete from public.media_objects o
+    where o.sha256 = p_sha256
+        and not exists (select 1 from public.media_refs r where r.sha256 = p_sha256)
+    returning * into deleted;
+    return jsonb_build_object(
+        'released', true,
+        'object', case when deleted.sha256 is null then null else to_jsonb(deleted) end
+    );
+end;
+$$;
@@ -15,11 +15,5 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 # Initialize Supabase client
 supabase_client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# Test connection
-try:
-    # Try to fetch a single row from a table to test the connection
-    result = supabase_client.table("users").select("*").limit(1).execute()
-    logger.info("Successfully connected to Supabase")
-except Exception as e:
-    logger.error(f"Error connecting to Supabase: {str(e)}")
-    raise 
\ No newline at end of file
+# Storage and auth go through this client; table queries use the async
+# Database in database.py, which also checks connectivity at startup
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Metrics Configuration
+# Directory shared by every worker process; when set, /metrics aggregates all workers.
+# It must be emptied before the server starts, not while workers are running.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+METRICS_SYNC_SECONDS = float(os.getenv("METRICS_SYNC_SECONDS", "5"))
+
+# prometheus_client chooses per-process or shared storage on import, by whether the variable is set at all
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+else:
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Seconds; spans sub-millisecond cache hits to slow uploads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+LabelValues = Tuple[str, ...]
+
+def multiprocess_enabled() -> bool:
+    return bool(PROMETHEUS_MULTIPROC_DIR)
+
+class StatsMetric:
+    """A counter or gauge copied from a service's own stats, e.g. cache hit counts
+
+    function returns a number, or {label values: number} for labelled metrics.
+    Counters advance by how much the stat grew since the last sync; gauges
+    are summed over live workers in multiprocess mode.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        function: Callable[[], Union[float, Dict[LabelValues, float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge"
+    ):
+        self.name = name
+        self.function = function
+        self.kind = kind
+        if kind == "counter":
+            self.metric = Counter(name, help, labelnames)
+        else:
+            self.metric = Gauge(name, help, labelnames, multiprocess_mode="livesum")
+        self._last: Dict[LabelValues, float] = {}
+
+    def sync(self):
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            child = self.metric.labels(*labels) if labels else self.metric
+            if self.kind == "counter":
+                last = self._last.get(labels, 0.0)
+                # A stat lower than last time was reset; everything since counts
+                growth = value - last if value >= last else value
+                if growth > 0:
+                    child.inc(growth)
+                self._last[labels] = value
+            else:
+                child.set(value)
+
+class StatsExporter:
+    """Copies service stats into Prometheus metrics at scrape time
+
+    In multiprocess mode a scrape is answered by one worker, so every worker
+    also syncs its stats every METRICS_SYNC_SECONDS while it runs.
+    """
+
+    def __init__(self, interval: float = METRICS_SYNC_SECONDS):
+        self.interval = interval
+        self._metrics: List[StatsMetric] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(
+        self,
+        name: str,
+        help: str,
+        function: Callable[[], Union[float, Dict[LabelValues, float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge"
+    ) -> StatsMetric:
+        metric = StatsMetric(name, help, function, labelnames, kind)
+        self._metrics.append(metric)
+        return metric
+
+    def sync(self):
+        with self._lock:
+            for metric in self._metrics:
+                try:
+                    metric.sync()
+                except Exception as e:
+                    # One broken stats function shouldn't take the whole scrape down
+                    logger.warning(f"Error reading stats for {metric.name}: {str(e)}")
+
+    def render(self) -> bytes:
+        """Prometheus text exposition of every metric, across workers in multiprocess mode"""
+        self.sync()
+        if not multiprocess_enabled():
+            return generate_latest(REGISTRY)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, PROMETHEUS_MULTIPROC_DIR)
+        return generate_latest(registry)
+
+    def start(self):
+        if multiprocess_enabled() and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if multiprocess_enabled():
+            # Drop this worker's live gauges from the aggregate
+            multiprocess.mark_process_dead(os.getpid(), PROMETHEUS_MULTIPROC_DIR)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sync()
+
+# Initialize the stats exporter
+stats_exporter = StatsExporter()
+
+# Metrics recorded from more than one module
+REQUEST_SECONDS = Histogram(
+    "sage_guard_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"),
+    buckets=DEFAULT_BUCKETS
+)
+PREDICT_STAGE_SECONDS = Histogram(
+    "sage_guard_predict_stage_seconds",
+    "Time spent in each stage of accident prediction and incident recording",
+    ("stage",),
+    buckets=DEFAULT_BUCKETS
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "sage_guard_inference_batch_size", "Images per detector forward pass", buckets=BATCH_SIZE_BUCKETS
+)
+AUTH_SECONDS = Histogram(
+    "sage_guard_auth_request_seconds", "Round-trip time of resolving a token's user with Supabase", ("outcome",),
+    buckets=DEFAULT_BUCKETS
+)
+DB_SECONDS = Histogram(
+    "sage_guard_db_request_seconds", "Round-trip time of database requests", ("method", "table", "status"),
+    buckets=DEFAULT_BUCKETS
+)
@@ -0,0 +1,203 @@
+import copy
+import os
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import torch
+import torch.nn as nn
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Inference Backend Configuration
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")  # eager, torchscript, dynamic_int8, static_int8, onnx
+INFERENCE_PARITY_ATOL = float(os.getenv("INFERENCE_PARITY_ATOL", "0.02"))
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "models/accident_detector.onnx")
+# Representative camera images; static_int8 calibrates on them and parity is checked on them
+INFERENCE_CALIBRATION_DIR = os.getenv("INFERENCE_CALIBRATION_DIR", "")
+INFERENCE_CALIBRATION_IMAGES = int(os.getenv("INFERENCE_CALIBRATION_IMAGES", "64"))
+
+class InferenceBackend:
+    """Runs the forward pass of the accident model; subclasses compile it differently
+
+    samples, when given, is a batch of preprocessed real images.
+    """
+
+    name = "eager"
+
+    def __init__(self, model: nn.Module, device: torch.device, example: torch.Tensor, samples: Optional[torch.Tensor] = None):
+        self.model = model
+        self.device = device
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model(batch)
+
+class TorchScriptBackend(InferenceBackend):
+    """Traced, frozen TorchScript graph with inference-only fusions"""
+
+    name = "torchscript"
+
+    def __init__(self, model: nn.Module, device: torch.device, example: torch.Tensor, samples: Optional[torch.Tensor] = None):
+        super().__init__(model, device, example, samples)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+            self.model = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+class DynamicQuantizedBackend(InferenceBackend):
+    """int8 weights for Linear layers, activations quantized on the fly"""
+
+    name = "dynamic_int8"
+
+    def __init__(self, model: nn.Module, device: torch.device, example: torch.Tensor, samples: Optional[torch.Tensor] = None):
+        super().__init__(model, device, example, samples)
+        if device.type != "cpu":
+            raise RuntimeError("Quantized backends only run on CPU")
+        self.model = torch.ao.quantization.quantize_dynamic(
+            copy.deepcopy(model), {nn.Linear}, dtype=torch.qint8
+        )
+
+class StaticQuantizedBackend(InferenceBackend):
+    """Fully int8 model with fused Conv/Linear+ReLU, calibrated on real sample images"""
+
+    name = "static_int8"
+
+    def __init__(
+        self,
+        model: nn.Module,
+        device: torch.device,
+        example: torch.Tensor,
+        samples: Optional[torch.Tensor] = None,
+        calibration_batch_size: int = 8
+    ):
+        super().__init__(model, device, example, samples)
+        if device.type != "cpu":
+            raise RuntimeError("Quantized backends only run on CPU")
+        if samples is None or len(samples) == 0:
+            raise RuntimeError("Static quantization needs calibration images; set INFERENCE_CALIBRATION_DIR")
+        if not isinstance(model, nn.Sequential):
+            raise RuntimeError("Static quantization needs an nn.Sequential model")
+
+        quantized = copy.deepcopy(model).eval()
+        torch.ao.quantization.fuse_modules(quantized, self._fusable_pairs(quantized), inplace=True)
+        quantized = torch.ao.quantization.QuantWrapper(quantized)
+        quantized.qconfig = torch.ao.quantization.get_default_qconfig(torch.backends.quantized.engine)
+        torch.ao.quantization.prepare(quantized, inplace=True)
+
+        # Activation ranges come from the images the model will actually see
+        with torch.no_grad():
+            for batch in samples.split(calibration_batch_size):
+                quantized(batch)
+
+        self.model = torch.ao.quantization.convert(quantized)
+
+    @staticmethod
+    def _fusable_pairs(model: nn.Sequential) -> List[List[str]]:
+        names = list(model._modules.keys())
+        pairs = []
+        for first, second in zip(names, names[1:]):
+            if isinstance(model._modules[first], (nn.Conv2d, nn.Linear)) and isinstance(model._modules[second], nn.ReLU):
+                pairs.append([first, second])
+        return pairs
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """Model exported to ONNX and run by ONNX Runtime with full graph optimization"""
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        model: nn.Module,
+        device: torch.device,
+        example: torch.Tensor,
+        samples: Optional[torch.Tensor] = None,
+        path: str = ONNX_MODEL_PATH
+    ):
+        super().__init__(model, device, example, samples)
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("onnxruntime is not installed")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Export under a per-process name so pool workers don't clobber each other
+        export_path = f"{path}.{os.getpid()}.tmp"
+        torch.onnx.export(
+            model,
+            (example,),
+            export_path,
+            input_names=["input"],
+            output_names=["output"],
+            dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+            dynamo=False
+        )
+        os.replace(export_path, path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = torch.get_num_threads()
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        outputs = self.session.run(["output"], {"input": batch.cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+BACKENDS: Dict[str, Callable[..., InferenceBackend]] = {
+    "eager": InferenceBackend,
+    "torchscript": TorchScriptBackend,
+    "dynamic_int8": DynamicQuantizedBackend,
+    "static_int8": StaticQuantizedBackend,
+    "onnx": OnnxRuntimeBackend
+}
+
+def check_parity(
+    backend: InferenceBackend,
+    reference: nn.Module,
+    example: torch.Tensor,
+    samples: Optional[torch.Tensor] = None,
+    trials: int = 4
+) -> float:
+    """Return the largest absolute output difference between a backend and the eager model
+
+    Compares on the sample images when given, otherwise on normalized random batches.
+    """
+    batches = samples.split(8) if samples is not None and len(samples) else [torch.randn_like(example) for _ in range(trials)]
+    max_error = 0.0
+    with torch.no_grad():
+        for batch in batches:
+            expected = reference(batch).cpu().numpy()
+            actual = backend(batch).cpu().numpy()
+            max_error = max(max_error, float(np.max(np.abs(expected - actual))))
+    return max_error
+
+def create_backend(
+    name: str,
+    model: nn.Module,
+    device: torch.device,
+    example: torch.Tensor,
+    samples: Optional[torch.Tensor] = None,
+    atol: float = INFERENCE_PARITY_ATOL
+) -> InferenceBackend:
+    """Build the configured backend, falling back to eager if it fails or drifts from eager outputs"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name}. Available: {', '.join(BACKENDS)}")
+
+    eager = InferenceBackend(model, device, example)
+    if name == "eager":
+        return eager
+
+    try:
+        backend = BACKENDS[name](model, device, example, samples)
+        error = check_parity(backend, model, example, samples)
+    except Exception as e:
+        logger.error(f"Error building {name} backend, using eager: {str(e)}")
+        return eager
+
+    if error > atol:
+        logger.warning(f"{name} backend differs from eager by {error:.4f} (atol={atol}), using eager")
+        return eager
+
+    logger.info(f"Using {name} inference backend (max parity error {error:.4f})")
+    return backend
@@ -0,0 +1,188 @@
+import asyncio
+import os
+from typing import List, Optional, Set, Tuple
+import numpy as np
+from loguru import logger
+from dotenv import load_dotenv
+from .executor import InferenceExecutor, inference_executor
+
+load_dotenv()
+
+# Micro-batching Configuration
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+MAX_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "256"))
+
+class InferenceQueueFull(Exception):
+    """Raised by submit when the queue is full; callers should shed the request"""
+
+class BatchInferenceQueue:
+    """Collects concurrent prediction requests into micro-batches for the detector
+
+    At most max_queue_size requests wait at once; beyond that submit fails
+    fast with InferenceQueueFull instead of queueing unbounded work.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        max_queue_size: int = MAX_QUEUE_SIZE
+    ):
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queue_size = max(1, max_queue_size)
+        self.stats = {"batches": 0, "images": 0, "rejected": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batches: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def depth(self) -> int:
+        """Number of requests waiting to be batched"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        """Start the batching worker on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        # One batch in flight per executor worker
+        self._slots = asyncio.Semaphore(self.executor.workers)
+        self.executor.start()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"Inference batching started (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait * 1000:.1f}, max_queue_size={self.max_queue_size})"
+        )
+
+    async def stop(self):
+        """Stop the batching worker and fail any requests still waiting"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._fail([self._queue.get_nowait()])
+
+        self.executor.shutdown()
+        logger.info("Inference batching stopped")
+
+    async def submit(self, image: np.ndarray) -> dict:
+        """Queue an image for prediction and wait for its result
+
+        Raises InferenceQueueFull when max_queue_size requests are already waiting.
+        """
+        if not self.running:
+            await self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((image, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise InferenceQueueFull(f"{self.max_queue_size} predictions already waiting")
+        return await future
+
+    async def submit_many(self, images: List[np.ndarray]) -> List[dict]:
+        """Queue several images together and wait for all their results
+
+        Either every image is queued or, when they don't all fit, none is and
+        InferenceQueueFull is raised, so a rejected caller leaves no work behind.
+        """
+        if not self.running:
+            await self.start()
+
+        if self._queue.qsize() + len(images) > self.max_queue_size:
+            self.stats["rejected"] += len(images)
+            raise InferenceQueueFull(f"No room for {len(images)} predictions, {self.depth} already waiting")
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in images]
+        for image, future in zip(images, futures):
+            self._queue.put_nowait((image, future))
+        return list(await asyncio.gather(*futures))
+
+    async def _collect_batch(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        """Wait for the first request, then gather more until the batch is full or the wait expires"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        try:
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued without waiting
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # stop() cancelled the worker mid-collect; these requests are no longer in the queue it drains
+            self._fail(batch)
+            raise
+
+        # Callers that gave up while waiting don't need a forward pass
+        return [(image, future) for image, future in batch if not future.done()]
+
+    @staticmethod
+    def _fail(batch: List[Tuple[np.ndarray, asyncio.Future]]):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference queue stopped"))
+
+    async def _run(self):
+        while True:
+            # Wait for a free worker before collecting, so batches keep filling meanwhile
+            await self._slots.acquire()
+            batch = await self._collect_batch()
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[np.ndarray, asyncio.Future]]):
+        try:
+            images = [image for image, _ in batch]
+            try:
+                results = await self.executor.predict_batch(images)
+            except Exception as e:
+                logger.error(f"Error running inference batch: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            self.stats["batches"] += 1
+            self.stats["images"] += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+# Initialize the inference queue
+inference_queue = BatchInferenceQueue(inference_executor)
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+import numpy as np
+import cv2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Prediction Cache Configuration
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "600"))
+PREDICTION_CACHE_MAX_DISTANCE = int(os.getenv("PREDICTION_CACHE_MAX_DISTANCE", "6"))
+PREDICTION_CACHE_SCOPE_PRECISION = int(os.getenv("PREDICTION_CACHE_SCOPE_PRECISION", "3"))  # ~110m
+
+# A 64-bit hash split into 8 bands: any two hashes within 7 bits share a band
+HASH_BANDS = 8
+BAND_BITS = 64 // HASH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+def location_scope(
+    latitude: Optional[float],
+    longitude: Optional[float],
+    precision: int = PREDICTION_CACHE_SCOPE_PRECISION
+) -> Optional[str]:
+    """Rounded coordinates near duplicates must share to count as the same scene; None without a location"""
+    if latitude is None or longitude is None:
+        return None
+    return f"{round(latitude, precision)},{round(longitude, precision)}"
+
+def content_hash(contents: bytes) -> str:
+    """SHA-256 of the raw upload, for exact duplicates"""
+    return hashlib.sha256(contents).hexdigest()
+
+def difference_hash(image: np.ndarray) -> int:
+    """64-bit dHash: brightness gradients of a 9x8 thumbnail, for near duplicates"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+@dataclass
+class CacheEntry:
+    key: str
+    phash: int
+    prediction: dict
+    expires_at: float
+    scope: Optional[str] = None
+    # Set once the incident recording this scene is inserted
+    incident_id: Optional[str] = None
+    # Reserved while that incident is being recorded, so repeats of the scene join it
+    pending_incident_id: Optional[str] = None
+
+class PredictionCache:
+    """LRU/TTL cache of predictions keyed by content hash, with perceptual-hash near-duplicate lookup
+
+    Entries are scoped by location_scope(): an image only matches entries
+    uploaded from the same rounded coordinates, so lookalike scenes from
+    different places stay separate. Images without a location match exact
+    duplicates only.
+    """
+
+    def __init__(
+        self,
+        max_size: int = PREDICTION_CACHE_SIZE,
+        ttl: float = PREDICTION_CACHE_TTL,
+        max_distance: int = PREDICTION_CACHE_MAX_DISTANCE
+    ):
+        if not 0 <= max_distance < HASH_BANDS:
+            raise ValueError(f"max_distance must be between 0 and {HASH_BANDS - 1}")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bands: list = [dict() for _ in range(HASH_BANDS)]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _band_values(phash: int):
+        for band in range(HASH_BANDS):
+            yield band, (phash >> (band * BAND_BITS)) & BAND_MASK
+
+    @staticmethod
+    def _key(digest: str, scope: Optional[str]) -> str:
+        return digest if scope is None else f"{scope}|{digest}"
+
+    def _remove(self, entry: CacheEntry):
+        self._entries.pop(entry.key, None)
+        if entry.scope is None:
+            return
+        for band, value in self._band_values(entry.phash):
+            keys: Set[str] = self._bands[band].get((entry.scope, value))
+            if keys is not None:
+                keys.discard(entry.key)
+                if not keys:
+                    del self._bands[band][(entry.scope, value)]
+
+    def _find_similar(self, phash: int, scope: Optional[str], now: float) -> Optional[CacheEntry]:
+        """Closest live entry of the scope within max_distance bits, checking only entries that share a band"""
+        if scope is None:
+            return None
+        candidates: Set[str] = set()
+        for band, value in self._band_values(phash):
+            candidates.update(self._bands[band].get((scope, value), ()))
+
+        best, best_distance = None, self.max_distance + 1
+        for key in candidates:
+            entry = self._entries[key]
+            distance = (entry.phash ^ phash).bit_count()
+            if distance < best_distance and entry.expires_at > now:
+                best, best_distance = entry, distance
+        return best
+
+    def get(self, digest: str, phash: int, scope: Optional[str] = None) -> Optional[CacheEntry]:
+        """Look up an exact duplicate first, then a near duplicate from the same scope"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(self._key(digest, scope))
+            if entry is not None and entry.expires_at <= now:
+                self._remove(entry)
+                entry = None
+
+            if entry is not None:
+                self.hits += 1
+            else:
+                entry = self._find_similar(phash, scope, now)
+                if entry is None:
+                    self.misses += 1
+                    return None
+                self.near_hits += 1
+
+            self._entries.move_to_end(entry.key)
+            return entry
+
+    def put(self, digest: str, phash: int, prediction: dict, scope: Optional[str] = None) -> CacheEntry:
+        """Cache a prediction, evicting the least recently used entries beyond max_size"""
+        key = self._key(digest, scope)
+        entry = CacheEntry(key, phash, prediction, time.monotonic() + self.ttl, scope)
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._remove(existing)
+
+            self._entries[key] = entry
+            if scope is not None:
+                for band, value in self._band_values(phash):
+                    self._bands[band].setdefault((scope, value), set()).add(key)
+
+            while len(self._entries) > self.max_size:
+                _, oldest = next(iter(self._entries.items()))
+                self._remove(oldest)
+                self.evictions += 1
+        return entry
+
+    def reserve_incident(self, entry: CacheEntry) -> Tuple[str, bool]:
+        """Incident id for an accident scene, and whether the caller must record a new incident
+
+        A new id stays pending until confirm_incident(); repeats of the scene
+        get the pending id rather than starting another incident.
+        """
+        with self._lock:
+            if entry.incident_id:
+                return entry.incident_id, False
+            if entry.pending_incident_id:
+                return entry.pending_incident_id, False
+            entry.pending_incident_id = str(uuid.uuid4())
+            return entry.pending_incident_id, True
+
+    def confirm_incident(self, key: str, incident_id: str):
+        """The reserved incident was inserted; later repeats of the scene reuse it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.pending_incident_id == incident_id:
+                entry.incident_id, entry.pending_incident_id = incident_id, None
+
+    def release_incident(self, key: str, incident_id: str):
+        """Recording the reserved incident failed; the next repeat of the scene starts a new one"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.pending_incident_id == incident_id:
+                entry.pending_incident_id = None
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0.0
+        }
+
+# Initialize the prediction cache
+prediction_cache = PredictionCache()
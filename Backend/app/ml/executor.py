@@ -0,0 +1,152 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+import cv2
+import torch
+from loguru import logger
+from dotenv import load_dotenv
+from .lifecycle import model_manager
+from .cache import content_hash, difference_hash
+from ..metrics import INFERENCE_BATCH_SIZE, PREDICT_STAGE_SECONDS
+
+load_dotenv()
+
+# Executor Configuration
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")  # "thread" or "process"
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_THREADS_PER_WORKER = int(os.getenv("INFERENCE_THREADS_PER_WORKER", "0"))
+
+def _init_worker(threads_per_worker: int):
+    """Initialize a pool process: map the shared model weights and warm up"""
+    if threads_per_worker > 0:
+        torch.set_num_threads(threads_per_worker)
+    detector = model_manager.warm_up()
+    logger.info(f"Inference worker {os.getpid()} ready on {detector.device}")
+
+def decode_image(contents: bytes) -> Optional[np.ndarray]:
+    """Decode raw image bytes into a BGR array"""
+    nparr = np.frombuffer(contents, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+def decode_and_hash(contents: bytes) -> Tuple[Optional[np.ndarray], str, Optional[int]]:
+    """Decode an image and compute its content and perceptual hashes"""
+    image = decode_image(contents)
+    phash = difference_hash(image) if image is not None else None
+    return image, content_hash(contents), phash
+
+def predict_batch(images: List[np.ndarray]) -> Tuple[List[dict], dict]:
+    """Run the detector of the current process on a batch of images, with its stage timings"""
+    timings = {}
+    results = model_manager.get_detector().predict_batch(images, timings)
+    return results, timings
+
+def warm_up_model(hold: float = 0.0) -> int:
+    """Load and warm up the detector of the current process"""
+    model_manager.warm_up()
+    # Staying busy briefly lets concurrent pings reach the other workers
+    time.sleep(hold)
+    return os.getpid()
+
+class InferenceExecutor:
+    """Runs CPU-bound decode and inference stages off the event loop"""
+
+    def __init__(
+        self,
+        kind: str = INFERENCE_EXECUTOR,
+        workers: int = INFERENCE_WORKERS,
+        threads_per_worker: int = INFERENCE_THREADS_PER_WORKER
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker
+        self.in_flight = 0
+        self._pool: Optional[Executor] = None
+
+    def start(self):
+        """Create the worker pool"""
+        if self._pool is not None:
+            return
+        if self.kind == "process":
+            # Spawn rather than fork so workers don't inherit torch's thread state
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.threads_per_worker,)
+            )
+        else:
+            if self.threads_per_worker > 0:
+                torch.set_num_threads(self.threads_per_worker)
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        logger.info(f"Inference executor started ({self.kind}, workers={self.workers})")
+
+    def shutdown(self):
+        """Shut down the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            logger.info("Inference executor stopped")
+
+    async def run(self, fn: Callable, *args):
+        """Run a module-level function on the pool and wait for its result"""
+        if self._pool is None:
+            self.start()
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def prepare(self, timeout: float = 300.0):
+        """Load and warm up the model in every worker"""
+        if self.kind != "process":
+            await self.run(warm_up_model)
+            return
+
+        # Pinging every worker makes the pool spawn them all; each warms up in its
+        # initializer, so keep pinging until all of them have answered
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        ready = set()
+        while len(ready) < self.workers:
+            if loop.time() > deadline:
+                logger.warning(f"Only {len(ready)} of {self.workers} inference workers ready after {timeout}s")
+                break
+            pids = await asyncio.gather(*(self.run(warm_up_model, 0.1) for _ in range(self.workers)))
+            ready.update(pids)
+        logger.info(f"Inference workers ready: {sorted(ready)}")
+
+    async def decode(self, contents: bytes) -> Optional[np.ndarray]:
+        return await self.run(decode_image, contents)
+
+    async def decode_and_hash(self, contents: bytes) -> Tuple[Optional[np.ndarray], str, Optional[int]]:
+        with PREDICT_STAGE_SECONDS.labels("decode").time():
+            return await self.run(decode_and_hash, contents)
+
+    async def predict_batch(self, images: List[np.ndarray]) -> List[dict]:
+        # Timed in the worker, which may be another process, and recorded here
+        results, timings = await self.run(predict_batch, images)
+        INFERENCE_BATCH_SIZE.observe(len(images))
+        for stage, seconds in timings.items():
+            PREDICT_STAGE_SECONDS.labels(stage).observe(seconds)
+        return results
+
+    def stats(self) -> dict:
+        """Report pool occupancy, queue depth and saturation"""
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "saturation": round(min(1.0, self.in_flight / self.workers), 3)
+        }
+
+# Initialize the executor
+inference_executor = InferenceExecutor()
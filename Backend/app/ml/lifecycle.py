@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from typing import Optional
+import numpy as np
+from loguru import logger
+from dotenv import load_dotenv
+from .model import AccidentDetector
+
+load_dotenv()
+
+# Model Lifecycle Configuration
+MODEL_PATH = os.getenv("MODEL_PATH", "models/accident_detector.pt")
+MODEL_WEIGHTS_DIR = os.getenv("MODEL_WEIGHTS_DIR", "models/cache")
+MODEL_WARMUP_BATCHES = int(os.getenv("MODEL_WARMUP_BATCHES", "2"))
+MODEL_WARMUP_BATCH_SIZE = int(os.getenv("MODEL_WARMUP_BATCH_SIZE", os.getenv("INFERENCE_MAX_BATCH_SIZE", "16")))
+
+class ModelManager:
+    """Loads the detector once per process, warms it up and tracks readiness"""
+
+    def __init__(
+        self,
+        model_path: str = MODEL_PATH,
+        weights_dir: str = MODEL_WEIGHTS_DIR,
+        warmup_batches: int = MODEL_WARMUP_BATCHES,
+        warmup_batch_size: int = MODEL_WARMUP_BATCH_SIZE
+    ):
+        self.model_path = model_path
+        self.weights_dir = weights_dir
+        self.warmup_batches = warmup_batches
+        self.warmup_batch_size = max(1, warmup_batch_size)
+        self.state = "idle"  # idle, loading, warming, ready, failed
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._detector: Optional[AccidentDetector] = None
+        self._warmed_up = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def weights_path(self) -> str:
+        """Weights cache file, keyed on the model file so a new model never reuses stale weights"""
+        if os.path.exists(self.model_path):
+            stat = os.stat(self.model_path)
+            key = f"{stat.st_size}-{stat.st_mtime_ns}"
+        else:
+            key = "default"
+        name = os.path.splitext(os.path.basename(self.model_path))[0]
+        return os.path.join(self.weights_dir, f"{name}-{key}.weights.pt")
+
+    def get_detector(self) -> AccidentDetector:
+        """Return this process's detector, loading it on first use"""
+        if self._detector is None:
+            with self._lock:
+                if self._detector is None:
+                    self._detector = AccidentDetector(self.model_path, weights_path=self.weights_path())
+        return self._detector
+
+    def warm_up(self) -> AccidentDetector:
+        """Load the detector and run warm-up batches so allocators and kernels are initialized"""
+        detector = self.get_detector()
+        with self._lock:
+            if self._warmed_up:
+                return detector
+            frame = np.zeros((480, 640, 3), dtype=np.uint8)
+            for _ in range(self.warmup_batches):
+                # Cover both the single-image path and a full batch
+                detector.predict_batch([frame])
+                detector.predict_batch([frame] * self.warmup_batch_size)
+            self._warmed_up = True
+        return detector
+
+    async def start(self, executor):
+        """Load and warm the model in every executor worker, then report ready"""
+        self.state = "loading"
+        started_at = time.monotonic()
+        try:
+            executor.start()
+            self.state = "warming"
+            await executor.prepare()
+            self.load_seconds = round(time.monotonic() - started_at, 3)
+            self.state = "ready"
+            logger.info(f"Model ready in {self.load_seconds}s")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error(f"Error preparing model: {str(e)}")
+
+    def status(self) -> dict:
+        return {
+            "status": self.state,
+            "model_path": self.model_path,
+            "load_seconds": self.load_seconds,
+            "error": self.error
+        }
+
+# Initialize the model manager
+model_manager = ModelManager()
@@ -1,26 +1,42 @@
 import torch
 import torch.nn as nn
-import torchvision.transforms as transforms
 import numpy as np
-from PIL import Image
 import cv2
 import os
+import threading
+import time
 from loguru import logger
+from typing import List, Optional
+from .backends import INFERENCE_BACKEND, INFERENCE_CALIBRATION_DIR, INFERENCE_CALIBRATION_IMAGES, create_backend
+
+# Model input configuration
+INPUT_SIZE = 224
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
 
 class AccidentDetector(nn.Module):
-    def __init__(self, model_path: str = "models/accident_detector.pt"):
+    def __init__(
+        self,
+        model_path: str = "models/accident_detector.pt",
+        backend: str = INFERENCE_BACKEND,
+        weights_path: Optional[str] = None,
+        calibration_dir: str = INFERENCE_CALIBRATION_DIR
+    ):
         super(AccidentDetector, self).__init__()
         self.model = None
+        self.backend = None
+        self.backend_name = backend
         self.model_path = model_path
+        self.weights_path = weights_path
+        self.calibration_dir = calibration_dir
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.load_model()
         
-        # Define image transforms
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # Fold ToTensor scaling and normalization into one multiply-add per channel
+        self._scale = (1.0 / (255.0 * STD)).reshape(3, 1, 1)
+        self._bias = (-MEAN / STD).reshape(3, 1, 1)
+        self._input_buffers = threading.local()
+        self.load_model()
 
     def load_model(self):
         """Load the pre-trained CNN model"""
@@ -48,63 +64,153 @@ class AccidentDetector(nn.Module):
             else:
                 self.model = torch.load(self.model_path, map_location=self.device)
             
+            if self.weights_path and self.device.type == "cpu":
+                self.map_shared_weights()
+            
             self.model = self.model.to(self.device)
             self.model.eval()
             logger.info(f"Model loaded successfully on {self.device}")
+            
+            # Compile the model for the configured inference backend
+            example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE, device=self.device)
+            samples = self.load_calibration_samples() if self.backend_name != "eager" else None
+            self.backend = create_backend(self.backend_name, self.model, self.device, example, samples)
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
 
+    def map_shared_weights(self):
+        """Back the model parameters with a memory-mapped weights file
+
+        The first process to load the model writes its state dict to
+        weights_path; every process then maps that file read-only, so the
+        operating system keeps a single copy of the weights in its page cache.
+        """
+        if not os.path.exists(self.weights_path):
+            directory = os.path.dirname(self.weights_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Write under a per-process name and rename so readers never see a partial file
+            tmp_path = f"{self.weights_path}.{os.getpid()}.tmp"
+            torch.save(self.model.state_dict(), tmp_path)
+            os.replace(tmp_path, self.weights_path)
+        
+        state_dict = torch.load(self.weights_path, map_location="cpu", mmap=True, weights_only=True)
+        self.model.load_state_dict(state_dict, assign=True)
+        logger.info(f"Model weights mapped from {self.weights_path}")
+
+    def load_calibration_samples(self, limit: int = INFERENCE_CALIBRATION_IMAGES) -> Optional[torch.Tensor]:
+        """Preprocessed batch of up to limit images from calibration_dir, or None when there are none"""
+        if not self.calibration_dir:
+            return None
+        try:
+            names = sorted(name for name in os.listdir(self.calibration_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+        except OSError as e:
+            logger.error(f"Error reading calibration images: {str(e)}")
+            return None
+        
+        images = []
+        for name in names[:limit]:
+            image = cv2.imread(os.path.join(self.calibration_dir, name), cv2.IMREAD_COLOR)
+            if image is None:
+                logger.warning(f"Skipping unreadable calibration image {name}")
+                continue
+            images.append(image)
+        if not images:
+            logger.warning(f"No calibration images found in {self.calibration_dir}")
+            return None
+        
+        # preprocess_batch reuses its buffer, so keep a copy
+        logger.info(f"Loaded {len(images)} calibration images from {self.calibration_dir}")
+        return self.preprocess_batch(images).clone()
+
     def preprocess_image(self, image: np.ndarray) -> torch.Tensor:
         """Preprocess the image for model input"""
+        return self.preprocess_batch([image])
+
+    def preprocess_batch(self, images: List[np.ndarray]) -> torch.Tensor:
+        """Preprocess BGR images into a normalized NCHW batch tensor
+
+        The returned tensor shares a per-thread buffer that is reused by the
+        next call on the same thread, so it must be consumed before then.
+        """
         try:
-            # Convert to RGB if needed
-            if len(image.shape) == 2:
-                image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-            elif image.shape[2] == 4:
-                image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+            buffer = self._get_buffer(len(images))
+            for image, out in zip(images, buffer):
+                self._fill_input(image, out)
             
-            # Convert to PIL Image
-            image = Image.fromarray(image)
-            
-            # Apply transforms
-            image = self.transform(image)
-            
-            # Add batch dimension
-            image = image.unsqueeze(0)
-            
-            return image.to(self.device)
+            return torch.from_numpy(buffer).to(self.device)
         except Exception as e:
             logger.error(f"Error preprocessing image: {str(e)}")
             raise
 
+    def _get_buffer(self, batch_size: int) -> np.ndarray:
+        """Return a preallocated float32 input buffer for this thread"""
+        buffers = getattr(self._input_buffers, "by_size", None)
+        if buffers is None:
+            buffers = self._input_buffers.by_size = {}
+        if batch_size not in buffers:
+            buffers[batch_size] = np.empty((batch_size, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        return buffers[batch_size]
+
+    def _fill_input(self, image: np.ndarray, out: np.ndarray):
+        """Resize, swap BGR to RGB and normalize one image into a CHW slot"""
+        # Convert to 3-channel BGR if needed
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        
+        # Area interpolation when shrinking avoids aliasing, like PIL's resize
+        height, width = image.shape[:2]
+        interpolation = cv2.INTER_AREA if height > INPUT_SIZE or width > INPUT_SIZE else cv2.INTER_LINEAR
+        image = cv2.resize(image, (INPUT_SIZE, INPUT_SIZE), interpolation=interpolation)
+        
+        # Reversed channel view gives RGB, transposed view gives CHW; no copies until the write
+        np.multiply(image[:, :, ::-1].transpose(2, 0, 1), self._scale, out=out)
+        out += self._bias
+
     def predict(self, image: np.ndarray) -> dict:
         """Make prediction on the input image"""
+        return self.predict_batch([image])[0]
+
+    def predict_batch(self, images: List[np.ndarray], timings: Optional[dict] = None) -> List[dict]:
+        """Make predictions on a batch of images with a single forward pass
+
+        When given, timings receives the preprocess and inference seconds.
+        """
         try:
-            # Preprocess the image
-            processed_image = self.preprocess_image(image)
+            # Preprocess every image into one batch
+            started = time.perf_counter()
+            processed_images = self.preprocess_batch(images)
+            preprocessed = time.perf_counter()
             
             # Make prediction
             with torch.no_grad():
-                prediction = self.model(processed_image)
-                confidence = float(prediction[0][0])
-            
-            # Determine if it's an accident
-            is_accident = confidence > 0.5
-            label = "Accident" if is_accident else "Normal"
+                predictions = self.backend(processed_images)
             
-            return {
-                "isAccident": is_accident,
-                "confidence": confidence,
-                "label": label
-            }
+            results = [self._format_prediction(float(prediction[0])) for prediction in predictions]
+            if timings is not None:
+                timings["preprocess"] = preprocessed - started
+                timings["inference"] = time.perf_counter() - preprocessed
+            return results
         except Exception as e:
             logger.error(f"Error making prediction: {str(e)}")
             raise
 
+    def _format_prediction(self, confidence: float) -> dict:
+        """Build the prediction payload for a single confidence score"""
+        # Determine if it's an accident
+        is_accident = confidence > 0.5
+        label = "Accident" if is_accident else "Normal"
+        
+        return {
+            "isAccident": is_accident,
+            "confidence": confidence,
+            "label": label
+        }
+
     def process_video_frame(self, frame: np.ndarray) -> dict:
         """Process a single frame from a video stream"""
         return self.predict(frame)
-
-# Initialize the detector
-detector = AccidentDetector() 
\ No newline at end of file
+ 
\ No newline at end of file
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, List, Optional, Tuple, Union
+import numpy as np
+import cv2
+from loguru import logger
+from dotenv import load_dotenv
+from .batching import BatchInferenceQueue, InferenceQueueFull, inference_queue
+
+load_dotenv()
+
+# Video Analysis Configuration
+VIDEO_FRAME_SKIP = int(os.getenv("VIDEO_FRAME_SKIP", "5"))
+VIDEO_MAX_FRAME_SKIP = int(os.getenv("VIDEO_MAX_FRAME_SKIP", "60"))
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+VIDEO_SMOOTHING = os.getenv("VIDEO_SMOOTHING", "ema")  # "ema" or "vote"
+VIDEO_EMA_ALPHA = float(os.getenv("VIDEO_EMA_ALPHA", "0.3"))
+VIDEO_VOTE_WINDOW = int(os.getenv("VIDEO_VOTE_WINDOW", "5"))
+VIDEO_ALERT_THRESHOLD = float(os.getenv("VIDEO_ALERT_THRESHOLD", "0.5"))
+# Pause after the inference queue turns a batch away, doubling while it stays full
+VIDEO_BACKOFF_MS = float(os.getenv("VIDEO_BACKOFF_MS", "50"))
+VIDEO_MAX_BACKOFF_MS = float(os.getenv("VIDEO_MAX_BACKOFF_MS", "1000"))
+
+Frame = Tuple[int, float, np.ndarray]
+
+class FrameSource:
+    """Decodes frames from a video file or stream URL (e.g. rtsp://...)
+
+    With realtime=True a local file is paced at its native frame rate,
+    which makes it a stand-in for a live RTSP feed.
+    """
+
+    def __init__(self, source: Union[str, int], realtime: bool = False):
+        self.source = source
+        self.realtime = realtime
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open video source: {source}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.index = -1
+        self._started_at: Optional[float] = None
+
+    def read(self, skip: int = 0) -> Optional[Frame]:
+        """Skip frames without decoding them, then decode the next one"""
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+
+        for _ in range(skip):
+            if not self.capture.grab():
+                return None
+            self.index += 1
+
+        ok, frame = self.capture.read()
+        if not ok:
+            return None
+        self.index += 1
+
+        timestamp = self.index / self.fps
+        if self.realtime:
+            delay = self._started_at + timestamp - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return self.index, timestamp, frame
+
+    def close(self):
+        self.capture.release()
+
+class AdaptiveFrameSampler:
+    """Chooses how many frames to skip based on recent scores
+
+    The stride doubles while the scene stays clearly normal, or while the
+    detector is overloaded, and drops back to the base stride as soon as
+    the score approaches the alert threshold.
+    """
+
+    def __init__(
+        self,
+        frame_skip: int = VIDEO_FRAME_SKIP,
+        max_frame_skip: int = VIDEO_MAX_FRAME_SKIP,
+        threshold: float = VIDEO_ALERT_THRESHOLD,
+        margin: float = 0.15
+    ):
+        self.frame_skip = max(0, frame_skip)
+        self.max_frame_skip = max(self.frame_skip, max_frame_skip)
+        self.threshold = threshold
+        self.margin = margin
+        self.skip = self.frame_skip
+
+    def update(self, score: float):
+        if score >= self.threshold - self.margin:
+            self.skip = self.frame_skip
+        else:
+            self.widen()
+
+    def widen(self):
+        self.skip = min(self.max_frame_skip, max(1, self.skip) * 2)
+
+class TemporalSmoother:
+    """Smooths per-frame confidences and fires once per sustained detection"""
+
+    def __init__(
+        self,
+        method: str = VIDEO_SMOOTHING,
+        threshold: float = VIDEO_ALERT_THRESHOLD,
+        alpha: float = VIDEO_EMA_ALPHA,
+        window: int = VIDEO_VOTE_WINDOW
+    ):
+        if method not in ("ema", "vote"):
+            raise ValueError(f"Unknown smoothing method: {method}")
+        self.method = method
+        self.threshold = threshold
+        self.alpha = alpha
+        self.window = deque(maxlen=max(1, window))
+        self.score: Optional[float] = None
+        self.active = False
+
+    def update(self, confidence: float) -> Tuple[float, bool]:
+        """Add a confidence and return the smoothed score and whether an alert fires"""
+        if self.method == "ema":
+            self.score = confidence if self.score is None else self.alpha * confidence + (1 - self.alpha) * self.score
+        else:
+            # Fraction of recent frames above the threshold; a majority raises the alert
+            self.window.append(confidence > self.threshold)
+            self.score = sum(self.window) / self.window.maxlen
+
+        # Fire on the rising edge only, re-arm once the score drops back
+        triggered = self.score > self.threshold and not self.active
+        self.active = self.score > self.threshold
+        return self.score, triggered
+
+class VideoStreamAnalyzer:
+    """Runs sampled video frames through the detector and emits smoothed incidents
+
+    Frames are submitted through the shared inference queue, so frames from
+    many feeds analysed concurrently are batched together. When the queue is
+    full a batch's frames are dropped rather than failing the analysis: the
+    sampler widens its stride and the analyzer pauses before the next batch.
+    """
+
+    def __init__(
+        self,
+        queue: BatchInferenceQueue = inference_queue,
+        batch_size: int = VIDEO_BATCH_SIZE,
+        backoff_ms: float = VIDEO_BACKOFF_MS,
+        max_backoff_ms: float = VIDEO_MAX_BACKOFF_MS
+    ):
+        self.queue = queue
+        self.batch_size = max(1, batch_size)
+        self.backoff = max(0.0, backoff_ms) / 1000
+        self.max_backoff = max(self.backoff, max_backoff_ms / 1000)
+
+    async def frames(self, source: FrameSource, sampler: AdaptiveFrameSampler) -> AsyncIterator[Frame]:
+        """Yield sampled frames, decoding off the event loop"""
+        while True:
+            frame = await asyncio.to_thread(source.read, sampler.skip)
+            if frame is None:
+                return
+            yield frame
+
+    async def batches(self, frames: AsyncIterator[Frame]) -> AsyncIterator[List[Frame]]:
+        batch = []
+        async for frame in frames:
+            batch.append(frame)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def analyze(
+        self,
+        source: Union[str, int],
+        realtime: bool = False,
+        sampler: Optional[AdaptiveFrameSampler] = None,
+        smoother: Optional[TemporalSmoother] = None
+    ) -> AsyncIterator[dict]:
+        """Analyse a video source and yield an event for every detected incident"""
+        sampler = sampler or AdaptiveFrameSampler()
+        smoother = smoother or TemporalSmoother()
+        stream = await asyncio.to_thread(FrameSource, source, realtime)
+        analyzed, dropped, rejections = 0, 0, 0
+        try:
+            async for batch in self.batches(self.frames(stream, sampler)):
+                try:
+                    predictions = await self.queue.submit_many([frame for _, _, frame in batch])
+                except InferenceQueueFull:
+                    dropped += len(batch)
+                    rejections += 1
+                    sampler.widen()
+                    await asyncio.sleep(min(self.max_backoff, self.backoff * 2 ** (rejections - 1)))
+                    continue
+                rejections = 0
+                analyzed += len(batch)
+
+                for (index, timestamp, _), prediction in zip(batch, predictions):
+                    score, triggered = smoother.update(prediction["confidence"])
+                    sampler.update(score)
+                    if triggered:
+                        yield {
+                            "frame": index,
+                            "timestamp": round(timestamp, 3),
+                            "confidence": prediction["confidence"],
+                            "score": score
+                        }
+        finally:
+            stream.close()
+            logger.info(f"Analysed {analyzed} of {stream.index + 1} frames from {source} ({dropped} dropped while overloaded)")
+
+# Initialize the analyzer
+video_analyzer = VideoStreamAnalyzer()
@@ -1,37 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
-import pandas as pd
-from ..db.supabase import supabase_client
-from ..auth.auth import get_current_user, get_admin_user
+from ..db.repositories import analytics_repository, incident_repository
+from ..services.rollups import incident_rollups, to_timestamp
+from ..services.export import EXPORT_PAGE_SIZE, csv_stream, gzip_stream, parquet_available, parquet_stream
+from ..auth.auth import User, get_current_user, get_admin_user
 from loguru import logger
 
-router = APIRouter()
+router = APIRouter(prefix="/api/analytics")
 
 @router.get("/hourly")
 async def get_hourly_analytics(
     days: int = 7,
-    current_user: dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """Get hourly incident statistics for the last N days"""
     try:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        result = supabase_client.table("incidents").select("*").gte("created_at", start_date).lte("created_at", end_date).execute()
+        # Answer from the in-memory rollups, or group in the database until they are built
+        if incident_rollups.ready:
+            hourly_stats = incident_rollups.hourly_counts(start_date, end_date)
+        else:
+            hourly_stats = await analytics_repository.hourly_counts(start_date, end_date)
         
-        if not result.data:
-            return {"hourly_stats": []}
-        
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame(result.data)
-        df['created_at'] = pd.to_datetime(df['created_at'])
-        df['hour'] = df['created_at'].dt.hour
-        
-        # Group by hour and count incidents
-        hourly_stats = df.groupby('hour').size().reset_index(name='count')
-        
-        return {"hourly_stats": hourly_stats.to_dict('records')}
+        return {"hourly_stats": hourly_stats}
     except Exception as e:
         logger.error(f"Error in hourly analytics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -40,86 +36,135 @@ async def get_hourly_analytics(
 async def get_location_hotspots(
     days: int = 30,
     limit: int = 10,
-    current_user: dict = Depends(get_current_user)
+    radius_m: Optional[float] = Query(None, gt=0, le=10000),
+    min_incidents: Optional[int] = Query(None, ge=1),
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+    current_user: User = Depends(get_current_user)
 ):
-    """Get top N accident hotspots by location"""
+    """Get top N accident hotspots, clustering incidents within radius_m of each other"""
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    if any(value is None for value in bbox):
+        if any(value is not None for value in bbox):
+            raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lon, max_lat and max_lon")
+        bbox = None
+
     try:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        result = supabase_client.table("incidents").select("*").gte("created_at", start_date).lte("created_at", end_date).execute()
-        
-        if not result.data:
-            return {"hotspots": []}
-        
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame(result.data)
-        
-        # Group by location and count incidents
-        hotspots = df.groupby(['latitude', 'longitude', 'location']).size().reset_index(name='count')
-        hotspots = hotspots.sort_values('count', ascending=False).head(limit)
-        
-        return {"hotspots": hotspots.to_dict('records')}
+        # Cluster the in-memory incident locations, or group in the database until they are loaded
+        if incident_rollups.ready:
+            hotspots = await asyncio.to_thread(
+                incident_rollups.hotspots.hotspots,
+                to_timestamp(start_date),
+                to_timestamp(end_date),
+                limit,
+                radius_m,
+                min_incidents,
+                bbox
+            )
+        else:
+            hotspots = await analytics_repository.location_hotspots(start_date, end_date, limit)
+        
+        return {"hotspots": hotspots}
     except Exception as e:
         logger.error(f"Error in location hotspots: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/nearby")
+async def get_nearby_incidents(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(500, gt=0, le=50000),
+    days: int = 30,
+    current_user: User = Depends(get_current_user)
+):
+    """Count incidents within radius_m of a location over the last N days"""
+    if not incident_rollups.ready:
+        raise HTTPException(status_code=503, detail="Incident locations are still loading")
+
+    try:
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        count = await asyncio.to_thread(
+            incident_rollups.hotspots.nearby,
+            latitude,
+            longitude,
+            radius_m,
+            to_timestamp(start_date),
+            to_timestamp(end_date)
+        )
+        return {"latitude": latitude, "longitude": longitude, "radius_m": radius_m, "count": count}
+    except Exception as e:
+        logger.error(f"Error in nearby incidents: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/severity")
 async def get_severity_analytics(
     days: int = 30,
-    current_user: dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """Get incident statistics by severity"""
     try:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        result = supabase_client.table("incidents").select("*").gte("created_at", start_date).lte("created_at", end_date).execute()
-        
-        if not result.data:
-            return {"severity_stats": []}
-        
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame(result.data)
-        
-        # Group by severity and count incidents
-        severity_stats = df.groupby('severity').size().reset_index(name='count')
+        # Answer from the in-memory rollups, or group in the database until they are built
+        if incident_rollups.ready:
+            severity_stats = incident_rollups.severity_counts(start_date, end_date)
+        else:
+            severity_stats = await analytics_repository.severity_counts(start_date, end_date)
         
-        return {"severity_stats": severity_stats.to_dict('records')}
+        return {"severity_stats": severity_stats}
     except Exception as e:
         logger.error(f"Error in severity analytics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/export")
 @router.get("/export/csv")
-async def export_analytics_csv(
+async def export_analytics(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    current_user: dict = Depends(get_admin_user)
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    compress: bool = False,
+    current_user: User = Depends(get_admin_user)
 ):
-    """Export analytics data to CSV (admin only)"""
+    """Stream incidents as CSV, gzipped CSV or Parquet (admin only)"""
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+
     try:
-        query = supabase_client.table("incidents").select("*")
-        
-        if start_date:
-            query = query.gte("created_at", start_date)
-        if end_date:
-            query = query.lte("created_at", end_date)
-        
-        result = query.execute()
+        filters = incident_repository.window_filters(start_date, end_date)
+        pages = incident_repository.scan(page_size=EXPORT_PAGE_SIZE, filters=filters)
         
-        if not result.data:
+        # Read the first page up front so an empty export still gets a 404
+        first_page = await anext(pages, [])
+        if not first_page:
             raise HTTPException(status_code=404, detail="No data found for the specified period")
         
-        # Convert to DataFrame
-        df = pd.DataFrame(result.data)
-        
-        # Generate CSV
-        csv_data = df.to_csv(index=False)
-        
-        return {
-            "filename": f"analytics_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv",
-            "data": csv_data
-        }
+        async def all_pages():
+            yield first_page
+            async for page in pages:
+                yield page
+        
+        filename = f"analytics_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        if format == "parquet":
+            body, media_type, filename = parquet_stream(all_pages()), "application/vnd.apache.parquet", f"{filename}.parquet"
+        elif compress:
+            body, media_type, filename = gzip_stream(csv_stream(all_pages())), "application/gzip", f"{filename}.csv.gz"
+        else:
+            body, media_type, filename = csv_stream(all_pages()), "text/csv", f"{filename}.csv"
+        
+        return StreamingResponse(
+            body,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error exporting analytics: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
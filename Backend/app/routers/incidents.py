@@ -1,18 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from typing import List, Optional
+from starlette.concurrency import iterate_in_threadpool
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 from pydantic import BaseModel
+from dataclasses import asdict
 from datetime import datetime
+import asyncio
+import base64
+import json
+import os
+import tarfile
+import zipfile
 import numpy as np
 import cv2
 from loguru import logger
-from ..ml.model import detector
-from ..db.supabase import supabase_client
-from ..auth.auth import get_current_user
+from dotenv import load_dotenv
+from ..ml.batching import InferenceQueueFull, inference_queue
+from ..ml.executor import inference_executor
+from ..ml.cache import CacheEntry, location_scope, prediction_cache
+from ..db.database import DatabaseError
+from ..db.repositories import incident_repository
+from ..services.rollups import incident_rollups
+from ..services.geocoding import geocoding_service
+from ..services.media import media_library
+from ..services.uploads import MAX_IMAGE_SIZE, SpooledUpload, UploadError, spool
+from ..services.pipeline import Job, Stage, job_pipeline
+from ..socket import emit_incident, sio
+from ..auth.auth import User, get_current_user
+from ..metrics import PREDICT_STAGE_SECONDS
 
-router = APIRouter()
+load_dotenv()
+
+router = APIRouter(prefix="/api/incidents")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Batch Prediction Configuration
+PREDICT_BATCH_MAX_ITEMS = int(os.getenv("PREDICT_BATCH_MAX_ITEMS", "256"))
+PREDICT_BATCH_CHUNK_SIZE = int(os.getenv("PREDICT_BATCH_CHUNK_SIZE", "16"))
+PREDICT_BATCH_MAX_MEMBERS = int(os.getenv("PREDICT_BATCH_MAX_MEMBERS", "1024"))  # archive entries of any kind
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+DETECTED_LOCATION = "Detected via AI"
+
+# Incident Listing Configuration
+INCIDENTS_PAGE_SIZE = int(os.getenv("INCIDENTS_PAGE_SIZE", "100"))
+INCIDENTS_MAX_PAGE_SIZE = int(os.getenv("INCIDENTS_MAX_PAGE_SIZE", "1000"))
+
 class IncidentBase(BaseModel):
     location: str
     latitude: float
@@ -31,87 +65,222 @@ class IncidentResponse(IncidentBase):
     user_id: str
     image_url: Optional[str] = None
 
+INCIDENT_FIELDS = set(IncidentResponse.model_fields)
+
+def encode_cursor(created_at: str, incident_id: str) -> str:
+    """Opaque cursor for the (created_at, id) keyset of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps([created_at, incident_id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, incident_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(incident_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, incident_id
+
 @router.post("/predict", response_model=dict)
 async def predict_accident(
     file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user)
+    latitude: Optional[float] = Form(None, ge=-90, le=90),
+    longitude: Optional[float] = Form(None, ge=-180, le=180),
+    current_user: User = Depends(get_current_user)
 ):
     """Predict if an image contains an accident"""
     try:
         # Read and decode the image
         contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        image, digest, phash = await inference_executor.decode_and_hash(contents)
         
         if image is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
         
-        # Make prediction
-        prediction = detector.predict(image)
+        # Reuse the prediction for identical images, or near-identical ones from the same place
+        scope = location_scope(latitude, longitude)
+        cached = prediction_cache.get(digest, phash, scope)
+        hit = cached is not None
+        if not hit:
+            # Make prediction (batched with concurrent requests)
+            cached = prediction_cache.put(digest, phash, await inference_queue.submit(image), scope)
+        prediction = dict(cached.prediction, cached=hit)
         
-        # If accident is detected, create an incident
+        # Near-duplicates of an already reported scene collapse into its incident
         if prediction["isAccident"]:
-            # Upload image to storage
-            image_url = await upload_incident_image(file, current_user["id"])
-            
-            # Create incident record
-            incident_data = {
-                "user_id": current_user["id"],
-                "location": "Detected via AI",  # TODO: Add geocoding
-                "latitude": 0.0,  # TODO: Add GPS data
-                "longitude": 0.0,
-                "description": f"AI-detected accident with {prediction['confidence']:.2%} confidence",
-                "severity": "high",
-                "status": "pending",
-                "image_url": image_url
-            }
-            
-            result = supabase_client.table("incidents").insert(incident_data).execute()
-            
-            # Broadcast new incident
-            await sio.emit("new_incident", result.data[0])
+            incident_id, new = prediction_cache.reserve_incident(cached)
+            prediction["incident_id"] = incident_id
+            if new:
+                # Upload, geocoding, insert and broadcast run after the response is sent
+                detection = await spool_detection(incident_id, file.filename, prediction["confidence"], contents, cached.key)
+                try:
+                    await queue_detected_incidents([detection], current_user.id, latitude, longitude)
+                except BaseException:
+                    await abandon_detections([detection])
+                    raise
         
         return prediction
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        # Shed load rather than queue requests that would time out anyway
+        logger.warning(f"Rejecting prediction: {str(e)}")
+        raise HTTPException(status_code=503, detail="Too many predictions in progress, retry shortly", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Error in predict_accident: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/predict/batch")
+async def predict_accident_batch(
+    files: List[UploadFile] = File(...),
+    stream: bool = False,
+    latitude: Optional[float] = Form(None, ge=-90, le=90),
+    longitude: Optional[float] = Form(None, ge=-180, le=180),
+    current_user: User = Depends(get_current_user)
+):
+    """Predict accidents for many images, uploaded as files or as zip/tar archives
+
+    With stream=true results are returned as NDJSON, one line per image,
+    as each batch completes, then a {"summary": ...} line with the image
+    and error counts. The first batch is predicted before the response
+    starts, so request errors found there still get their own status; a
+    later failure ends the stream early with complete=false in the summary.
+    latitude/longitude, when given, apply to every incident detected in
+    the request.
+    """
+    user_id = current_user.id
+    scope = location_scope(latitude, longitude)
+    items = iterate_in_threadpool(iter_uploaded_images(files))
+    
+    if stream:
+        chunks = predict_chunks(items, scope)
+        try:
+            first = await anext(chunks, None)
+        except Exception as e:
+            raise batch_error(e)
+        
+        async def ndjson() -> AsyncIterator[str]:
+            summary = {"images": 0, "errors": 0, "complete": True}
+            chunk = first
+            try:
+                while chunk is not None:
+                    results, entries, images = chunk
+                    detections = await collect_detections(results, entries, images)
+                    if detections:
+                        await queue_or_abandon(detections, user_id, latitude, longitude)
+                    for result in results:
+                        summary["images"] += 1
+                        summary["errors"] += "error" in result
+                        yield json.dumps(result) + "\n"
+                    chunk = await anext(chunks, None)
+            except Exception as e:
+                summary.update(complete=False, error=batch_error(e).detail)
+            yield json.dumps({"summary": summary}) + "\n"
+        
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    
+    try:
+        all_results, all_detections = [], []
+        async for results, entries, images in predict_chunks(items, scope):
+            all_results.extend(results)
+            all_detections.extend(await collect_detections(results, entries, images))
+        
+        # One bulk insert for every incident detected in the request
+        if all_detections:
+            await queue_or_abandon(all_detections, user_id, latitude, longitude)
+        return {"results": all_results}
+    except Exception as e:
+        raise batch_error(e)
+
+def batch_error(e: Exception) -> HTTPException:
+    """The HTTP error to report for a batch prediction that raised e"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, InferenceQueueFull):
+        # Shed load rather than queue requests that would time out anyway
+        logger.warning(f"Rejecting batch prediction: {str(e)}")
+        return HTTPException(status_code=503, detail="Too many predictions in progress, retry shortly", headers={"Retry-After": "1"})
+    logger.error(f"Error in predict_accident_batch: {str(e)}")
+    return HTTPException(status_code=500, detail=str(e))
+
 @router.post("/", response_model=IncidentResponse)
 async def create_incident(
     incident: IncidentCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """Create a new incident"""
     try:
         incident_data = incident.dict()
-        incident_data["user_id"] = current_user["id"]
+        incident_data["user_id"] = current_user.id
         
-        result = supabase_client.table("incidents").insert(incident_data).execute()
-        return result.data[0]
+        created = await incident_repository.create(incident_data)
+        incident_rollups.record_created([created])
+        return created
     except Exception as e:
         logger.error(f"Error creating incident: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[IncidentResponse])
+# Rows are returned as stored, or projected to the requested fields, so they aren't validated against the model
+@router.get("/", responses={200: {
+    "model": List[IncidentResponse],
+    "description": "Incidents; with fields, each holds only id, created_at and the requested fields",
+}})
 async def get_incidents(
     status: Optional[str] = None,
+    severity: Optional[str] = Query(None, description="Comma-separated severities"),
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    current_user: dict = Depends(get_current_user)
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    limit: int = Query(INCIDENTS_PAGE_SIZE, ge=1, le=INCIDENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
 ):
-    """Get filtered list of incidents"""
+    """Get a newest-first page of incidents
+
+    When more incidents follow, the X-Next-Cursor header holds the cursor
+    to pass back for the next page.
+    """
+    filters = incident_repository.window_filters(start_date, end_date)
+    if status:
+        filters.append(("status", "eq", status))
+    severities = [value.strip() for value in (severity or "").split(",") if value.strip()]
+    if severities:
+        filters.append(("severity", "in", severities))
+
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    if any(value is not None for value in bbox):
+        if any(value is None for value in bbox):
+            raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lon, max_lat and max_lon")
+        filters += [
+            ("latitude", "gte", min_lat), ("latitude", "lte", max_lat),
+            ("longitude", "gte", min_lon), ("longitude", "lte", max_lon)
+        ]
+
+    columns = "*"
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(requested) - INCIDENT_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        # The cursor is built from created_at and id, so they are always returned
+        columns = ",".join(dict.fromkeys(["id", "created_at", *requested]))
+
     try:
-        query = supabase_client.table("incidents").select("*")
-        
-        if status:
-            query = query.eq("status", status)
-        if start_date:
-            query = query.gte("created_at", start_date)
-        if end_date:
-            query = query.lte("created_at", end_date)
-        
-        result = query.execute()
-        return result.data
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    try:
+        incidents = await incident_repository.page(limit + 1, after, filters, columns)
+        headers = {}
+        if len(incidents) > limit:
+            incidents = incidents[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(incidents[-1]["created_at"], incidents[-1]["id"])
+        # Rows come back from the database as plain JSON; skip per-row model validation
+        return JSONResponse(incidents, headers=headers)
     except Exception as e:
         logger.error(f"Error getting incidents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -119,14 +288,16 @@ async def get_incidents(
 @router.get("/{incident_id}", response_model=IncidentResponse)
 async def get_incident(
     incident_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """Get a single incident by ID"""
     try:
-        result = supabase_client.table("incidents").select("*").eq("id", incident_id).execute()
-        if not result.data:
+        incident = await incident_repository.get(incident_id)
+        if not incident:
             raise HTTPException(status_code=404, detail="Incident not found")
-        return result.data[0]
+        return incident
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting incident: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -135,17 +306,21 @@ async def get_incident(
 async def update_incident(
     incident_id: str,
     incident: IncidentCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """Update an incident"""
     try:
         # Check if user has permission to update
-        existing = supabase_client.table("incidents").select("*").eq("id", incident_id).execute()
-        if not existing.data:
+        existing = await incident_repository.get(incident_id)
+        if not existing:
             raise HTTPException(status_code=404, detail="Incident not found")
         
-        result = supabase_client.table("incidents").update(incident.dict()).eq("id", incident_id).execute()
-        return result.data[0]
+        updated = await incident_repository.update(incident_id, incident.dict())
+        if updated:
+            incident_rollups.record_updated(existing, updated)
+        return updated
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating incident: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -153,28 +328,294 @@ async def update_incident(
 @router.delete("/{incident_id}")
 async def delete_incident(
     incident_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """Delete an incident (admin only)"""
     try:
         # Check if user is admin
-        if current_user["role"] != "admin":
+        if current_user.role != "admin":
             raise HTTPException(status_code=403, detail="Only admins can delete incidents")
         
-        result = supabase_client.table("incidents").delete().eq("id", incident_id).execute()
-        if not result.data:
+        deleted = await incident_repository.delete(incident_id)
+        if not deleted:
             raise HTTPException(status_code=404, detail="Incident not found")
+        incident_rollups.record_deleted(deleted)
         return {"message": "Incident deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting incident: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def upload_incident_image(file: UploadFile, user_id: str) -> str:
-    """Upload incident image to storage and return URL"""
+async def spool_detection(
+    incident_id: str,
+    filename: Optional[str],
+    confidence: float,
+    contents: bytes,
+    cache_key: Optional[str] = None
+) -> dict:
+    """Detection for the incident pipeline, with the image spooled to disk for its upload stage"""
+    async def chunks():
+        yield contents
+
+    item = {"id": incident_id, "filename": filename, "confidence": confidence, "cache_key": cache_key}
     try:
-        # TODO: Implement image upload to Supabase Storage
-        # For now, return a placeholder URL
-        return f"https://storage.example.com/incidents/{user_id}/{file.filename}"
-    except Exception as e:
-        logger.error(f"Error uploading image: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        item["upload"] = asdict(await spool(chunks(), MAX_IMAGE_SIZE))
+    except UploadError as e:
+        # Formats the media library doesn't store (bmp, webp) are recorded without an image
+        logger.warning(f"Not storing image of incident {incident_id}: {str(e)}")
+    return item
+
+async def upload_incident_image(item: dict, user_id: str) -> Optional[str]:
+    """Store a detection's spooled image in the media library and return its URL"""
+    if "upload" not in item:
+        return None
+    upload = SpooledUpload(**item["upload"])
+    if os.path.exists(upload.path):
+        media_object = await media_library.add(upload, user_id, item["filename"])
+        await upload.discard()
+    else:
+        # Stored by an attempt that ran before a restart, or lost with the spool directory
+        media_object = await media_library.get(upload.sha256)
+        if media_object is None:
+            logger.warning(f"Spooled image of incident {item['id']} is gone; recording it without one")
+            return None
+    return media_library.describe(media_object)["url"]
+
+async def incident_location(latitude: Optional[float], longitude: Optional[float]) -> str:
+    """Address for a detected incident, falling back to a placeholder without coordinates or geocoder"""
+    if latitude is None or longitude is None:
+        return DETECTED_LOCATION
+    return await geocoding_service.describe(latitude, longitude) or DETECTED_LOCATION
+
+def detected_incident(
+    user_id: str,
+    confidence: float,
+    image_url: Optional[str],
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    location: Optional[str] = None,
+    description: Optional[str] = None
+) -> dict:
+    """Incident record for an AI-detected accident"""
+    return {
+        "user_id": user_id,
+        "location": location or DETECTED_LOCATION,
+        "latitude": latitude if latitude is not None else 0.0,
+        "longitude": longitude if longitude is not None else 0.0,
+        "description": description or f"AI-detected accident with {confidence:.2%} confidence",
+        "severity": "high",
+        "status": "pending",
+        "image_url": image_url
+    }
+
+async def broadcast_incidents(incidents: List[dict]):
+    """Broadcast newly created incidents to the clients subscribed to their area"""
+    for incident in incidents:
+        await emit_incident(sio, "new_incident", incident)
+
+async def queue_detected_incidents(
+    detections: List[dict],
+    user_id: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
+):
+    """Hand detections ({id, filename, confidence}) to the background pipeline that records them
+
+    A detection that already has an image_url skips the upload stage; one with
+    a description replaces the default description of its incident.
+    """
+    await job_pipeline.submit("detected_incidents", {
+        "user_id": user_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "detections": detections
+    })
+
+async def upload_stage(job: Job):
+    for item in job.payload["detections"]:
+        if "image_url" not in item:
+            item["image_url"] = await upload_incident_image(item, job.payload["user_id"])
+
+async def geocode_stage(job: Job):
+    if "location" not in job.payload:
+        job.payload["location"] = await incident_location(job.payload["latitude"], job.payload["longitude"])
+
+async def insert_stage(job: Job):
+    payload = job.payload
+    rows = [
+        dict(
+            detected_incident(
+                payload["user_id"], detection["confidence"], detection["image_url"],
+                payload["latitude"], payload["longitude"], payload["location"], detection.get("description")
+            ),
+            id=detection["id"]
+        )
+        for detection in payload["detections"]
+    ]
+    try:
+        created = await incident_repository.create_many(rows)
+    except DatabaseError as e:
+        # A retried insert whose first attempt reached the database
+        if e.status_code != 409:
+            raise
+        created = await incident_repository.get_many([row["id"] for row in rows])
+    else:
+        incident_rollups.record_created(created)
+    payload["created"] = created
+    # Only now do repeats of these scenes resolve to the incidents
+    for item in payload["detections"]:
+        if item.get("cache_key"):
+            prediction_cache.confirm_incident(item["cache_key"], item["id"])
+
+async def broadcast_stage(job: Job):
+    await broadcast_incidents(job.payload["created"])
+
+def timed_stage(name: str, stage: Stage) -> Stage:
+    async def run(job: Job):
+        with PREDICT_STAGE_SECONDS.labels(name).time():
+            await stage(job)
+    return run
+
+async def abandon_detections(detections: List[dict]):
+    """Clean up detections that will never be recorded"""
+    for item in detections:
+        if item.get("cache_key"):
+            prediction_cache.release_incident(item["cache_key"], item["id"])
+        if "upload" in item:
+            await SpooledUpload(**item["upload"]).discard()
+
+async def abandon_job(job: Job):
+    await abandon_detections(job.payload["detections"])
+
+job_pipeline.register("detected_incidents", [
+    (name, timed_stage(name, stage)) for name, stage in [
+        ("upload", upload_stage),
+        ("geocode", geocode_stage),
+        ("insert", insert_stage),
+        ("broadcast", broadcast_stage),
+    ]
+], on_failure=abandon_job)
+
+def iter_uploaded_images(files: List[UploadFile]) -> Iterator[Tuple[str, bytes]]:
+    """Yield (name, bytes) for each uploaded image, unpacking archives member by member
+
+    Every image is read with a MAX_IMAGE_SIZE bound, whatever its archive
+    header claims, so a small archive can't expand into unbounded memory.
+    """
+    count = 0
+    for file in files:
+        name = (file.filename or "").lower()
+        if name.endswith('.zip'):
+            members = _iter_zip_images(file.file, PREDICT_BATCH_MAX_ITEMS - count)
+        elif name.endswith(ARCHIVE_EXTENSIONS):
+            members = _iter_tar_images(file.file)
+        else:
+            members = iter([(file.filename, _read_image(file.file, file.filename))])
+        
+        for member in members:
+            count += 1
+            if count > PREDICT_BATCH_MAX_ITEMS:
+                _too_many_images()
+            yield member
+
+def _too_many_images():
+    raise HTTPException(status_code=400, detail=f"Too many images, limit is {PREDICT_BATCH_MAX_ITEMS}")
+
+def _read_image(fileobj, name: str, declared_size: int = 0) -> bytes:
+    if declared_size > MAX_IMAGE_SIZE:
+        raise HTTPException(status_code=413, detail=f"{name} is larger than {MAX_IMAGE_SIZE} bytes")
+    contents = fileobj.read(MAX_IMAGE_SIZE + 1)
+    if len(contents) > MAX_IMAGE_SIZE:
+        raise HTTPException(status_code=413, detail=f"{name} is larger than {MAX_IMAGE_SIZE} bytes")
+    return contents
+
+def _too_many_members():
+    raise HTTPException(status_code=400, detail=f"Too many archive entries, limit is {PREDICT_BATCH_MAX_MEMBERS}")
+
+def _iter_zip_images(fileobj, max_images: int) -> Iterator[Tuple[str, bytes]]:
+    with zipfile.ZipFile(fileobj) as archive:
+        members = archive.infolist()
+        if len(members) > PREDICT_BATCH_MAX_MEMBERS:
+            _too_many_members()
+        images = [info for info in members if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)]
+        # The central directory lists every entry, so the image limit can fail before any is read
+        if len(images) > max_images:
+            _too_many_images()
+        for info in images:
+            with archive.open(info) as member:
+                yield info.filename, _read_image(member, info.filename, info.file_size)
+
+def _iter_tar_images(fileobj) -> Iterator[Tuple[str, bytes]]:
+    # Stream mode reads members in order without seeking back
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for count, member in enumerate(archive, 1):
+            if count > PREDICT_BATCH_MAX_MEMBERS:
+                _too_many_members()
+            if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield member.name, _read_image(archive.extractfile(member), member.name, member.size)
+
+async def predict_chunks(
+    items: AsyncIterator[Tuple[str, bytes]],
+    scope: Optional[str] = None
+) -> AsyncIterator[Tuple[List[dict], List[Optional[CacheEntry]], List[bytes]]]:
+    """Decode and predict images in chunks, one forward pass per chunk
+
+    Yields the per-image results of each chunk with their cache entries and image bytes.
+    """
+    chunk = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= PREDICT_BATCH_CHUNK_SIZE:
+            yield await _predict_chunk(chunk, scope)
+            chunk = []
+    if chunk:
+        yield await _predict_chunk(chunk, scope)
+
+async def _predict_chunk(chunk: List[Tuple[str, bytes]], scope: Optional[str] = None) -> Tuple[List[dict], List[Optional[CacheEntry]], List[bytes]]:
+    decoded = await asyncio.gather(*(inference_executor.decode_and_hash(contents) for _, contents in chunk))
+    
+    results, entries, misses = [], [], []
+    for (name, _), (image, digest, phash) in zip(chunk, decoded):
+        if image is None:
+            results.append({"filename": name, "error": "Invalid image file"})
+            entries.append(None)
+            continue
+        
+        entry = prediction_cache.get(digest, phash, scope)
+        if entry is None:
+            misses.append((len(results), image, digest, phash))
+        results.append({"filename": name, "cached": entry is not None})
+        entries.append(entry)
+    
+    if misses:
+        # Through the shared queue, so batch requests share its bound and batching with /predict
+        predictions = await inference_queue.submit_many([image for _, image, _, _ in misses])
+        for (index, _, digest, phash), prediction in zip(misses, predictions):
+            entries[index] = prediction_cache.put(digest, phash, prediction, scope)
+    
+    for result, entry in zip(results, entries):
+        if entry is not None:
+            result.update(entry.prediction)
+    return results, entries, [contents for _, contents in chunk]
+
+async def collect_detections(results: List[dict], entries: List[Optional[CacheEntry]], images: List[bytes]) -> List[dict]:
+    """One detection per newly detected scene, attaching incident ids to the results"""
+    detections = []
+    for result, entry, contents in zip(results, entries, images):
+        if entry is None or not entry.prediction["isAccident"]:
+            continue
+        incident_id, new = prediction_cache.reserve_incident(entry)
+        result["incident_id"] = incident_id
+        if new:
+            detections.append(await spool_detection(
+                incident_id, result["filename"], entry.prediction["confidence"], contents, entry.key
+            ))
+    return detections
+
+async def queue_or_abandon(detections: List[dict], user_id: str, latitude: Optional[float], longitude: Optional[float]):
+    try:
+        await queue_detected_incidents(detections, user_id, latitude, longitude)
+    except BaseException:
+        await abandon_detections(detections)
+        raise
@@ -1,94 +1,275 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, UploadFile, File, Form
+from pydantic import BaseModel
+from typing import AsyncIterator, Optional
 import os
-from datetime import datetime
-from ..db.supabase import supabase_client
-from ..auth.auth import get_current_user
+import uuid
+from ..services.media import is_sha256, media_library
+from ..services.uploads import (
+    MAX_IMAGE_SIZE, MAX_VIDEO_SIZE, UPLOAD_CHUNK_SIZE, SpooledUpload, UploadError, read_file, spool, upload_sessions
+)
+from ..auth.auth import User, get_current_user
+from ..ml.video import video_analyzer
+from .incidents import queue_detected_incidents
 from loguru import logger
 
-router = APIRouter()
+router = APIRouter(prefix="/api/media")
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov'}
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+VIDEO_EXTENSIONS = {'mp4', 'mov'}
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@router.post("/upload")
-async def upload_media(
-    file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user)
+def check_filename(filename: Optional[str]):
+    if not filename:
+        raise HTTPException(status_code=400, detail="No file selected")
+    if not allowed_file(filename):
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+
+def size_limit(filename: str) -> int:
+    return MAX_VIDEO_SIZE if filename.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS else MAX_IMAGE_SIZE
+
+async def iter_upload_file(file: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+async def analyze_uploaded_video(
+    path: str,
+    user_id: str,
+    url: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
 ):
-    """Upload media file to Supabase Storage"""
+    """Run accident detection over an uploaded video and queue detected incidents
+
+    Detections go through the same pipeline as /predict, which geocodes,
+    inserts and broadcasts them; the stored video is their image.
+    """
+    try:
+        async for event in video_analyzer.analyze(path):
+            await queue_detected_incidents([{
+                "id": str(uuid.uuid4()),
+                "filename": os.path.basename(url),
+                "confidence": event["confidence"],
+                "image_url": url,
+                "description": (
+                    f"AI-detected accident at {event['timestamp']:.1f}s "
+                    f"with {event['confidence']:.2%} confidence"
+                )
+            }], user_id, latitude, longitude)
+            logger.info(f"Video incident detected at frame {event['frame']} of {url}")
+    except Exception as e:
+        logger.error(f"Error analysing video: {str(e)}")
+    finally:
+        os.remove(path)
+
+async def store_upload(
+    upload: SpooledUpload,
+    user_id: str,
+    original_filename: str,
+    background_tasks: BackgroundTasks,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
+) -> dict:
+    """Send a spooled upload to storage and queue video analysis; takes ownership of the file"""
+    keep_file = False
     try:
-        # Validate file
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No file selected")
-        
-        if not allowed_file(file.filename):
-            raise HTTPException(
-                status_code=400,
-                detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-            )
-        
-        # Read file content
-        content = await file.read()
-        
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail="File too large")
-        
-        # Generate unique filename
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        extension = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"{current_user['id']}/{timestamp}.{extension}"
-        
-        # Upload to Supabase Storage
+        # Store by content so the same file uploaded again is kept once
         try:
-            result = supabase_client.storage.from_("media").upload(
-                file_path=filename,
-                file=content,
-                file_options={"content-type": file.content_type}
-            )
-            
-            # Get public URL
-            url = supabase_client.storage.from_("media").get_public_url(filename)
-            
-            return {
-                "message": "File uploaded successfully",
-                "url": url,
-                "filename": filename
-            }
+            media_object = await media_library.add(upload, user_id, original_filename)
         except Exception as e:
             logger.error(f"Error uploading to Supabase Storage: {str(e)}")
             raise HTTPException(status_code=500, detail="Error uploading file")
-            
+        filename = f"{user_id}/{upload.sha256}.{upload.extension}"
+        media = media_library.describe(media_object)
+
+        # Analyse new videos for accidents once the response is sent; a duplicate was analysed on first upload
+        analysis = None
+        if upload.extension in VIDEO_EXTENSIONS and media_object["created"]:
+            background_tasks.add_task(analyze_uploaded_video, upload.path, user_id, media["url"], latitude, longitude)
+            keep_file = True
+            analysis = "queued"
+
+        return {
+            "message": "File uploaded successfully",
+            **media,
+            "filename": filename,
+            "duplicate": not media_object["created"],
+            "analysis": analysis
+        }
+    finally:
+        if not keep_file:
+            await upload.discard()
+
+async def spool_or_raise(chunks: AsyncIterator[bytes], max_size: int) -> SpooledUpload:
+    try:
+        return await spool(chunks, max_size)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.post("/upload")
+async def upload_media(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    latitude: Optional[float] = Form(None, ge=-90, le=90),
+    longitude: Optional[float] = Form(None, ge=-180, le=180),
+    current_user: User = Depends(get_current_user)
+):
+    """Upload media file to Supabase Storage
+
+    Multipart bodies are received in full before this runs; use /upload/stream
+    or the resumable /uploads endpoints for large videos.
+    """
+    try:
+        check_filename(file.filename)
+        max_size = size_limit(file.filename)
+        if file.size is not None and file.size > max_size:
+            raise HTTPException(status_code=413, detail="File too large")
+
+        upload = await spool_or_raise(iter_upload_file(file), max_size)
+        return await store_upload(upload, current_user.id, file.filename, background_tasks, latitude, longitude)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in upload_media: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete("/{filename}")
+@router.put("/upload/stream")
+async def upload_media_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    filename: str = Query(...),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    content_length: Optional[int] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Upload a raw request body, streamed to disk and aborted as soon as it passes the size limit"""
+    try:
+        check_filename(filename)
+        max_size = size_limit(filename)
+        if content_length is not None and content_length > max_size:
+            raise HTTPException(status_code=413, detail="File too large")
+
+        upload = await spool_or_raise(request.stream(), max_size)
+        return await store_upload(upload, current_user.id, filename, background_tasks, latitude, longitude)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in upload_media_stream: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/uploads")
+async def create_upload_session(
+    session: UploadSessionCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Start a resumable upload; send the bytes with PATCH /uploads/{id} and finish with /complete"""
+    check_filename(session.filename)
+    if session.size > size_limit(session.filename):
+        raise HTTPException(status_code=413, detail="File too large")
+    try:
+        created = upload_sessions.create(current_user.id, session.filename, session.size, session.latitude, session.longitude)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return dict(created, chunk_size=UPLOAD_CHUNK_SIZE)
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_session(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Current offset of a resumable upload, to resume after a dropped connection"""
+    try:
+        return upload_sessions.get(upload_id, current_user.id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.patch("/uploads/{upload_id}")
+async def append_upload_session(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    current_user: User = Depends(get_current_user)
+):
+    """Append the request body at Upload-Offset"""
+    try:
+        return await upload_sessions.append(upload_id, current_user.id, upload_offset, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload_session(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
+):
+    """Verify and store a fully received resumable upload"""
+    try:
+        session = upload_sessions.get(upload_id, current_user.id)
+        path = upload_sessions.complete_path(upload_id, current_user.id)
+        # Re-read the assembled file to hash and sniff it; the session may span restarts
+        upload = await spool_or_raise(read_file(path), size_limit(session["filename"]))
+        upload_sessions.remove(upload_id)
+        return await store_upload(upload, current_user.id, session["filename"], background_tasks, session["latitude"], session["longitude"])
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error completing upload {upload_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/objects/{sha256}")
+async def get_media_object(
+    sha256: str,
+    current_user: User = Depends(get_current_user)
+):
+    """URLs of a stored file and its thumbnail, preview and keyframe derivatives once generated"""
+    if not is_sha256(sha256):
+        raise HTTPException(status_code=404, detail="Media not found")
+    media_object = await media_library.get(sha256)
+    if media_object is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    return media_library.describe(media_object)
+
+@router.delete("/{filename:path}")
 async def delete_media(
     filename: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
-    """Delete media file from Supabase Storage"""
+    """Release a media file; it is deleted from storage once no user references it"""
     try:
         # Verify file ownership
-        if not filename.startswith(f"{current_user['id']}/"):
+        if not filename.startswith(f"{current_user.id}/"):
             raise HTTPException(status_code=403, detail="Not authorized to delete this file")
-        
-        # Delete from Supabase Storage
+
+        sha256 = filename[len(current_user.id) + 1:].split(".", 1)[0]
+        if not is_sha256(sha256):
+            raise HTTPException(status_code=404, detail="File not found")
         try:
-            supabase_client.storage.from_("media").remove([filename])
-            return {"message": "File deleted successfully"}
+            removed = await media_library.remove(current_user.id, sha256)
         except Exception as e:
             logger.error(f"Error deleting from Supabase Storage: {str(e)}")
             raise HTTPException(status_code=500, detail="Error deleting file")
-            
+        if not removed:
+            raise HTTPException(status_code=404, detail="File not found")
+        return {"message": "File deleted successfully"}
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in delete_media: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
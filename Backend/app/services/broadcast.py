@@ -0,0 +1,214 @@
+import asyncio
+import itertools
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set
+from socketio.async_manager import AsyncManager
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Broadcast Configuration
+SOCKET_BATCH_WINDOW = float(os.getenv("SOCKET_BATCH_WINDOW", "0.05"))  # seconds events are coalesced for
+SOCKET_CLIENT_QUEUE = int(os.getenv("SOCKET_CLIENT_QUEUE", "256"))  # pending events kept per client
+SOCKET_TRANSPORT_HIGH_WATER = int(os.getenv("SOCKET_TRANSPORT_HIGH_WATER", "64"))  # Engine.IO packets queued before holding back
+SCHEDULED_EVENTS = {"new_incident", "incident"}
+ENCODINGS = {"json", "msgpack"}
+
+def msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class ClientQueue:
+    """Events waiting for one client, keyed so a newer version of the same incident replaces the older"""
+
+    __slots__ = ("namespace", "eio_sid", "items", "dropped")
+
+    def __init__(self, namespace: str, eio_sid: str):
+        self.namespace = namespace
+        self.eio_sid = eio_sid
+        self.items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.dropped = 0
+
+class BroadcastScheduler:
+    """Per-client bounded, coalescing delivery of high-volume events
+
+    Scheduled events are queued per recipient on this worker rather than
+    written straight to the transport. Every window the queues are flushed:
+    clients that asked for batches get one <event>_batch message per event
+    type (a list, or msgpack bytes), the rest get the events one by one.
+    An event for an incident that is already queued replaces it; a full
+    queue drops its oldest event, and the client is told how many it missed
+    so it can refetch. Clients whose Engine.IO queue is past the high-water
+    mark are skipped until they drain, so a slow client only ever holds
+    max_queue events here.
+    """
+
+    def __init__(
+        self,
+        manager: AsyncManager,
+        window: float = SOCKET_BATCH_WINDOW,
+        max_queue: int = SOCKET_CLIENT_QUEUE,
+        high_water: int = SOCKET_TRANSPORT_HIGH_WATER,
+        events: Set[str] = SCHEDULED_EVENTS
+    ):
+        self.manager = manager
+        self.window = window
+        self.max_queue = max(1, max_queue)
+        self.high_water = high_water
+        self.events = events
+        self.stats = {"queued": 0, "merged": 0, "dropped": 0, "held": 0, "messages": 0}
+        self._queues: Dict[str, ClientQueue] = {}
+        self._options: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sequence = itertools.count()
+
+    def configure(self, sid: str, batch: bool = False, encoding: str = "json"):
+        """Delivery options for a client; msgpack falls back to json when unavailable"""
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {', '.join(sorted(ENCODINGS))}")
+        if encoding == "msgpack" and not msgpack_available():
+            encoding = "json"
+        self._options[sid] = {"batch": bool(batch), "encoding": encoding}
+        return self._options[sid]
+
+    def forget(self, sid: str):
+        self._queues.pop(sid, None)
+        self._options.pop(sid, None)
+        self._dirty.discard(sid)
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue.items) for queue in self._queues.values())
+
+    def _key(self, event: str, data: Any) -> Hashable:
+        if isinstance(data, dict) and data.get("id") is not None:
+            return event, str(data["id"])
+        return event, next(self._sequence)
+
+    def enqueue(self, event: str, data: Any, namespace: str, room: Any = None, skip_sid: Any = None):
+        """Queue an event for this worker's clients in room (a room, list of rooms or None for all)"""
+        skip = set(skip_sid) if isinstance(skip_sid, list) else {skip_sid}
+        key = self._key(event, data)
+        for sid, eio_sid in self.manager.get_participants(namespace, room):
+            if sid in skip:
+                continue
+            queue = self._queues.get(sid)
+            if queue is None:
+                queue = self._queues[sid] = ClientQueue(namespace, eio_sid)
+            if key in queue.items:
+                self.stats["merged"] += 1
+            elif len(queue.items) >= self.max_queue:
+                queue.items.popitem(last=False)
+                queue.dropped += 1
+                self.stats["dropped"] += 1
+            queue.items[key] = (event, data)
+            self.stats["queued"] += 1
+            self._dirty.add(sid)
+        if self._dirty:
+            self._start()
+            self._wake.set()
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            # Let the burst accumulate, then send it as one flush
+            await asyncio.sleep(self.window)
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing broadcast queues: {str(e)}")
+            if self._dirty:
+                # Held-back clients are retried next window
+                self._wake.set()
+
+    def _backlog(self, eio_sid: str) -> int:
+        socket = self.manager.server.eio.sockets.get(eio_sid) if self.manager.server else None
+        return socket.queue.qsize() if socket is not None else 0
+
+    async def flush(self):
+        sends = []
+        for sid in list(self._dirty):
+            queue = self._queues.get(sid)
+            if queue is None:
+                self._dirty.discard(sid)
+                continue
+            if self._backlog(queue.eio_sid) > self.high_water:
+                self.stats["held"] += 1
+                continue
+            self._dirty.discard(sid)
+            items = list(queue.items.values())
+            dropped = queue.dropped
+            queue.items.clear()
+            queue.dropped = 0
+            sends.append(self._send(sid, queue.namespace, items, dropped))
+        if sends:
+            await asyncio.gather(*sends, return_exceptions=True)
+
+    async def _send(self, sid: str, namespace: str, items: List[tuple], dropped: int):
+        options = self._options.get(sid, {})
+        if dropped:
+            await self._deliver("events_dropped", {"count": dropped}, namespace, sid)
+        if not options.get("batch"):
+            for event, data in items:
+                await self._deliver(event, data, namespace, sid)
+            return
+
+        batches: Dict[str, list] = {}
+        for event, data in items:
+            batches.setdefault(event, []).append(data)
+        for event, batch in batches.items():
+            if options.get("encoding") == "msgpack":
+                import msgpack
+                payload = msgpack.packb(batch, default=str)
+            else:
+                payload = batch
+            await self._deliver(f"{event}_batch", payload, namespace, sid)
+
+    async def _deliver(self, event: str, data: Any, namespace: str, sid: str):
+        self.stats["messages"] += 1
+        await AsyncManager.emit(self.manager, event, data, namespace, room=sid)
+
+    async def stop(self):
+        """Send whatever is queued and stop the flush task"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._dirty.update(self._queues)
+        self.high_water = float("inf")
+        await self.flush()
+
+class ScheduledEmitMixin(AsyncManager):
+    """Client manager mixin routing scheduled events through a BroadcastScheduler
+
+    List it after a pub/sub manager (class M(AsyncPubSubManager, ScheduledEmitMixin))
+    so events cross workers first and each worker schedules delivery to its own clients.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scheduler = BroadcastScheduler(self)
+
+    async def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        if callback is not None or event not in self.scheduler.events:
+            return await super().emit(
+                event, data, namespace, room=room, skip_sid=skip_sid, callback=callback, to=to, **kwargs
+            )
+        self.scheduler.enqueue(event, data, namespace or "/", to or room, skip_sid)
+
+    async def disconnect(self, sid, namespace, **kwargs):
+        self.scheduler.forget(sid)
+        return await super().disconnect(sid, namespace, **kwargs)
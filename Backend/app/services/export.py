@@ -0,0 +1,100 @@
+import csv
+import io
+import os
+import zlib
+from typing import AsyncIterator, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Export Configuration
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "5000"))
+
+EXPORT_COLUMNS = [
+    "id", "created_at", "updated_at", "user_id", "location", "latitude",
+    "longitude", "description", "severity", "status", "image_url"
+]
+FLOAT_COLUMNS = {"latitude", "longitude"}
+TIMESTAMP_COLUMNS = {"created_at", "updated_at"}
+
+async def csv_stream(pages: AsyncIterator[List[dict]], columns: List[str] = EXPORT_COLUMNS) -> AsyncIterator[bytes]:
+    """Encode pages of rows as CSV, one chunk per page"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Compress a byte stream into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller in chunks"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+async def parquet_stream(pages: AsyncIterator[List[dict]], columns: List[str] = EXPORT_COLUMNS) -> AsyncIterator[bytes]:
+    """Encode pages of rows as Parquet, one row group per page (needs pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    def field_type(column: str):
+        if column in FLOAT_COLUMNS:
+            return pa.float64()
+        if column in TIMESTAMP_COLUMNS:
+            return pa.timestamp("us", tz="UTC")
+        return pa.string()
+
+    schema = pa.schema([(column, field_type(column)) for column in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        async for page in pages:
+            arrays = []
+            for field in schema:
+                values = [row.get(field.name) for row in page]
+                if field.name in TIMESTAMP_COLUMNS:
+                    arrays.append(pc.cast(pa.array(values, pa.string()), pa.timestamp("us", tz="UTC")))
+                else:
+                    arrays.append(pa.array(values, field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
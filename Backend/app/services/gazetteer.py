@@ -0,0 +1,162 @@
+import json
+import os
+from typing import Dict, Optional
+import numpy as np
+from loguru import logger
+from dotenv import load_dotenv
+from .hotspots import haversine_m
+
+load_dotenv()
+
+# Gazetteer Configuration
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")  # GeoNames TSV, e.g. cities500.txt; empty disables
+GAZETTEER_INDEX_DIR = os.getenv("GAZETTEER_INDEX_DIR", "cache/gazetteer")
+GAZETTEER_CELL_DEG = float(os.getenv("GAZETTEER_CELL_DEG", "0.25"))
+GAZETTEER_MAX_DISTANCE_KM = float(os.getenv("GAZETTEER_MAX_DISTANCE_KM", "25"))
+
+# GeoNames main table columns
+NAME, LATITUDE, LONGITUDE, FEATURE_CLASS, COUNTRY, POPULATION = 1, 4, 5, 6, 8, 14
+ARRAYS = ("latitude", "longitude", "country", "population", "name_offsets", "names", "cell_keys", "cell_starts")
+
+class Gazetteer:
+    """Nearest-place lookups over a GeoNames extract, stored as memory-mapped arrays
+
+    Places are sorted into a latitude/longitude grid of cell_deg cells; each
+    occupied cell is a contiguous slice found by binary search on its key.
+    The arrays are written once as .npy files next to a stamp of the source
+    file and mapped read-only afterwards, so startup does not parse the TSV.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], cell_deg: float, max_distance_km: float = GAZETTEER_MAX_DISTANCE_KM):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.cell_deg = cell_deg
+        self.max_distance_m = max_distance_km * 1000
+        self.columns = int(np.ceil(360 / cell_deg))
+
+    def __len__(self) -> int:
+        return len(self.latitude)
+
+    @staticmethod
+    def _stamp(path: str, cell_deg: float) -> dict:
+        stat = os.stat(path)
+        return {"source": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime, "cell_deg": cell_deg}
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH, directory: str = GAZETTEER_INDEX_DIR, cell_deg: float = GAZETTEER_CELL_DEG) -> "Gazetteer":
+        """Map the index for a GeoNames file, building it first if it is missing or stale"""
+        stamp = cls._stamp(path, cell_deg)
+        stamp_path = os.path.join(directory, "stamp.json")
+        try:
+            with open(stamp_path) as stamp_file:
+                current = json.load(stamp_file) == stamp
+        except (OSError, ValueError):
+            current = False
+        if not current:
+            cls.build(path, directory, cell_deg)
+            with open(stamp_path, "w") as stamp_file:
+                json.dump(stamp, stamp_file)
+
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        gazetteer = cls(arrays, cell_deg)
+        logger.info(f"Gazetteer mapped with {len(gazetteer)} places from {directory}")
+        return gazetteer
+
+    @staticmethod
+    def build(path: str, directory: str, cell_deg: float = GAZETTEER_CELL_DEG):
+        """Parse a GeoNames TSV and write the sorted index arrays"""
+        latitude, longitude, country, population, names = [], [], [], [], []
+        with open(path, encoding="utf-8") as source:
+            for line in source:
+                fields = line.rstrip("\n").split("\t")
+                # Only populated places make sensible addresses
+                if len(fields) <= POPULATION or fields[FEATURE_CLASS] != "P":
+                    continue
+                latitude.append(float(fields[LATITUDE]))
+                longitude.append(float(fields[LONGITUDE]))
+                country.append(fields[COUNTRY])
+                population.append(int(fields[POPULATION] or 0))
+                names.append(fields[NAME].encode("utf-8"))
+
+        latitude = np.array(latitude, dtype=np.float32)
+        longitude = np.array(longitude, dtype=np.float32)
+        keys = cell_keys(latitude, longitude, cell_deg)
+        order = np.argsort(keys, kind="stable")
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+
+        encoded = [names[index] for index in order]
+        lengths = np.fromiter((len(name) for name in encoded), dtype=np.int64, count=len(encoded))
+        arrays = {
+            "latitude": latitude[order],
+            "longitude": longitude[order],
+            "country": np.array(country, dtype="S2")[order],
+            "population": np.array(population, dtype=np.int64)[order],
+            "name_offsets": np.concatenate([[0], np.cumsum(lengths)]),
+            "names": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "cell_keys": unique_keys,
+            # One sentinel past the end so each cell is starts[i]:starts[i + 1]
+            "cell_starts": np.append(starts, len(order)),
+        }
+        os.makedirs(directory, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        logger.info(f"Gazetteer index built with {len(order)} places from {path}")
+
+    def name(self, index: int) -> str:
+        return bytes(self.names[self.name_offsets[index]:self.name_offsets[index + 1]]).decode("utf-8")
+
+    def _candidates(self, row: int, column: int, ring: int) -> np.ndarray:
+        """Place indices in the cells at Chebyshev distance `ring` from a cell"""
+        if ring == 0:
+            rows, columns = np.array([row]), np.array([column])
+        else:
+            span = np.arange(-ring, ring + 1)
+            rows = np.concatenate([np.full(len(span), row - ring), np.full(len(span), row + ring), row + span[1:-1], row + span[1:-1]])
+            columns = np.concatenate([column + span, column + span, np.full(len(span) - 2, column - ring), np.full(len(span) - 2, column + ring)])
+        keys = rows * self.columns + columns % self.columns
+        positions = np.searchsorted(self.cell_keys, keys)
+        found = positions < len(self.cell_keys)
+        positions, keys = positions[found], keys[found]
+        positions = positions[self.cell_keys[positions] == keys]
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(self.cell_starts[p], self.cell_starts[p + 1]) for p in positions])
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[dict]:
+        """Closest populated place within max_distance_km, or None"""
+        if len(self) == 0:
+            return None
+        row, column = cell_position(latitude, longitude, self.cell_deg)
+        # A cell is at least this many metres across at this latitude (shrinks towards the poles)
+        cell_m = self.cell_deg * 111_320 * max(np.cos(np.radians(min(abs(latitude) + self.cell_deg, 90))), 0.01)
+        best, best_distance = -1, np.inf
+        ring = 0
+        while ring * cell_m <= min(best_distance, self.max_distance_m) + cell_m and ring <= self.columns // 2:
+            candidates = self._candidates(row, column, ring)
+            if len(candidates):
+                distances = haversine_m(self.latitude[candidates].astype(np.float64), self.longitude[candidates].astype(np.float64), latitude, longitude)
+                closest = int(np.argmin(distances))
+                if distances[closest] < best_distance:
+                    best, best_distance = int(candidates[closest]), float(distances[closest])
+            ring += 1
+
+        if best < 0 or best_distance > self.max_distance_m:
+            return None
+        return {
+            "name": self.name(best),
+            "country": self.country[best].decode("ascii"),
+            "latitude": float(self.latitude[best]),
+            "longitude": float(self.longitude[best]),
+            "population": int(self.population[best]),
+            "distance_km": round(best_distance / 1000, 3)
+        }
+
+def cell_position(latitude, longitude, cell_deg: float):
+    row = np.floor((np.asarray(latitude) + 90) / cell_deg).astype(np.int64)
+    column = np.floor((np.asarray(longitude) + 180) / cell_deg).astype(np.int64)
+    return row, column
+
+def cell_keys(latitude: np.ndarray, longitude: np.ndarray, cell_deg: float) -> np.ndarray:
+    row, column = cell_position(latitude, longitude, cell_deg)
+    columns = int(np.ceil(360 / cell_deg))
+    return row * columns + column % columns
@@ -1,69 +1,323 @@
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+from geopy.exc import GeocoderServiceError
+import asyncio
+import json
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 from loguru import logger
-from typing import Optional, Dict, Tuple
+from typing import Callable, Dict, Optional, Tuple
+from .gazetteer import GAZETTEER_PATH, Gazetteer
 
 load_dotenv()
 
+# Geocoding Configuration
+GEOCODER = os.getenv("GEOCODER", "nominatim")  # "nominatim" or "stub"
+GEOCODING_PRECISION = int(os.getenv("GEOCODING_PRECISION", "4"))  # ~11m
+GEOCODING_CACHE_SIZE = int(os.getenv("GEOCODING_CACHE_SIZE", "10000"))
+GEOCODING_CACHE_PATH = os.getenv("GEOCODING_CACHE_PATH", "cache/geocoding.sqlite3")  # empty disables
+GEOCODING_RATE = float(os.getenv("GEOCODING_RATE", "1"))  # requests per second
+GEOCODING_BURST = int(os.getenv("GEOCODING_BURST", "1"))
+GEOCODING_TIMEOUT = float(os.getenv("GEOCODING_TIMEOUT", "5"))
+
+UNKNOWN_LOCATION = {
+    "address": "Unknown location",
+    "city": "Unknown",
+    "postal_code": "Unknown"
+}
+UNAVAILABLE_LOCATION = {
+    "address": "Location service unavailable",
+    "city": "Unknown",
+    "postal_code": "Unknown"
+}
+
+class Geocoder:
+    """Blocking geocoding backend; GeocodingService calls it from a worker thread"""
+
+    def reverse(self, latitude: float, longitude: float) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def geocode(self, address: str) -> Optional[Tuple[float, float]]:
+        raise NotImplementedError
+
+class NominatimGeocoder(Geocoder):
+    def __init__(self, timeout: float = GEOCODING_TIMEOUT):
+        self.geolocator = Nominatim(user_agent="sage_guard", timeout=timeout)
+
+    def reverse(self, latitude: float, longitude: float) -> Optional[Dict]:
+        location = self.geolocator.reverse(f"{latitude}, {longitude}")
+        if not location:
+            return None
+        raw = location.raw
+        return {
+            "address": location.address,
+            "city": raw.get("address", {}).get("city", "Unknown"),
+            "postal_code": raw.get("address", {}).get("postcode", "Unknown"),
+            "raw": raw
+        }
+
+    def geocode(self, address: str) -> Optional[Tuple[float, float]]:
+        location = self.geolocator.geocode(address)
+        if not location:
+            return None
+        return (location.latitude, location.longitude)
+
+class StubGeocoder(Geocoder):
+    """Offline geocoder for tests and local development; answers from the coordinates alone"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def reverse(self, latitude: float, longitude: float) -> Optional[Dict]:
+        self.calls += 1
+        time.sleep(self.delay)
+        return {
+            "address": f"{latitude:.5f}, {longitude:.5f}",
+            "city": "Unknown",
+            "postal_code": "Unknown"
+        }
+
+    def geocode(self, address: str) -> Optional[Tuple[float, float]]:
+        self.calls += 1
+        time.sleep(self.delay)
+        return None
+
+class TokenBucket:
+    """Async token bucket allowing `rate` calls per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float = GEOCODING_RATE, burst: int = GEOCODING_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class GeocodeCache:
+    """LRU cache in memory, backed by a SQLite file that survives restarts"""
+
+    def __init__(self, max_size: int = GEOCODING_CACHE_SIZE, path: Optional[str] = GEOCODING_CACHE_PATH):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("create table if not exists geocodes (key text primary key, value text not null)")
+            self._db.commit()
+
+    def _remember(self, key: str, value: object):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _read(self, key: str) -> Optional[str]:
+        with self._db_lock:
+            row = self._db.execute("select value from geocodes where key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _write(self, key: str, value: str):
+        with self._db_lock:
+            self._db.execute("insert or replace into geocodes (key, value) values (?, ?)", (key, value))
+            self._db.commit()
+
+    async def get(self, key: str) -> Tuple[bool, object]:
+        """(found, value); None is a valid cached value for places with no result"""
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+        if self._db is not None:
+            stored = await asyncio.to_thread(self._read, key)
+            if stored is not None:
+                self.hits += 1
+                value = json.loads(stored)
+                self._remember(key, value)
+                return True, value
+        self.misses += 1
+        return False, None
+
+    async def put(self, key: str, value: object):
+        self._remember(key, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._write, key, json.dumps(value))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
 class GeocodingService:
-    def __init__(self):
-        self.geolocator = Nominatim(user_agent="sage_guard")
+    """Cached, rate-limited geocoding that never blocks the event loop
+
+    Coordinates are rounded to GEOCODING_PRECISION decimals before lookup,
+    concurrent lookups of the same key share one request, and requests to
+    the backend pass through a token bucket and run in a worker thread.
+    With a gazetteer loaded, reverse lookups are answered with the nearest
+    known place and only reach the backend when no place is close enough
+    or a detailed address is asked for.
+    """
+
+    def __init__(
+        self,
+        geocoder: Optional[Geocoder] = None,
+        cache: Optional[GeocodeCache] = None,
+        limiter: Optional[TokenBucket] = None,
+        precision: int = GEOCODING_PRECISION,
+        gazetteer: Optional[Gazetteer] = None
+    ):
+        self.geocoder = geocoder or create_geocoder()
+        self.cache = cache or GeocodeCache()
+        self.limiter = limiter or TokenBucket()
+        self.precision = precision
+        self.gazetteer = gazetteer
+        self.gazetteer_hits = 0
         self.google_maps_api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-    
-    async def reverse_geocode(self, latitude: float, longitude: float) -> Dict:
-        """Convert coordinates to address"""
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def _fetch(self, key: str, call: Callable[[], object]) -> object:
         try:
-            location = self.geolocator.reverse(f"{latitude}, {longitude}")
-            if not location:
-                return {
-                    "address": "Unknown location",
-                    "city": "Unknown",
-                    "postal_code": "Unknown"
-                }
-            
-            address = location.address
-            raw = location.raw
-            
-            return {
-                "address": address,
-                "city": raw.get("address", {}).get("city", "Unknown"),
-                "postal_code": raw.get("address", {}).get("postcode", "Unknown"),
-                "raw": raw
-            }
-        except (GeocoderTimedOut, GeocoderUnavailable) as e:
+            await self.limiter.acquire()
+            value = await asyncio.to_thread(call)
+            await self.cache.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _lookup(self, key: str, call: Callable[[], object]) -> object:
+        found, value = await self.cache.get(key)
+        if found:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            # The shared lookup is its own task, so a caller that gives up (a timeout,
+            # a disconnect) only stops waiting and never cancels it for the others
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(key, call))
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(task)
+
+    async def start(self, path: str = GAZETTEER_PATH):
+        """Map the offline gazetteer, when one is configured"""
+        if not path or self.gazetteer is not None:
+            return
+        try:
+            self.gazetteer = await asyncio.to_thread(Gazetteer.load, path)
+        except Exception as e:
+            logger.error(f"Error loading gazetteer {path}, using the remote geocoder only: {str(e)}")
+
+    def round(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        return round(latitude, self.precision), round(longitude, self.precision)
+
+    def nearest_place(self, latitude: float, longitude: float) -> Optional[Dict]:
+        if self.gazetteer is None:
+            return None
+        place = self.gazetteer.nearest(latitude, longitude)
+        if place is None:
+            return None
+        self.gazetteer_hits += 1
+        return {
+            "address": f"{place['name']}, {place['country']}",
+            "city": place["name"],
+            "postal_code": "Unknown",
+            "source": "gazetteer",
+            "distance_km": place["distance_km"]
+        }
+
+    async def reverse_geocode(self, latitude: float, longitude: float, detailed: bool = False) -> Dict:
+        """Convert coordinates to address; detailed=True always asks the remote geocoder"""
+        if not detailed:
+            place = self.nearest_place(latitude, longitude)
+            if place is not None:
+                return place
+
+        latitude, longitude = self.round(latitude, longitude)
+        try:
+            result = await self._lookup(
+                f"reverse:{latitude}:{longitude}",
+                lambda: self.geocoder.reverse(latitude, longitude)
+            )
+            return dict(result) if result else dict(UNKNOWN_LOCATION)
+        except GeocoderServiceError as e:
             logger.error(f"Geocoding error: {str(e)}")
-            return {
-                "address": "Location service unavailable",
-                "city": "Unknown",
-                "postal_code": "Unknown"
-            }
+            return dict(UNAVAILABLE_LOCATION)
         except Exception as e:
             logger.error(f"Error in reverse_geocode: {str(e)}")
             raise
-    
+
     async def geocode(self, address: str) -> Optional[Tuple[float, float]]:
         """Convert address to coordinates"""
         try:
-            location = self.geolocator.geocode(address)
-            if not location:
-                return None
-            
-            return (location.latitude, location.longitude)
-        except (GeocoderTimedOut, GeocoderUnavailable) as e:
+            result = await self._lookup(
+                f"geocode:{' '.join(address.lower().split())}",
+                lambda: self.geocoder.geocode(address)
+            )
+            return tuple(result) if result else None
+        except GeocoderServiceError as e:
             logger.error(f"Geocoding error: {str(e)}")
             return None
         except Exception as e:
             logger.error(f"Error in geocode: {str(e)}")
             raise
-    
+
+    async def describe(self, latitude: float, longitude: float, timeout: float = GEOCODING_TIMEOUT) -> Optional[str]:
+        """Address of a location for incident records, or None if it can't be had in time"""
+        try:
+            result = await asyncio.wait_for(self.reverse_geocode(latitude, longitude), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Geocoding {latitude}, {longitude} took longer than {timeout}s")
+            return None
+        except asyncio.CancelledError:
+            # Only a cancellation of this task itself propagates; a stray one from the lookup doesn't
+            task = asyncio.current_task()
+            if task is not None and task.cancelling():
+                raise
+            logger.warning(f"Geocoding {latitude}, {longitude} was cancelled")
+            return None
+        except Exception as e:
+            logger.warning(f"Could not geocode {latitude}, {longitude}: {str(e)}")
+            return None
+        if result["address"] in (UNKNOWN_LOCATION["address"], UNAVAILABLE_LOCATION["address"]):
+            return None
+        return result["address"]
+
     async def get_location_details(self, latitude: float, longitude: float) -> Dict:
         """Get detailed location information"""
         try:
             # First try reverse geocoding
-            address_info = await self.reverse_geocode(latitude, longitude)
-            
+            address_info = await self.reverse_geocode(latitude, longitude, detailed=True)
+
             # If we have Google Maps API key, get additional details
             if self.google_maps_api_key:
                 # TODO: Implement Google Maps API calls for additional details
@@ -72,7 +326,7 @@ class GeocodingService:
                 # - Traffic information
                 # - Road conditions
                 pass
-            
+
             return {
                 "coordinates": {
                     "latitude": latitude,
@@ -87,5 +341,23 @@ class GeocodingService:
             logger.error(f"Error in get_location_details: {str(e)}")
             raise
 
+    def stats(self) -> dict:
+        return dict(
+            self.cache.stats(),
+            inflight=len(self._inflight),
+            gazetteer_places=len(self.gazetteer) if self.gazetteer is not None else 0,
+            gazetteer_hits=self.gazetteer_hits
+        )
+
+    def close(self):
+        self.cache.close()
+
+def create_geocoder(name: str = GEOCODER) -> Geocoder:
+    if name == "stub":
+        return StubGeocoder()
+    if name != "nominatim":
+        raise ValueError(f"Unknown geocoder: {name}")
+    return NominatimGeocoder()
+
 # Initialize the service
-geocoding_service = GeocodingService() 
\ No newline at end of file
+geocoding_service = GeocodingService()
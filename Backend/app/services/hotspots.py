@@ -0,0 +1,360 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Hotspot Configuration
+HOTSPOT_RADIUS_M = float(os.getenv("HOTSPOT_RADIUS_M", "50"))
+HOTSPOT_MIN_INCIDENTS = int(os.getenv("HOTSPOT_MIN_INCIDENTS", "1"))
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = np.pi * EARTH_RADIUS_M / 180
+# Cell coordinates are packed into one int64 key; offset keeps them positive
+KEY_OFFSET = 1 << 31
+# Rows added since the engine's index was sorted are scanned directly until there are this many
+INDEX_TAIL_MIN = 1024
+
+def project(latitude: np.ndarray, longitude: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular projection to metres, scaled by each point's own latitude"""
+    y = latitude * METERS_PER_DEGREE
+    x = longitude * METERS_PER_DEGREE * np.cos(np.radians(latitude))
+    return x, y
+
+def haversine_m(latitude: np.ndarray, longitude: np.ndarray, center_latitude: float, center_longitude: float) -> np.ndarray:
+    """Great-circle distance in metres from one point to many"""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(center_latitude), np.radians(center_longitude)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+class GridIndex:
+    """Uniform grid over projected coordinates, stored as sorted cell keys
+
+    Points are sorted by cell so every cell is a contiguous slice found
+    with a binary search; no Python objects are kept per point.
+    """
+
+    def __init__(
+        self,
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        cell_m: float,
+        cells: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.cell_m = cell_m
+        if cells is None:
+            cells = cell_coordinates(latitude, longitude, cell_m)
+        self.cell_x, self.cell_y = cells
+        keys = self.key(self.cell_x, self.cell_y)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+
+    @staticmethod
+    def key(cell_x, cell_y):
+        return (cell_x + KEY_OFFSET) * (1 << 32) + (cell_y + KEY_OFFSET)
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Position of each key among the occupied cells, or -1"""
+        positions = np.searchsorted(self.keys, keys)
+        positions = np.minimum(positions, len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, positions, -1)
+
+def cell_coordinates(latitude: np.ndarray, longitude: np.ndarray, cell_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Grid cell of each point, cell_m wide in projected metres"""
+    x, y = project(latitude, longitude)
+    return np.floor(x / cell_m).astype(np.int64), np.floor(y / cell_m).astype(np.int64)
+
+def cluster(
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    radius_m: float,
+    min_incidents: int,
+    cells: Optional[Tuple[np.ndarray, np.ndarray]] = None
+) -> np.ndarray:
+    """Grid-based DBSCAN approximation; returns a cluster label per point, -1 for noise
+
+    Cells are radius_m / sqrt(2) wide, so all points in a cell are within
+    radius_m of each other. A cell is dense when its neighbourhood holds at
+    least min_incidents points; touching dense cells merge into one cluster,
+    and sparse cells join a neighbouring dense cell as border points.
+    cells, when given, are the points' cells at that width.
+    """
+    if len(latitude) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    index = GridIndex(latitude, longitude, radius_m / np.sqrt(2), cells)
+    cells = len(index.keys)
+    # Shifting a packed key moves it by whole cells; neighbours are within two cells
+    offsets = [dx * (1 << 32) + dy for dx in range(-2, 3) for dy in range(-2, 3) if (dx, dy) != (0, 0)]
+    neighbours = [index.lookup(index.keys + offset) for offset in offsets]
+
+    # Neighbourhood density per cell
+    density = index.counts.copy()
+    for positions in neighbours:
+        found = positions >= 0
+        density[found] += index.counts[positions[found]]
+    dense = density >= min_incidents
+
+    # Connected components of dense cells; scipy ships with scikit-learn
+    sources, targets = [], []
+    for positions in neighbours:
+        pairs = (positions >= 0) & dense
+        pairs[pairs] &= dense[positions[pairs]]
+        sources.append(np.nonzero(pairs)[0])
+        targets.append(positions[pairs])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(cells, cells))
+    _, components = connected_components(graph, directed=False)
+    labels = np.where(dense, components, cells)
+
+    # Sparse cells take the label of any dense neighbour
+    for positions in neighbours:
+        attach = ~dense & (labels == cells) & (positions >= 0)
+        attach[attach] &= dense[positions[attach]]
+        labels[attach] = labels[positions[attach]]
+
+    labels = np.where(labels == cells, -1, labels)
+    point_labels = np.empty(len(latitude), dtype=np.int64)
+    point_labels[index.order] = np.repeat(labels, index.counts)
+    return point_labels
+
+class HotspotEngine:
+    """Incident locations in growable NumPy arrays, with windowed clustering and spatial queries
+
+    Each row keeps its grid cell at the clustering width of radius_m, and the
+    rows are indexed by cell key: a sorted index, rebuilt by compact() or once
+    enough rows accumulate after it, plus the unsorted rows added since.
+    Radius and bounding box queries read only the cells they touch.
+    """
+
+    columns = ("latitude", "longitude", "timestamp", "location", "alive", "seen", "cell_x", "cell_y")
+
+    def __init__(self, radius_m: float = HOTSPOT_RADIUS_M, min_incidents: int = HOTSPOT_MIN_INCIDENTS):
+        self.radius_m = radius_m
+        self.min_incidents = min_incidents
+        self.cell_m = radius_m / np.sqrt(2)
+        self.ready = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self, capacity: int = 1024):
+        self.size = 0
+        self.latitude = np.empty(capacity, dtype=np.float64)
+        self.longitude = np.empty(capacity, dtype=np.float64)
+        self.timestamp = np.empty(capacity, dtype=np.float64)
+        self.location = np.empty(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # Rows added again since begin_sweep()
+        self.seen = np.zeros(capacity, dtype=bool)
+        self.cell_x = np.empty(capacity, dtype=np.int64)
+        self.cell_y = np.empty(capacity, dtype=np.int64)
+        self.locations: List[str] = []
+        self._location_codes: Dict[str, int] = {}
+        self._rows: Dict[str, int] = {}
+        # Rows [0, _indexed) sorted by cell key
+        self._index_keys = np.empty(0, dtype=np.int64)
+        self._index_rows = np.empty(0, dtype=np.int64)
+        self._indexed = 0
+
+    def _grow(self):
+        capacity = len(self.latitude) * 2
+        for name in self.columns:
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+    def add(self, incident_id: str, latitude: float, longitude: float, timestamp: float, location: str):
+        with self._lock:
+            row = self._rows.get(incident_id)
+            if row is not None:
+                # Rescans add the same incidents again; only a changed one gets a new row
+                if (
+                    self.latitude[row] == latitude and self.longitude[row] == longitude
+                    and self.timestamp[row] == timestamp and self.locations[self.location[row]] == location
+                ):
+                    self.seen[row] = True
+                    return
+                self.alive[self._rows.pop(incident_id)] = False
+            if self.size == len(self.latitude):
+                self._grow()
+            code = self._location_codes.get(location)
+            if code is None:
+                code = self._location_codes[location] = len(self.locations)
+                self.locations.append(location)
+
+            row = self.size
+            self.latitude[row], self.longitude[row], self.timestamp[row] = latitude, longitude, timestamp
+            self.location[row], self.alive[row], self.seen[row] = code, True, True
+            cell_x, cell_y = cell_coordinates(np.array([latitude]), np.array([longitude]), self.cell_m)
+            self.cell_x[row], self.cell_y[row] = cell_x[0], cell_y[0]
+            self._rows[incident_id] = row
+            self.size += 1
+            # Re-sorting once the tail outgrows an eighth of the index keeps adds amortised O(log n)
+            if self.size - self._indexed > max(INDEX_TAIL_MIN, self._indexed // 8):
+                self._reindex()
+
+    def remove(self, incident_id: str):
+        with self._lock:
+            row = self._rows.pop(incident_id, None)
+            if row is not None:
+                self.alive[row] = False
+
+    def begin_sweep(self):
+        """Start tracking which incidents are added again, e.g. by a full rescan"""
+        with self._lock:
+            self.seen[:self.size] = False
+
+    def end_sweep(self):
+        """Remove the incidents not added or changed since begin_sweep(), then compact"""
+        with self._lock:
+            seen = self.seen
+            self._rows = {incident_id: row for incident_id, row in self._rows.items() if seen[row]}
+            self.alive[:self.size] &= seen[:self.size]
+        self.compact()
+
+    def compact(self):
+        """Drop the rows of removed and changed incidents"""
+        with self._lock:
+            live = np.nonzero(self.alive[:self.size])[0]
+            if len(live) == self.size:
+                if self._indexed < self.size:
+                    self._reindex()
+                return
+            capacity = max(1024, len(self.latitude))
+            for name in self.columns:
+                array = getattr(self, name)
+                compacted = np.zeros(capacity, dtype=array.dtype)
+                compacted[:len(live)] = array[live]
+                setattr(self, name, compacted)
+            new_rows = np.full(self.size, -1, dtype=np.int64)
+            new_rows[live] = np.arange(len(live))
+            self._rows = {incident_id: int(new_rows[row]) for incident_id, row in self._rows.items()}
+            self.size = len(live)
+            self._reindex()
+
+    def _reindex(self):
+        """Sort every row into the cell index; called with the lock held"""
+        keys = GridIndex.key(self.cell_x[:self.size], self.cell_y[:self.size])
+        self._index_rows = np.argsort(keys, kind="stable")
+        self._index_keys = keys[self._index_rows]
+        self._indexed = self.size
+
+    def _cell_range(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> Tuple[int, int, int, int]:
+        """Bounds of the cells a latitude/longitude box overlaps: min and max cell x, then y"""
+        latitude = [min_lat, min_lat, max_lat, max_lat]
+        longitude = [min_lon, max_lon, min_lon, max_lon]
+        if min_lat < 0 < max_lat:
+            # Projected x stretches most at the equator
+            latitude += [0.0, 0.0]
+            longitude += [min_lon, max_lon]
+        cell_x, cell_y = cell_coordinates(np.array(latitude), np.array(longitude), self.cell_m)
+        return int(cell_x.min()), int(cell_x.max()), int(cell_y.min()), int(cell_y.max())
+
+    def _candidates(self, min_x: int, max_x: int, min_y: int, max_y: int) -> np.ndarray:
+        """Rows in a range of cells, dead ones included; called with the lock held
+
+        Keys of one cell column are contiguous in the index, so each column
+        is a single slice between two binary searches.
+        """
+        columns = np.arange(min_x, max_x + 1, dtype=np.int64)
+        low = np.searchsorted(self._index_keys, GridIndex.key(columns, min_y))
+        high = np.searchsorted(self._index_keys, GridIndex.key(columns, max_y), side="right")
+        lengths = high - low
+        # Concatenated slices index_rows[low:high] without a Python loop
+        ends = np.cumsum(lengths)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(low - (ends - lengths), lengths)
+
+        tail = np.arange(self._indexed, self.size)
+        cell_x, cell_y = self.cell_x[tail], self.cell_y[tail]
+        tail = tail[(cell_x >= min_x) & (cell_x <= max_x) & (cell_y >= min_y) & (cell_y <= max_y)]
+        return np.concatenate([self._index_rows[positions], tail])
+
+    def _select(
+        self,
+        start: float,
+        end: float,
+        bbox: Optional[Tuple[float, float, float, float]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Tuple[np.ndarray, np.ndarray], List[str]]:
+        """Copies of the latitude, longitude, location code and cell of the live incidents in a window
+
+        Queries run on worker threads while add() grows the arrays and compact()
+        swaps them, so the rows are selected and copied under the lock.
+        """
+        with self._lock:
+            if bbox is None:
+                rows = np.arange(self.size)
+            else:
+                min_lat, min_lon, max_lat, max_lon = bbox
+                rows = np.sort(self._candidates(*self._cell_range(*bbox)))
+                latitude, longitude = self.latitude[rows], self.longitude[rows]
+                rows = rows[(latitude >= min_lat) & (latitude <= max_lat) & (longitude >= min_lon) & (longitude <= max_lon)]
+            timestamp = self.timestamp[rows]
+            rows = rows[self.alive[rows] & (timestamp >= start) & (timestamp <= end)]
+            cells = (self.cell_x[rows], self.cell_y[rows])
+            return self.latitude[rows], self.longitude[rows], self.location[rows], cells, self.locations
+
+    def hotspots(
+        self,
+        start: float,
+        end: float,
+        limit: int,
+        radius_m: Optional[float] = None,
+        min_incidents: Optional[int] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None
+    ) -> List[dict]:
+        """Top clusters of incidents created between start and end (epoch seconds)"""
+        latitude, longitude, codes, cells, locations = self._select(start, end, bbox)
+        if len(latitude) == 0:
+            return []
+
+        radius_m = radius_m or self.radius_m
+        # The stored cells are at the clustering width of the engine's own radius
+        cells = cells if radius_m == self.radius_m else None
+        labels = cluster(latitude, longitude, radius_m, min_incidents or self.min_incidents, cells)
+        clustered = labels >= 0
+        labels, latitude, longitude, codes = labels[clustered], latitude[clustered], longitude[clustered], codes[clustered]
+        if len(labels) == 0:
+            return []
+
+        _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+        top = np.argsort(-counts, kind="stable")[:limit]
+        center_latitude = np.bincount(inverse, weights=latitude) / counts
+        center_longitude = np.bincount(inverse, weights=longitude) / counts
+
+        hotspots = []
+        for cluster_index in top:
+            members = inverse == cluster_index
+            # The most frequent location label names the hotspot
+            code = np.bincount(codes[members]).argmax()
+            hotspots.append({
+                "latitude": round(float(center_latitude[cluster_index]), 6),
+                "longitude": round(float(center_longitude[cluster_index]), 6),
+                "location": locations[code],
+                "count": int(counts[cluster_index]),
+                "bbox": [
+                    float(latitude[members].min()), float(longitude[members].min()),
+                    float(latitude[members].max()), float(longitude[members].max())
+                ]
+            })
+        return hotspots
+
+    def nearby(self, latitude: float, longitude: float, radius_m: float, start: float, end: float) -> int:
+        """Number of incidents within radius_m of a location in the window"""
+        reach_lat = radius_m / METERS_PER_DEGREE
+        reach_lon = reach_lat / max(np.cos(np.radians(min(abs(latitude) + reach_lat, 90.0))), 1e-9)
+        with self._lock:
+            rows = self._candidates(*self._cell_range(
+                latitude - reach_lat, longitude - reach_lon, latitude + reach_lat, longitude + reach_lon
+            ))
+            timestamp = self.timestamp[rows]
+            rows = rows[self.alive[rows] & (timestamp >= start) & (timestamp <= end)]
+            latitude_rows, longitude_rows = self.latitude[rows], self.longitude[rows]
+        return int(np.count_nonzero(haversine_m(latitude_rows, longitude_rows, latitude, longitude) <= radius_m))
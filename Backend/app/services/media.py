@@ -0,0 +1,279 @@
+import asyncio
+import os
+import re
+import shutil
+import uuid
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from loguru import logger
+from dotenv import load_dotenv
+from ..db.database import DatabaseError
+from ..db.repositories import MediaRepository, media_repository
+from .pipeline import Job, JobPipeline, job_pipeline
+from .storage import MediaStorage, media_storage
+from .uploads import UPLOAD_DIR, SpooledUpload
+
+load_dotenv()
+
+# Media Derivative Configuration
+MEDIA_THUMBNAIL_SIZE = int(os.getenv("MEDIA_THUMBNAIL_SIZE", "256"))
+MEDIA_PREVIEW_SIZE = int(os.getenv("MEDIA_PREVIEW_SIZE", "1280"))
+MEDIA_KEYFRAMES = int(os.getenv("MEDIA_KEYFRAMES", "8"))
+MEDIA_KEYFRAME_HEIGHT = int(os.getenv("MEDIA_KEYFRAME_HEIGHT", "120"))
+MEDIA_DERIVATIVE_QUALITY = int(os.getenv("MEDIA_DERIVATIVE_QUALITY", "80"))
+
+DERIVATIVE_DIR = os.path.join(UPLOAD_DIR, "derivatives")
+# Striped locks serialise add/remove of the same digest within a worker without a
+# lock per object; across workers the database functions in media.sql decide
+LOCK_STRIPES = 256
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+def is_sha256(value: str) -> bool:
+    """Whether a client-supplied digest can name an object"""
+    return bool(SHA256_PATTERN.match(value))
+
+def object_key(sha256: str, extension: str) -> str:
+    """Storage key of a newly stored object
+
+    The random suffix keeps an object stored again right after its deletion
+    clear of the late storage deletes for the previous copy.
+    """
+    return f"objects/{sha256[:2]}/{sha256}.{uuid.uuid4().hex[:12]}.{extension}"
+
+def derivative_key(key: str, name: str) -> str:
+    """Storage key of a derivative of the object stored under key"""
+    return f"derivatives/{key[len('objects/'):].rsplit('.', 1)[0]}/{name}.jpg"
+
+def fit(frame: np.ndarray, size: int) -> np.ndarray:
+    """Downscale so the longer side is at most size; never upscales"""
+    height, width = frame.shape[:2]
+    scale = size / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+def read_keyframes(path: str, count: int) -> List[np.ndarray]:
+    """Up to count frames spread evenly through a video (or the first frame of a GIF)"""
+    capture = cv2.VideoCapture(path)
+    try:
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total <= 0:
+            ok, frame = capture.read()
+            return [frame] if ok else []
+        frames = []
+        for index in sorted({int(total * (i + 0.5) / count) for i in range(count)}):
+            capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = capture.read()
+            if ok:
+                frames.append(frame)
+        return frames
+    finally:
+        capture.release()
+
+def render_derivatives(source: str, content_type: str, directory: str) -> Dict[str, str]:
+    """Write the derivative JPEGs for a media file and return {name: path}
+
+    Images get a thumbnail and a downscaled preview; videos also get a
+    keyframe strip, and their thumbnail and preview show the middle frame.
+    """
+    is_video = content_type.startswith("video/")
+    frames = read_keyframes(source, MEDIA_KEYFRAMES) if is_video else []
+    if not is_video:
+        frame = cv2.imread(source, cv2.IMREAD_COLOR)
+        # OpenCV cannot imread GIFs, but decodes them as a video
+        frames = [frame] if frame is not None else read_keyframes(source, 1)
+    if not frames:
+        raise ValueError(f"Could not decode {content_type} media for derivatives")
+
+    os.makedirs(directory, exist_ok=True)
+    middle = frames[len(frames) // 2]
+    images = {
+        "thumbnail": fit(middle, MEDIA_THUMBNAIL_SIZE),
+        "preview": fit(middle, MEDIA_PREVIEW_SIZE),
+    }
+    if is_video:
+        strip = []
+        for frame in frames:
+            height, width = frame.shape[:2]
+            strip.append(cv2.resize(
+                frame,
+                (max(1, round(width * MEDIA_KEYFRAME_HEIGHT / height)), MEDIA_KEYFRAME_HEIGHT),
+                interpolation=cv2.INTER_AREA
+            ))
+        images["keyframes"] = cv2.hconcat(strip)
+
+    paths = {}
+    for name, image in images.items():
+        path = os.path.join(directory, f"{name}.jpg")
+        if not cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, MEDIA_DERIVATIVE_QUALITY]):
+            raise ValueError(f"Could not write {name} derivative")
+        paths[name] = path
+    return paths
+
+def link_or_copy(source: str, target: str):
+    """Hard-link when possible so handing a file to a background job costs nothing"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+class MediaLibrary:
+    """Content-addressed media: each file is stored once under its SHA-256
+
+    Users hold references to objects; an object and its derivatives are
+    deleted from storage when the last reference goes. Thumbnails, previews
+    and video keyframe strips are generated once per object by a background
+    pipeline job, so duplicate uploads reuse them.
+
+    Whether a reference may be added, and whether releasing one deletes the
+    object, is decided by the database functions in media.sql so concurrent
+    workers agree; the per-digest locks only save round trips within one.
+    """
+
+    def __init__(
+        self,
+        repository: MediaRepository = media_repository,
+        storage: MediaStorage = media_storage,
+        pipeline: JobPipeline = job_pipeline,
+        directory: str = DERIVATIVE_DIR
+    ):
+        self.repository = repository
+        self.storage = storage
+        self.pipeline = pipeline
+        self.directory = directory
+        self.stats = {"stored": 0, "deduplicated": 0, "deleted": 0, "derivatives": 0}
+        self._locks = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+        pipeline.register("media_derivatives", [
+            ("render", self._render_stage),
+            ("store", self._store_stage),
+        ])
+
+    def _lock(self, sha256: str) -> asyncio.Lock:
+        return self._locks[int(sha256[:2], 16) % LOCK_STRIPES]
+
+    def _work_dir(self, sha256: str) -> str:
+        return os.path.join(self.directory, sha256)
+
+    def describe(self, media_object: dict) -> dict:
+        """Public URLs of an object and whichever derivatives exist so far"""
+        derivatives = media_object.get("derivatives") or {}
+        return {
+            "sha256": media_object["sha256"],
+            "url": self.storage.public_url(media_object["key"]),
+            "content_type": media_object["content_type"],
+            "size": media_object["size"],
+            "derivatives": {name: self.storage.public_url(key) for name, key in derivatives.items()},
+            "derivatives_pending": not derivatives,
+        }
+
+    async def get(self, sha256: str) -> Optional[dict]:
+        return await self.repository.get_object(sha256)
+
+    async def add(self, upload: SpooledUpload, user_id: str, filename: Optional[str] = None) -> dict:
+        """Store a spooled upload unless its content is already stored, and reference it for user_id
+
+        The spooled file stays owned by the caller. Returns the object row
+        with "created" set when this call stored it.
+        """
+        async with self._lock(upload.sha256):
+            created = False
+            media_object = await self.repository.get_object(upload.sha256)
+            while True:
+                if media_object is None:
+                    media_object, created = await self._store(upload)
+                if await self.repository.add_ref(user_id, upload.sha256, filename):
+                    break
+                # Another worker deleted the object between the lookup and the reference
+                media_object = None
+            if created:
+                await self._queue_derivatives(media_object, upload.path)
+            else:
+                self.stats["deduplicated"] += 1
+        return dict(media_object, created=created)
+
+    async def _store(self, upload: SpooledUpload) -> Tuple[dict, bool]:
+        """Upload a new object and create its row: (object row, whether this call created it)"""
+        key = object_key(upload.sha256, upload.extension)
+        await self.storage.upload(upload.path, key, upload.content_type)
+        try:
+            media_object = await self.repository.create_object({
+                "sha256": upload.sha256,
+                "key": key,
+                "content_type": upload.content_type,
+                "size": upload.size,
+                "derivatives": {},
+            })
+        except DatabaseError as e:
+            if e.status_code != 409:
+                raise
+            # Another worker stored the same content first; keep theirs
+            await self.storage.delete(key)
+            media_object = await self.repository.get_object(upload.sha256)
+            if media_object is None:
+                return await self._store(upload)
+            return media_object, False
+        self.stats["stored"] += 1
+        return media_object, True
+
+    async def remove(self, user_id: str, sha256: str) -> bool:
+        """Drop user_id's reference; deletes the object once nobody references it"""
+        async with self._lock(sha256):
+            released, media_object = await self.repository.release_ref(user_id, sha256)
+            if not released:
+                return False
+            if media_object is None:
+                return True
+            for key in [media_object["key"], *(media_object.get("derivatives") or {}).values()]:
+                await self.storage.delete(key)
+            self.stats["deleted"] += 1
+        return True
+
+    async def _queue_derivatives(self, media_object: dict, path: str):
+        work_dir = self._work_dir(media_object["sha256"])
+        os.makedirs(work_dir, exist_ok=True)
+        source = os.path.join(work_dir, "source")
+        await asyncio.to_thread(link_or_copy, path, source)
+        try:
+            await self.pipeline.submit("media_derivatives", {
+                "sha256": media_object["sha256"],
+                "key": media_object["key"],
+                "content_type": media_object["content_type"],
+            })
+        except Exception as e:
+            # The upload itself succeeded; derivatives can be regenerated later
+            logger.error(f"Could not queue derivatives for {media_object['sha256']}: {str(e)}")
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def _render_stage(self, job: Job):
+        payload = job.payload
+        work_dir = self._work_dir(payload["sha256"])
+        source = os.path.join(work_dir, "source")
+        if not os.path.exists(source):
+            # Replayed after a restart that cleared the temp directory
+            os.makedirs(work_dir, exist_ok=True)
+            await self.storage.download(payload["key"], source)
+        payload["rendered"] = await asyncio.to_thread(render_derivatives, source, payload["content_type"], work_dir)
+
+    async def _store_stage(self, job: Job):
+        payload = job.payload
+        sha256 = payload["sha256"]
+        rendered = payload["rendered"]
+        if not all(os.path.exists(path) for path in rendered.values()):
+            rendered = await asyncio.to_thread(
+                render_derivatives, os.path.join(self._work_dir(sha256), "source"), payload["content_type"], self._work_dir(sha256)
+            )
+
+        keys = {name: derivative_key(payload["key"], name) for name in rendered}
+        async with self._lock(sha256):
+            for name, path in rendered.items():
+                await self.storage.upload(path, keys[name], "image/jpeg")
+            if await self.repository.update_object(sha256, {"derivatives": keys}, payload["key"]) is None:
+                # The object was deleted while its derivatives were rendering
+                for key in keys.values():
+                    await self.storage.delete(key)
+        shutil.rmtree(self._work_dir(sha256), ignore_errors=True)
+        self.stats["derivatives"] += 1
+
+# Initialize the media library
+media_library = MediaLibrary()
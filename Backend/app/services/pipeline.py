@@ -0,0 +1,305 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Job Pipeline Configuration
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "10000"))
+PIPELINE_MAX_ATTEMPTS = int(os.getenv("PIPELINE_MAX_ATTEMPTS", "5"))
+PIPELINE_RETRY_BACKOFF = float(os.getenv("PIPELINE_RETRY_BACKOFF", "0.5"))
+PIPELINE_JOURNAL_PATH = os.getenv("PIPELINE_JOURNAL_PATH", "")  # SQLite file; empty keeps jobs in memory only
+# Seconds a worker's claim on journaled jobs lasts without renewal; a crashed worker's jobs are
+# picked up by another worker sharing the journal once their lease runs out
+PIPELINE_LEASE_SECONDS = float(os.getenv("PIPELINE_LEASE_SECONDS", "60"))
+
+def stopping() -> bool:
+    """Whether the current task is being cancelled, rather than something it awaited"""
+    task = asyncio.current_task()
+    return task is not None and task.cancelling() > 0
+
+@dataclass
+class Job:
+    kind: str
+    payload: dict
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    stage: int = 0
+    attempts: int = 0
+
+# A stage updates job.payload in place; it runs again on failure, so it must be safe to repeat
+Stage = Callable[[Job], Awaitable[None]]
+
+class JobJournal:
+    """SQLite journal of unfinished jobs, replayed on startup
+
+    Worker processes may share one journal. Each job row is owned by the
+    journal that saved or claimed it until its lease expires, and claim()
+    takes unowned or expired rows in a single UPDATE, so a job is replayed
+    by exactly one worker.
+    """
+
+    def __init__(self, path: str, owner: Optional[str] = None, lease: float = PIPELINE_LEASE_SECONDS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.owner = owner or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease = lease
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "create table if not exists jobs ("
+            "id text primary key, kind text not null, stage integer not null, "
+            "attempts integer not null, payload text not null, failed integer not null default 0, "
+            "owner text, lease_until real not null default 0)"
+        )
+        columns = {row[1] for row in self._db.execute("pragma table_info(jobs)")}
+        # Journals written before leases existed
+        if "owner" not in columns:
+            self._db.execute("alter table jobs add column owner text")
+            self._db.execute("alter table jobs add column lease_until real not null default 0")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def save(self, job: Job, failed: bool = False):
+        with self._lock:
+            self._db.execute(
+                "insert or replace into jobs (id, kind, stage, attempts, payload, failed, owner, lease_until) "
+                "values (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.kind, job.stage, job.attempts, json.dumps(job.payload), int(failed),
+                 self.owner, time.time() + self.lease)
+            )
+            self._db.commit()
+
+    def claim(self) -> List[Job]:
+        """Take ownership of unfinished jobs no live worker holds"""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "update jobs set owner = ?, lease_until = ? "
+                "where failed = 0 and (owner is null or lease_until < ?) "
+                "returning id, kind, stage, attempts, payload",
+                (self.owner, now + self.lease, now)
+            ).fetchall()
+            self._db.commit()
+        return [Job(kind, json.loads(payload), id, stage, attempts) for id, kind, stage, attempts, payload in rows]
+
+    def renew(self):
+        with self._lock:
+            self._db.execute("update jobs set lease_until = ? where owner = ?", (time.time() + self.lease, self.owner))
+            self._db.commit()
+
+    def release(self):
+        """Hand this journal's unfinished jobs to whichever worker starts or looks next"""
+        with self._lock:
+            self._db.execute("update jobs set owner = null where owner = ? and failed = 0", (self.owner,))
+            self._db.commit()
+
+    def remove(self, job: Job):
+        with self._lock:
+            self._db.execute("delete from jobs where id = ?", (job.id,))
+            self._db.commit()
+
+    def pending(self) -> List[Job]:
+        with self._lock:
+            rows = self._db.execute("select id, kind, stage, attempts, payload from jobs where failed = 0").fetchall()
+        return [Job(kind, json.loads(payload), id, stage, attempts) for id, kind, stage, attempts, payload in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class JobPipeline:
+    """Runs multi-stage background jobs on a pool of asyncio workers
+
+    Each job kind is a list of named stages run in order. A failed stage is
+    retried with exponential backoff up to max_attempts, resuming at the
+    stage that failed. With a journal, jobs are saved after every stage so
+    work still queued at shutdown or crash is resumed on the next start;
+    jobs that exhaust their retries stay in the journal marked failed.
+
+    Workers sharing a journal each replay only the jobs they claim; while
+    running, a pipeline renews its leases and claims the jobs of workers
+    whose leases ran out.
+    """
+
+    def __init__(
+        self,
+        workers: int = PIPELINE_WORKERS,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        max_attempts: int = PIPELINE_MAX_ATTEMPTS,
+        backoff: float = PIPELINE_RETRY_BACKOFF,
+        journal_path: str = PIPELINE_JOURNAL_PATH,
+        lease: float = PIPELINE_LEASE_SECONDS
+    ):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.journal_path = journal_path
+        self.lease = lease
+        self.stats = {"submitted": 0, "completed": 0, "retried": 0, "failed": 0}
+        self._kinds: Dict[str, List[Tuple[str, Stage]]] = {}
+        self._failure_handlers: Dict[str, Stage] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._journal: Optional[JobJournal] = None
+        self._lease_task: Optional[asyncio.Task] = None
+
+    def register(self, kind: str, stages: List[Tuple[str, Stage]], on_failure: Optional[Stage] = None):
+        """Stages of a job kind; on_failure runs once when a job of the kind exhausts its retries"""
+        self._kinds[kind] = stages
+        if on_failure is not None:
+            self._failure_handlers[kind] = on_failure
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self.running:
+            return
+        pending = []
+        if self.journal_path:
+            self._journal = await asyncio.to_thread(JobJournal, self.journal_path, lease=self.lease)
+            pending = await asyncio.to_thread(self._journal.claim)
+        # Replayed jobs were accepted before the restart, so they always fit
+        self._queue = asyncio.Queue(maxsize=max(self.queue_size, len(pending)))
+        for job in pending:
+            self._queue.put_nowait(job)
+        if pending:
+            logger.info(f"Resuming {len(pending)} journaled pipeline jobs")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        if self._journal is not None:
+            self._lease_task = asyncio.create_task(self._hold_lease())
+        logger.info(f"Job pipeline started with {self.workers} workers")
+
+    async def stop(self, timeout: float = 10.0):
+        """Let queued jobs finish for up to timeout seconds, then cancel the workers"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping job pipeline with {self.depth} jobs still queued")
+        if self._lease_task is not None:
+            self._lease_task.cancel()
+            await asyncio.gather(self._lease_task, return_exceptions=True)
+            self._lease_task = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._journal is not None:
+            await asyncio.to_thread(self._journal.release)
+            self._journal.close()
+            self._journal = None
+        logger.info("Job pipeline stopped")
+
+    async def submit(self, kind: str, payload: dict) -> Job:
+        """Queue a job; waits for room when the queue is full"""
+        if not self.running:
+            raise RuntimeError("Job pipeline is not running")
+        if kind not in self._kinds:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = Job(kind, payload)
+        if self._journal is not None:
+            await asyncio.to_thread(self._journal.save, job)
+        await self._queue.put(job)
+        self.stats["submitted"] += 1
+        return job
+
+    async def _hold_lease(self):
+        """Renew this worker's leases, and take over jobs whose worker stopped renewing"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self._journal.renew)
+                # Leave orphans to a less busy worker; waiting for queue room here would let our own leases lapse
+                orphaned = await asyncio.to_thread(self._journal.claim) if self.depth < self.queue_size // 2 else []
+            except sqlite3.Error as e:
+                logger.warning(f"Could not renew pipeline journal lease: {str(e)}")
+                continue
+            if orphaned:
+                logger.info(f"Taking over {len(orphaned)} pipeline jobs from a stopped worker")
+            for job in orphaned:
+                await self._queue.put(job)
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                if stopping():
+                    raise
+                # A cancellation that didn't come from stop() must not take the worker down
+                logger.error(f"Pipeline job {job.id} was cancelled")
+            except Exception as e:
+                logger.error(f"Unexpected error in pipeline job {job.id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        stages = self._kinds[job.kind]
+        while job.stage < len(stages):
+            name, stage = stages[job.stage]
+            try:
+                await stage(job)
+            except asyncio.CancelledError:
+                if stopping():
+                    raise
+                # Something the stage awaited was cancelled; count it as a failed attempt
+                error = "stage was cancelled"
+            except Exception as e:
+                error = str(e)
+            else:
+                error = None
+
+            if error is not None:
+                job.attempts += 1
+                if job.attempts >= self.max_attempts:
+                    self.stats["failed"] += 1
+                    logger.error(f"Pipeline job {job.id} failed at {name} after {job.attempts} attempts: {error}")
+                    if self._journal is not None:
+                        await asyncio.to_thread(self._journal.save, job, True)
+                    await self._failed(job)
+                    return
+                self.stats["retried"] += 1
+                delay = self.backoff * (2 ** (job.attempts - 1)) * (0.5 + random.random())
+                logger.warning(f"Retrying {name} of pipeline job {job.id} in {delay:.2f}s: {error}")
+                await asyncio.sleep(delay)
+                continue
+
+            job.stage += 1
+            job.attempts = 0
+            if self._journal is not None and job.stage < len(stages):
+                await asyncio.to_thread(self._journal.save, job)
+
+        if self._journal is not None:
+            await asyncio.to_thread(self._journal.remove, job)
+        self.stats["completed"] += 1
+
+    async def _failed(self, job: Job):
+        handler = self._failure_handlers.get(job.kind)
+        if handler is None:
+            return
+        try:
+            await handler(job)
+        except Exception as e:
+            logger.error(f"Error in failure handler of pipeline job {job.id}: {str(e)}")
+
+# Initialize the pipeline
+job_pipeline = JobPipeline()
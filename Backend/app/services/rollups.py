@@ -0,0 +1,285 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from dotenv import load_dotenv
+from ..db.repositories import IncidentRepository, incident_repository
+from .hotspots import HotspotEngine
+
+load_dotenv()
+
+# Rollup Configuration
+ROLLUP_RETENTION_DAYS = int(os.getenv("ROLLUP_RETENTION_DAYS", "400"))
+ROLLUP_REFRESH_SECONDS = float(os.getenv("ROLLUP_REFRESH_SECONDS", "60"))  # incremental scans of new incidents
+ROLLUP_RECONCILE_SECONDS = float(os.getenv("ROLLUP_RECONCILE_SECONDS", "3600"))  # full rescans of the retention window
+ROLLUP_REFRESH_OVERLAP_SECONDS = float(os.getenv("ROLLUP_REFRESH_OVERLAP_SECONDS", "60"))
+
+ROLLUP_COLUMNS = "id,created_at,severity,latitude,longitude,location"
+
+def to_timestamp(value) -> Optional[float]:
+    """Epoch seconds of a created_at value, treating naive datetimes as UTC"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class HourBucket:
+    """Counters for the incidents created within one UTC hour"""
+
+    __slots__ = ("total", "severity")
+
+    def __init__(self):
+        self.total = 0
+        self.severity: Counter = Counter()
+
+class IncidentRollups:
+    """Per-hour and per-severity incident counters
+
+    Counters are backfilled from the retention window at startup and
+    updated as this worker creates, updates and deletes incidents. Every
+    ROLLUP_REFRESH_SECONDS only the incidents created since the last scan
+    are read, to pick up other workers' inserts; every
+    ROLLUP_RECONCILE_SECONDS the retention window is rescanned into fresh
+    counters, to pick up their updates and deletes.
+    Refreshes re-read an overlap before the (created_at, id) high-water
+    mark, so only the ids created inside that overlap are remembered to
+    keep a row from being counted twice; older rows are counted by the
+    scan that passed them. Queries cost O(hours in the window),
+    independent of incident volume.
+    Incident locations are mirrored into a HotspotEngine for clustering.
+    """
+
+    def __init__(
+        self,
+        repository: IncidentRepository,
+        hotspots: Optional[HotspotEngine] = None,
+        retention_days: int = ROLLUP_RETENTION_DAYS,
+        refresh_seconds: float = ROLLUP_REFRESH_SECONDS,
+        reconcile_seconds: float = ROLLUP_RECONCILE_SECONDS,
+        overlap_seconds: float = ROLLUP_REFRESH_OVERLAP_SECONDS
+    ):
+        self.repository = repository
+        self.hotspots = hotspots or HotspotEngine()
+        self.retention_hours = retention_days * 24
+        self.refresh_seconds = refresh_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self.overlap_seconds = overlap_seconds
+        self.ready = False
+        self.buckets: Dict[int, HourBucket] = {}
+        # Newest (created_at as epoch seconds, id) read from the database
+        self.watermark: Optional[Tuple[float, str]] = None
+        # created_at of the counted incidents inside the overlap, by id; deleted ones stay so stale reads skip them
+        self._recent: Dict[str, float] = {}
+        # Incidents written by this worker while a scan is running, with their current row or None once deleted
+        self._touched: Optional[Dict[str, Optional[dict]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _oldest_hour(self) -> int:
+        return int(datetime.now(timezone.utc).timestamp() // 3600) - self.retention_hours
+
+    def _horizon(self) -> Optional[float]:
+        """Start of the overlap refreshes re-read; incidents created before it are counted by a past scan"""
+        return self.watermark[0] - self.overlap_seconds if self.watermark is not None else None
+
+    @staticmethod
+    def _adjust(buckets: Dict[int, HourBucket], incident: dict, delta: int):
+        timestamp = to_timestamp(incident.get("created_at"))
+        if timestamp is None:
+            return
+        hour, severity = int(timestamp // 3600), incident.get("severity")
+        bucket = buckets.get(hour)
+        if bucket is None:
+            if delta < 0:
+                return
+            bucket = buckets[hour] = HourBucket()
+
+        bucket.total += delta
+        if severity is not None:
+            bucket.severity[severity] += delta
+            if bucket.severity[severity] <= 0:
+                del bucket.severity[severity]
+        if bucket.total <= 0:
+            del buckets[hour]
+
+    def _is_counted(self, incident: dict) -> bool:
+        if incident.get("id") in self._recent:
+            return True
+        timestamp = to_timestamp(incident.get("created_at"))
+        horizon = self._horizon()
+        return timestamp is not None and horizon is not None and timestamp < horizon
+
+    def _remember(self, incident: dict):
+        timestamp = to_timestamp(incident.get("created_at"))
+        horizon = self._horizon()
+        if incident.get("id") is not None and timestamp is not None and (horizon is None or timestamp >= horizon):
+            self._recent[incident["id"]] = timestamp
+
+    def _advance(self, incident: dict):
+        timestamp = to_timestamp(incident.get("created_at"))
+        if timestamp is not None and (self.watermark is None or (timestamp, incident["id"]) > self.watermark):
+            self.watermark = (timestamp, incident["id"])
+
+    def _forget_before_horizon(self):
+        horizon = self._horizon()
+        if horizon is not None:
+            self._recent = {incident_id: timestamp for incident_id, timestamp in self._recent.items() if timestamp >= horizon}
+
+    def _touch(self, incident_id: Optional[str], incident: Optional[dict]):
+        if self._touched is not None:
+            self._touched[incident_id] = incident
+
+    @staticmethod
+    def _locate(hotspots: HotspotEngine, incident: dict):
+        timestamp = to_timestamp(incident.get("created_at"))
+        latitude, longitude = incident.get("latitude"), incident.get("longitude")
+        if incident.get("id") is None or timestamp is None or latitude is None or longitude is None:
+            return
+        hotspots.add(incident["id"], latitude, longitude, timestamp, incident.get("location") or "")
+
+    def record_created(self, incidents: List[dict]):
+        for incident in incidents:
+            self._touch(incident.get("id"), incident)
+            if not self._is_counted(incident):
+                self._adjust(self.buckets, incident, 1)
+                self._remember(incident)
+            self._locate(self.hotspots, incident)
+
+    def record_updated(self, previous: dict, current: dict):
+        # created_at is kept from the stored row when the update omits it
+        incident = {**previous, **current}
+        self._touch(previous.get("id"), incident)
+        if self._is_counted(previous):
+            self._adjust(self.buckets, previous, -1)
+        self._adjust(self.buckets, incident, 1)
+        self._remember(incident)
+        self.hotspots.remove(previous.get("id"))
+        self._locate(self.hotspots, incident)
+
+    def record_deleted(self, incident: dict):
+        self._touch(incident.get("id"), None)
+        if self._is_counted(incident):
+            self._adjust(self.buckets, incident, -1)
+        self._remember(incident)
+        self.hotspots.remove(incident.get("id"))
+
+    async def refresh(self):
+        """Count the incidents created since the last scan"""
+        if self.watermark is None:
+            await self.reconcile()
+            return
+        # Re-read an overlap so rows other workers committed late are not missed
+        since = datetime.fromtimestamp(self._horizon(), timezone.utc)
+        read = 0
+        async for page in self.repository.scan(ROLLUP_COLUMNS, filters=[("created_at", "gte", since)]):
+            for incident in page:
+                read += 1
+                self._advance(incident)
+                self._locate(self.hotspots, incident)
+                # Rows this worker wrote, even after the page was read, are already counted as they are now
+                if incident["id"] not in self._recent:
+                    self._adjust(self.buckets, incident, 1)
+                    self._recent[incident["id"]] = to_timestamp(incident.get("created_at"))
+        self._forget_before_horizon()
+        logger.debug(f"Incident rollups refreshed with {read} incidents since {since.isoformat()}")
+
+    async def reconcile(self):
+        """Recount the retention window, dropping incidents deleted elsewhere and ones past retention"""
+        since = datetime.fromtimestamp(self._oldest_hour() * 3600, timezone.utc)
+        buckets: Dict[int, HourBucket] = {}
+        recent: Dict[str, float] = {}
+        watermark = self.watermark
+        read = 0
+        self._touched = {}
+        self.hotspots.begin_sweep()
+        try:
+            async for page in self.repository.scan(ROLLUP_COLUMNS, filters=[("created_at", "gte", since)]):
+                for incident in page:
+                    read += 1
+                    self._advance(incident)
+                    # A row this worker changed after the page was read is counted from its current version below
+                    if incident["id"] in self._touched:
+                        continue
+                    self._adjust(buckets, incident, 1)
+                    self._locate(self.hotspots, incident)
+                    recent[incident["id"]] = to_timestamp(incident.get("created_at"))
+                # Keep only the overlap as the high-water mark rises
+                horizon = self._horizon()
+                recent = {incident_id: timestamp for incident_id, timestamp in recent.items() if timestamp >= horizon}
+            for incident_id, incident in self._touched.items():
+                if incident is not None:
+                    self._adjust(buckets, incident, 1)
+            recent.update((incident_id, timestamp) for incident_id, timestamp in self._recent.items() if incident_id in self._touched)
+        except BaseException:
+            self.watermark = watermark
+            raise
+        finally:
+            self._touched = None
+        self.buckets = buckets
+        self._recent = recent
+        self._forget_before_horizon()
+        # Incidents the scan didn't return were deleted, or are now past retention
+        self.hotspots.end_sweep()
+        self.hotspots.ready = True
+        self.ready = True
+        logger.info(f"Incident rollups reconciled with {read} incidents ({len(self.buckets)} hour buckets)")
+
+    async def _run(self):
+        reconciled_at = None
+        while True:
+            try:
+                if reconciled_at is None or time.monotonic() - reconciled_at >= self.reconcile_seconds:
+                    await self.reconcile()
+                    reconciled_at = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing incident rollups: {str(e)}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _window(self, start_date: datetime, end_date: datetime):
+        first = int(to_timestamp(start_date) // 3600)
+        last = int(to_timestamp(end_date) // 3600)
+        # Iterate whichever is smaller: the hours in the window or the stored buckets
+        if last - first + 1 <= len(self.buckets):
+            for hour in range(first, last + 1):
+                bucket = self.buckets.get(hour)
+                if bucket is not None:
+                    yield hour, bucket
+        else:
+            for hour, bucket in list(self.buckets.items()):
+                if first <= hour <= last:
+                    yield hour, bucket
+
+    def hourly_counts(self, start_date: datetime, end_date: datetime) -> List[dict]:
+        counts: Counter = Counter()
+        for hour, bucket in self._window(start_date, end_date):
+            counts[hour % 24] += bucket.total
+        return [{"hour": hour, "count": count} for hour, count in sorted(counts.items())]
+
+    def severity_counts(self, start_date: datetime, end_date: datetime) -> List[dict]:
+        counts: Counter = Counter()
+        for _, bucket in self._window(start_date, end_date):
+            counts.update(bucket.severity)
+        return [{"severity": severity, "count": count} for severity, count in sorted(counts.items())]
+
+# Initialize the rollups
+incident_rollups = IncidentRollups(incident_repository)
@@ -0,0 +1,169 @@
+import asyncio
+import base64
+import os
+import shutil
+import httpx
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Media Storage Configuration
+MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", "supabase")  # "supabase" or "local"
+MEDIA_BUCKET = os.getenv("MEDIA_BUCKET", "media")
+MEDIA_LOCAL_DIR = os.getenv("MEDIA_LOCAL_DIR", "media")
+MEDIA_LOCAL_URL = os.getenv("MEDIA_LOCAL_URL", "/media")
+# Supabase requires resumable (TUS) uploads to be sent in 6MB chunks
+MEDIA_RESUMABLE_THRESHOLD = int(os.getenv("MEDIA_RESUMABLE_THRESHOLD", str(6 * 1024 * 1024)))
+MEDIA_RESUMABLE_CHUNK_SIZE = 6 * 1024 * 1024
+MEDIA_RESUMABLE_RETRIES = int(os.getenv("MEDIA_RESUMABLE_RETRIES", "3"))
+
+class MediaStorage:
+    """Object storage for uploaded media; objects are uploaded from local files"""
+
+    async def upload(self, path: str, key: str, content_type: str):
+        raise NotImplementedError
+
+    async def download(self, key: str, path: str):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    def public_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class SupabaseStorage(MediaStorage):
+    """Supabase Storage; large files go through the resumable TUS endpoint chunk by chunk"""
+
+    def __init__(self, bucket: str = MEDIA_BUCKET, threshold: int = MEDIA_RESUMABLE_THRESHOLD):
+        # Imported here so the local backend runs without Supabase credentials
+        from ..db.supabase import SUPABASE_KEY, SUPABASE_URL, supabase_client
+        self.bucket = bucket
+        self.threshold = threshold
+        self._client = supabase_client
+        self._http = httpx.AsyncClient(
+            base_url=f"{SUPABASE_URL.rstrip('/')}/storage/v1",
+            headers={"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"},
+            timeout=httpx.Timeout(60)
+        )
+
+    async def upload(self, path: str, key: str, content_type: str):
+        if os.path.getsize(path) <= self.threshold:
+            def upload_small():
+                with open(path, "rb") as source:
+                    self._client.storage.from_(self.bucket).upload(
+                        path=key,
+                        file=source,
+                        file_options={"content-type": content_type, "upsert": "true"}
+                    )
+            await asyncio.to_thread(upload_small)
+        else:
+            await self._upload_resumable(path, key, content_type)
+
+    @staticmethod
+    def _metadata(**values: str) -> str:
+        return ",".join(f"{name} {base64.b64encode(value.encode()).decode()}" for name, value in values.items())
+
+    async def _upload_resumable(self, path: str, key: str, content_type: str):
+        size = os.path.getsize(path)
+        response = await self._http.post(
+            "/upload/resumable",
+            headers={
+                "Tus-Resumable": "1.0.0",
+                "Upload-Length": str(size),
+                "Upload-Metadata": self._metadata(bucketName=self.bucket, objectName=key, contentType=content_type),
+                "x-upsert": "true"
+            }
+        )
+        response.raise_for_status()
+        location = response.headers["Location"]
+
+        offset = 0
+        attempt = 0
+        with open(path, "rb") as source:
+            while offset < size:
+                source.seek(offset)
+                chunk = source.read(MEDIA_RESUMABLE_CHUNK_SIZE)
+                try:
+                    response = await self._http.patch(
+                        location,
+                        content=chunk,
+                        headers={
+                            "Tus-Resumable": "1.0.0",
+                            "Upload-Offset": str(offset),
+                            "Content-Type": "application/offset+octet-stream"
+                        }
+                    )
+                    response.raise_for_status()
+                    offset = int(response.headers["Upload-Offset"])
+                    attempt = 0
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    attempt += 1
+                    if attempt > MEDIA_RESUMABLE_RETRIES:
+                        raise
+                    logger.warning(f"Resuming upload of {key} at offset {offset} (attempt {attempt}): {str(e)}")
+                    await asyncio.sleep(2 ** (attempt - 1))
+                    # Ask the server how much it has, then continue from there
+                    head = await self._http.head(location, headers={"Tus-Resumable": "1.0.0"})
+                    head.raise_for_status()
+                    offset = int(head.headers["Upload-Offset"])
+
+    async def download(self, key: str, path: str):
+        async with self._http.stream("GET", f"/object/{self.bucket}/{key}") as response:
+            response.raise_for_status()
+            with open(path, "wb") as target:
+                async for chunk in response.aiter_bytes():
+                    target.write(chunk)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._client.storage.from_(self.bucket).remove, [key])
+
+    def public_url(self, key: str) -> str:
+        return self._client.storage.from_(self.bucket).get_public_url(key)
+
+    async def close(self):
+        await self._http.aclose()
+
+class LocalStorage(MediaStorage):
+    """Files under a local directory, for development and tests"""
+
+    def __init__(self, root: str = MEDIA_LOCAL_DIR, base_url: str = MEDIA_LOCAL_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid media key: {key}")
+        return path
+
+    async def upload(self, path: str, key: str, content_type: str):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        await asyncio.to_thread(shutil.copyfile, path, target)
+
+    async def download(self, key: str, path: str):
+        await asyncio.to_thread(shutil.copyfile, self._path(key), path)
+
+    async def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def public_url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+def create_storage(backend: str = MEDIA_STORAGE) -> MediaStorage:
+    if backend == "local":
+        return LocalStorage()
+    if backend != "supabase":
+        raise ValueError(f"Unknown media storage: {backend}")
+    return SupabaseStorage()
+
+# Initialize the storage
+media_storage = create_storage()
@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+import aiofiles
+import aiofiles.os
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upload Configuration
+MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", str(10 * 1024 * 1024)))  # 10MB
+MAX_VIDEO_SIZE = int(os.getenv("MAX_VIDEO_SIZE", str(500 * 1024 * 1024)))  # 500MB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "sage_guard_uploads"))
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", "86400"))
+UPLOAD_LOCK_TIMEOUT = float(os.getenv("UPLOAD_LOCK_TIMEOUT", "300"))  # an append lock untouched this long is stale
+
+# (signature offset, signature, content type, extension)
+SIGNATURES = [
+    (0, b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (0, b"GIF87a", "image/gif", "gif"),
+    (0, b"GIF89a", "image/gif", "gif"),
+    (4, b"ftypqt", "video/quicktime", "mov"),
+    (4, b"ftyp", "video/mp4", "mp4"),
+]
+SNIFF_BYTES = 16
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def sniff_content_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """(content type, extension) from a file's leading bytes, or None when unrecognised"""
+    for offset, signature, content_type, extension in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return content_type, extension
+    return None
+
+def max_size_for(extension: str) -> int:
+    return MAX_VIDEO_SIZE if extension in ("mp4", "mov") else MAX_IMAGE_SIZE
+
+@dataclass
+class SpooledUpload:
+    """An upload written to a local temporary file, with its digest and sniffed type"""
+    path: str
+    size: int
+    sha256: str
+    content_type: str
+    extension: str
+
+    async def discard(self):
+        try:
+            await aiofiles.os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+async def spool(chunks: AsyncIterator[bytes], max_size: Optional[int] = None, directory: str = UPLOAD_DIR) -> SpooledUpload:
+    """Write a stream to disk chunk by chunk, hashing and sniffing as it goes
+
+    Memory use is one chunk. The stream is abandoned as soon as it passes
+    max_size, or the type-specific limit once the leading bytes are known.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.upload")
+    digest = hashlib.sha256()
+    head = b""
+    sniffed = None
+    size = 0
+    limit = max_size
+    try:
+        async with aiofiles.open(path, "wb") as target:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if sniffed is None and len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                    if len(head) >= SNIFF_BYTES:
+                        sniffed = sniff_content_type(head)
+                        if sniffed is None:
+                            raise UploadError("Unsupported file content", 415)
+                        limit = min(limit or max_size_for(sniffed[1]), max_size_for(sniffed[1]))
+                size += len(chunk)
+                if size > (limit or MAX_VIDEO_SIZE):
+                    raise UploadError("File too large", 413)
+                digest.update(chunk)
+                await target.write(chunk)
+
+        if sniffed is None:
+            sniffed = sniff_content_type(head)
+        if sniffed is None:
+            raise UploadError("Unsupported file content", 415)
+        if size > max_size_for(sniffed[1]):
+            raise UploadError("File too large", 413)
+    except BaseException:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return SpooledUpload(path, size, digest.hexdigest(), sniffed[0], sniffed[1])
+
+async def read_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as source:
+        while True:
+            chunk = await source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+class UploadSessions:
+    """Resumable uploads: clients append chunks at an offset and can resume after a dropped connection
+
+    Each session is a partial file plus a small JSON sidecar under UPLOAD_DIR,
+    so sessions survive restarts; the offset is the partial file's size.
+    Appends to a session are serialized: by an asyncio lock within a worker,
+    and by an exclusively created lock file between workers sharing UPLOAD_DIR.
+    """
+
+    def __init__(self, directory: str = UPLOAD_DIR, ttl: float = UPLOAD_SESSION_TTL, lock_timeout: float = UPLOAD_LOCK_TIMEOUT):
+        self.directory = os.path.join(directory, "sessions")
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        # upload id -> (lock, appends holding or waiting for it)
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        # Session ids are hex uuids; anything else cannot name a session file
+        if not upload_id.isalnum():
+            raise UploadError("Upload not found", 404)
+        base = os.path.join(self.directory, upload_id)
+        return f"{base}.part", f"{base}.json"
+
+    def create(
+        self,
+        user_id: str,
+        filename: str,
+        size: int,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> dict:
+        if size <= 0 or size > MAX_VIDEO_SIZE:
+            raise UploadError("File too large" if size > 0 else "Upload size must be positive", 413 if size > 0 else 400)
+        os.makedirs(self.directory, exist_ok=True)
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        session = {
+            "id": upload_id,
+            "user_id": user_id,
+            "filename": filename,
+            "size": size,
+            "latitude": latitude,
+            "longitude": longitude,
+            "created_at": time.time()
+        }
+        open(part_path, "wb").close()
+        with open(meta_path, "w") as meta:
+            json.dump(session, meta)
+        return dict(session, offset=0)
+
+    def get(self, upload_id: str, user_id: str) -> dict:
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as meta:
+                session = json.load(meta)
+        except FileNotFoundError:
+            raise UploadError("Upload not found", 404)
+        if session["user_id"] != user_id:
+            raise UploadError("Upload not found", 404)
+        return dict(session, offset=os.path.getsize(part_path))
+
+    def _lock_path(self, upload_id: str) -> str:
+        return f"{self._paths(upload_id)[0][:-len('.part')]}.lock"
+
+    def _lock_file(self, upload_id: str):
+        """Take the cross-worker append lock, replacing one left behind by a worker that died mid-append"""
+        lock_path = self._lock_path(upload_id)
+        for attempt in range(2):
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    stale = time.time() - os.path.getmtime(lock_path) > self.lock_timeout
+                except FileNotFoundError:
+                    stale = True
+                if not stale or attempt:
+                    raise UploadError("Another append to this upload is in progress", 409)
+                logger.warning(f"Removing stale append lock of upload session {upload_id}")
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+
+    def _unlock_file(self, upload_id: str):
+        try:
+            os.remove(self._lock_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    async def append(self, upload_id: str, user_id: str, offset: int, chunks: AsyncIterator[bytes]) -> dict:
+        """Append a chunk stream at offset, which must equal the bytes received so far"""
+        self.get(upload_id, user_id)
+        lock, users = self._locks.get(upload_id, (asyncio.Lock(), 0))
+        self._locks[upload_id] = (lock, users + 1)
+        try:
+            async with lock:
+                self._lock_file(upload_id)
+                try:
+                    return await self._append(upload_id, user_id, offset, chunks)
+                finally:
+                    self._unlock_file(upload_id)
+        finally:
+            lock, users = self._locks[upload_id]
+            if users == 1:
+                del self._locks[upload_id]
+            else:
+                self._locks[upload_id] = (lock, users - 1)
+
+    async def _append(self, upload_id: str, user_id: str, offset: int, chunks: AsyncIterator[bytes]) -> dict:
+        # Read the offset under the lock, so a concurrent append that just finished is seen
+        session = self.get(upload_id, user_id)
+        if offset != session["offset"]:
+            raise UploadError(f"Offset mismatch, expected {session['offset']}", 409)
+        part_path, _ = self._paths(upload_id)
+        lock_path = self._lock_path(upload_id)
+        touched = time.monotonic()
+        written = offset
+        async with aiofiles.open(part_path, "ab") as target:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written > session["size"]:
+                    # Drop the oversized tail; the client can resume from the last good offset
+                    await target.truncate(offset)
+                    raise UploadError("Chunk runs past the declared upload size", 413)
+                await target.write(chunk)
+                # Keep the lock file fresh so other workers don't take it for stale
+                if time.monotonic() - touched > self.lock_timeout / 4:
+                    os.utime(lock_path)
+                    touched = time.monotonic()
+        return dict(session, offset=written)
+
+    def complete_path(self, upload_id: str, user_id: str) -> str:
+        session = self.get(upload_id, user_id)
+        if session["offset"] != session["size"]:
+            raise UploadError(f"Upload incomplete: {session['offset']} of {session['size']} bytes", 409)
+        return self._paths(upload_id)[0]
+
+    def remove(self, upload_id: str):
+        for path in (*self._paths(upload_id), self._lock_path(upload_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _last_active(self, upload_id: str) -> float:
+        """When the session was created or last appended to; appends write the partial file, not the sidecar"""
+        times = []
+        for path in (*self._paths(upload_id), self._lock_path(upload_id)):
+            try:
+                times.append(os.path.getmtime(path))
+            except FileNotFoundError:
+                pass
+        return max(times, default=0.0)
+
+    def expire(self):
+        """Delete sessions idle for longer than the TTL"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and self._last_active(name[:-5]) < cutoff:
+                self.remove(name[:-5])
+                logger.info(f"Expired upload session {name[:-5]}")
+
+# Initialize the upload sessions
+upload_sessions = UploadSessions()
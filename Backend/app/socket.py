@@ -1,42 +1,232 @@
-from fastapi import FastAPI
-from socketio import AsyncServer
-from socketio.asyncio_namespace import AsyncNamespace
 import asyncio
+import itertools
+import logging
+import math
+import os
+import random
+from typing import Any, Dict, List, Optional, Sequence
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
 from loguru import logger
+from dotenv import load_dotenv
+from .services.broadcast import ScheduledEmitMixin
 
-class IncidentNamespace(AsyncNamespace):
-    async def on_connect(self, sid, environ):
-        logger.info(f"Client connected: {sid}")
-        await self.emit('connected', {'data': 'Connected to Sage Guard Socket.IO server'})
+load_dotenv()
 
-    async def on_disconnect(self, sid):
-        logger.info(f"Client disconnected: {sid}")
+# Socket.IO Configuration
+SOCKET_MANAGER = os.getenv("SOCKET_MANAGER", "memory")  # "memory", "redis" or "local"
+SOCKET_CHANNEL = os.getenv("SOCKET_CHANNEL", "sage_guard")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+SOCKET_CORS_ORIGINS = ["http://localhost:5173", "http://127.0.0.1:5173"]
+SOCKET_CELL_DEG = float(os.getenv("SOCKET_CELL_DEG", "0.05"))  # ~5km subscription cells
+SOCKET_MAX_ROOMS = int(os.getenv("SOCKET_MAX_ROOMS", "2500"))
+SOCKET_LOG_SAMPLE_RATE = float(os.getenv("SOCKET_LOG_SAMPLE_RATE", "0.01"))  # share of per-packet/event logs kept
+
+def sampled(rate: float = SOCKET_LOG_SAMPLE_RATE) -> bool:
+    return random.random() < rate
+
+class SampledLogFilter(logging.Filter):
+    """Keep warnings and errors, and a random sample of the per-packet info/debug records"""
+
+    def __init__(self, rate: float = SOCKET_LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or sampled(self.rate)
+
+def sampled_logger(name: str) -> logging.Logger:
+    """A stdlib logger for python-socketio/engineio that samples their hot-path logging"""
+    log = logging.getLogger(name)
+    if not log.handlers:
+        log.setLevel(logging.INFO)
+        log.addHandler(logging.StreamHandler())
+        log.addFilter(SampledLogFilter())
+    return log
+
+# Incident rooms are named incidents:<cell>:<severity>:<status>, "*" matching anything.
+# A subscriber joins one room per combination of its filter values; an incident is
+# emitted to the 8 rooms formed from its own values and wildcards, so it reaches
+# exactly the matching subscribers without scanning every client.
+ANY = "*"
+ROOM_PREFIX = "incidents:"
+ALL_INCIDENTS_ROOM = f"{ROOM_PREFIX}{ANY}:{ANY}:{ANY}"
+
+def incident_room(cell: str = ANY, severity: str = ANY, status: str = ANY) -> str:
+    return f"{ROOM_PREFIX}{cell}:{severity}:{status}"
+
+def cell_index(latitude: float, longitude: float, cell_deg: float = SOCKET_CELL_DEG) -> tuple:
+    return math.floor((latitude + 90) / cell_deg), math.floor((longitude + 180) / cell_deg)
+
+def incident_rooms(incident: Any) -> List[str]:
+    """The rooms an incident is emitted to; missing fields only match wildcard subscribers"""
+    incident = incident if isinstance(incident, dict) else {}
+    cells = [ANY]
+    try:
+        row, col = cell_index(float(incident["latitude"]), float(incident["longitude"]))
+        cells.append(f"{row}.{col}")
+    except (KeyError, TypeError, ValueError):
+        pass
+    severities = [ANY] + ([str(incident["severity"])] if incident.get("severity") is not None else [])
+    statuses = [ANY] + ([str(incident["status"])] if incident.get("status") is not None else [])
+    return [incident_room(*values) for values in itertools.product(cells, severities, statuses)]
+
+def subscription_rooms(
+    bbox: Optional[Sequence[float]] = None,
+    severities: Optional[Sequence[str]] = None,
+    statuses: Optional[Sequence[str]] = None
+) -> List[str]:
+    """The rooms a subscriber to a (min_lat, min_lon, max_lat, max_lon) viewport and filters joins"""
+    cells = [ANY]
+    if bbox is not None:
+        if len(bbox) != 4:
+            raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon]")
+        min_lat, min_lon, max_lat, max_lon = (float(value) for value in bbox)
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon] within valid coordinates")
+        min_row, min_col = cell_index(min_lat, min_lon)
+        max_row, max_col = cell_index(max_lat, max_lon)
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > SOCKET_MAX_ROOMS:
+            raise ValueError("bbox is too large; zoom in or subscribe without a bbox")
+        cells = [f"{row}.{col}" for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)]
+    severities = sorted({str(value) for value in severities}) if severities else [ANY]
+    statuses = sorted({str(value) for value in statuses}) if statuses else [ANY]
+    if len(cells) * len(severities) * len(statuses) > SOCKET_MAX_ROOMS:
+        raise ValueError("Subscription matches too many rooms; narrow the bbox or filters")
+    return [incident_room(*values) for values in itertools.product(cells, severities, statuses)]
+
+async def emit_incident(server: socketio.AsyncServer, event: str, incident: Any, skip_sid: Optional[str] = None):
+    """Emit an incident event to the subscribers whose viewport and filters it matches"""
+    await server.emit(event, incident, to=incident_rooms(incident), skip_sid=skip_sid)
+
+class LocalBus:
+    """In-process pub/sub broker standing in for Redis
+
+    Every server whose LocalPubSubManager shares a bus sees the others'
+    messages, so several servers in one process behave like separate workers.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        self._subscribers.get(channel, []).remove(queue)
+
+    def publish(self, channel: str, message: str):
+        for queue in self._subscribers.get(channel, []):
+            queue.put_nowait(message)
 
-    async def on_incident(self, sid, data):
-        logger.info(f"Received incident data from {sid}: {data}")
-        # Broadcast the incident to all connected clients
-        await self.emit('incident', data, skip_sid=sid)
+local_bus = LocalBus()
 
-def init_socketio(app: FastAPI):
-    sio = AsyncServer(
+class ScheduledManager(ScheduledEmitMixin):
+    """Single-process client manager with scheduled incident delivery"""
+
+class RedisPubSubManager(socketio.AsyncRedisManager, ScheduledEmitMixin):
+    """Redis fan-out across workers, scheduling delivery to each worker's own clients"""
+
+class LocalPubSubManager(AsyncPubSubManager, ScheduledEmitMixin):
+    """Client manager that fans events out over a LocalBus, for tests and benchmarks"""
+
+    name = "localpubsub"
+
+    def __init__(self, bus: LocalBus = local_bus, channel: str = SOCKET_CHANNEL, write_only: bool = False):
+        super().__init__(channel=channel, write_only=write_only)
+        self.bus = bus
+
+    async def _publish(self, data):
+        # Serialise like the Redis manager so unencodable payloads fail here too
+        self.bus.publish(self.channel, self.json.dumps(data))
+
+    async def _listen(self):
+        queue = self.bus.subscribe(self.channel)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.bus.unsubscribe(self.channel, queue)
+
+def create_client_manager(backend: str = SOCKET_MANAGER) -> socketio.AsyncManager:
+    """Client manager deciding how emits reach clients; pub/sub backends share them across workers"""
+    if backend == "memory":
+        return ScheduledManager()
+    if backend == "redis":
+        # Requires the redis package
+        return RedisPubSubManager(REDIS_URL, channel=SOCKET_CHANNEL)
+    if backend == "local":
+        return LocalPubSubManager()
+    raise ValueError(f"Unknown Socket.IO manager: {backend}")
+
+def create_server(client_manager: Optional[socketio.AsyncManager] = None) -> socketio.AsyncServer:
+    """Socket.IO server with the incident event handlers registered"""
+    server = socketio.AsyncServer(
         async_mode='asgi',
-        cors_allowed_origins=['http://localhost:5173', 'http://127.0.0.1:5173'],
-        logger=True,
-        engineio_logger=True
+        client_manager=client_manager or create_client_manager(),
+        cors_allowed_origins=SOCKET_CORS_ORIGINS,
+        logger=sampled_logger("socketio.server"),
+        engineio_logger=sampled_logger("engineio.server")
     )
-    
-    # Register the namespace
-    sio.register_namespace(IncidentNamespace('/'))
-    
-    # Mount the Socket.IO app
-    app.mount("/socket.io", sio)
-    
-    @app.on_event("startup")
-    async def startup_event():
-        logger.info("Socket.IO server started")
-        
-    @app.on_event("shutdown")
-    async def shutdown_event():
-        logger.info("Socket.IO server shutting down")
-        
-    return sio 
\ No newline at end of file
+
+    @server.event
+    async def connect(sid, environ):
+        logger.info(f"Client connected: {sid}")
+        # Until a client subscribes it receives every incident, as before
+        await server.enter_room(sid, ALL_INCIDENTS_ROOM)
+        await server.emit('connected', {'data': 'Connected to Sage Guard Socket.IO server'}, room=sid)
+
+    @server.event
+    async def disconnect(sid):
+        logger.info(f"Client disconnected: {sid}")
+
+    @server.event
+    async def incident(sid, data):
+        if sampled():
+            logger.info(f"Received incident data from {sid} (sampled): {data}")
+        # Broadcast the incident to matching subscribers except the sender
+        await emit_incident(server, 'incident', data, skip_sid=sid)
+
+    async def leave_incident_rooms(sid):
+        for room in server.rooms(sid):
+            if room.startswith(ROOM_PREFIX):
+                await server.leave_room(sid, room)
+
+    @server.event
+    async def subscribe(sid, data):
+        """Receive only incidents within data["bbox"] and, optionally, data["severity"] / data["status"] lists"""
+        data = data if isinstance(data, dict) else {}
+        try:
+            rooms = subscription_rooms(data.get("bbox"), data.get("severity"), data.get("status"))
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}
+        await leave_incident_rooms(sid)
+        for room in rooms:
+            await server.enter_room(sid, room)
+        return {"rooms": len(rooms)}
+
+    @server.event
+    async def delivery(sid, data):
+        """Opt in to batched <event>_batch messages ({"batch": true}), optionally msgpack-encoded"""
+        data = data if isinstance(data, dict) else {}
+        scheduler = getattr(server.manager, "scheduler", None)
+        if scheduler is None:
+            return {"error": "Delivery options are not supported by this server"}
+        try:
+            return scheduler.configure(sid, data.get("batch", False), data.get("encoding", "json"))
+        except ValueError as e:
+            return {"error": str(e)}
+
+    @server.event
+    async def unsubscribe(sid, data=None):
+        """Go back to receiving every incident"""
+        await leave_incident_rooms(sid)
+        await server.enter_room(sid, ALL_INCIDENTS_ROOM)
+        return {"rooms": 1}
+
+    return server
+
+# Initialize Socket.IO with custom event handlers
+sio = create_server()
@@ -0,0 +1,117 @@
+"""Benchmark the detector and load-test the API, writing results to JSON
+
+    python -m benchmarks run --output results/current.json
+    python -m benchmarks run --suite detector --backends eager,onnx --threads 1,4
+    python -m benchmarks compare results/baseline.json results/current.json
+
+Run from the Backend directory. Load tests use the in-memory database, the
+stub geocoder and local media storage; other settings (INFERENCE_EXECUTOR,
+INFERENCE_MAX_BATCH_SIZE, ...) are read from the environment as usual, and
+recorded with the results so runs can be compared like for like.
+"""
+import argparse
+import os
+import sys
+from loguru import logger
+from . import report
+
+SUITES = ("detector", "load")
+# Settings that change the numbers and are worth recording with a run
+RECORDED_SETTINGS = (
+    "INFERENCE_BACKEND", "INFERENCE_EXECUTOR", "INFERENCE_WORKERS", "INFERENCE_THREADS_PER_WORKER",
+    "INFERENCE_MAX_BATCH_SIZE", "INFERENCE_MAX_WAIT_MS", "PREDICTION_CACHE_SIZE", "PIPELINE_WORKERS", "MODEL_PATH"
+)
+QUICK = {"batch_sizes": [1, 8], "threads": [1], "iterations": 5, "requests": 20, "concurrency": [4], "incidents": 500, "warmup": 2}
+
+def integers(value: str):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+def names(value: str):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run benchmarks and write a report")
+    run.add_argument("--suite", choices=SUITES + ("all",), default="all")
+    run.add_argument("--output", default="benchmarks/results/latest.json")
+    run.add_argument("--baseline", help="Report to compare the new results against")
+    run.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    run.add_argument("--quick", action="store_true", help="Small grid for a smoke run")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--log-level", default="WARNING")
+    detector = run.add_argument_group("detector")
+    detector.add_argument("--backends", type=names, default=["eager"], help="Comma-separated inference backends")
+    detector.add_argument("--batch-sizes", type=integers, default=[1, 8, 16, 32])
+    detector.add_argument("--threads", type=integers, default=sorted({1, os.cpu_count() or 1}))
+    detector.add_argument("--iterations", type=int, default=20)
+    load = run.add_argument_group("load")
+    load.add_argument("--scenarios", type=names, help="Comma-separated load scenarios (default: all)")
+    load.add_argument("--requests", type=int, default=200, help="Timed requests per scenario and concurrency")
+    load.add_argument("--concurrency", type=integers, default=[1, 16])
+    load.add_argument("--incidents", type=int, default=5000, help="Synthetic incidents seeded before the run")
+    load.add_argument("--warmup", type=int, default=10)
+
+    compare = commands.add_parser("compare", help="Compare two reports")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == "run" and args.quick:
+        for key, value in QUICK.items():
+            setattr(args, key, value)
+    return args
+
+def show_comparison(baseline: dict, current: dict, threshold: float) -> int:
+    """Print the changes and return the exit status: 1 when anything regressed"""
+    changes = report.compare(baseline, current, threshold)
+    print(report.format_changes(changes))
+    regressions = [change for change in changes if change["regression"]]
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {threshold:.0%}")
+        return 1
+    return 0
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=getattr(args, "log_level", "WARNING"))
+
+    if args.command == "compare":
+        return show_comparison(report.load_report(args.baseline), report.load_report(args.current), args.threshold)
+
+    results = []
+    if args.suite in ("detector", "all"):
+        from . import detector
+        results += detector.run(
+            backends=args.backends,
+            batch_sizes=args.batch_sizes,
+            threads=args.threads,
+            iterations=args.iterations,
+            seed=args.seed
+        )
+    if args.suite in ("load", "all"):
+        from . import load
+        results += load.run(
+            names=args.scenarios,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            incidents=args.incidents,
+            warmup=args.warmup,
+            seed=args.seed
+        )
+
+    settings = {key: value for key, value in vars(args).items() if key not in ("command", "output", "baseline", "log_level")}
+    settings["environment"] = {key: os.environ[key] for key in RECORDED_SETTINGS if key in os.environ}
+    report.write_report(args.output, results, settings)
+    print(report.format_results(results))
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        return show_comparison(report.load_report(args.baseline), report.load_report(args.output), args.threshold)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import gc
+import time
+from typing import Callable, List, Sequence
+import cv2
+import numpy as np
+import torch
+from loguru import logger
+from app.ml.backends import BACKENDS
+from app.ml.model import AccidentDetector
+from .report import summarize
+
+FRAME_SHAPE = (480, 640, 3)
+
+def synthetic_frames(count: int, seed: int = 0, shape: tuple = FRAME_SHAPE) -> List[np.ndarray]:
+    """Camera-sized BGR frames of random boxes and lines, the same for a given seed"""
+    rng = np.random.default_rng(seed)
+    height, width = shape[:2]
+    frames = []
+    for _ in range(count):
+        frame = np.full(shape, rng.integers(0, 256, 3, dtype=np.uint8), dtype=np.uint8)
+        for _ in range(12):
+            x1, x2 = sorted(int(value) for value in rng.integers(0, width, 2))
+            y1, y2 = sorted(int(value) for value in rng.integers(0, height, 2))
+            color = tuple(int(value) for value in rng.integers(0, 256, 3))
+            if rng.random() < 0.5:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+            else:
+                cv2.line(frame, (x1, y1), (x2, y2), color, int(rng.integers(1, 8)))
+        frames.append(frame)
+    return frames
+
+def set_threads(threads: int):
+    """Intra-op threads for torch and OpenCV, as INFERENCE_THREADS_PER_WORKER sets them per worker"""
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+def time_calls(function: Callable[[], object], iterations: int, warmup: int) -> tuple:
+    for _ in range(warmup):
+        function()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - call_started)
+    return latencies, time.perf_counter() - started
+
+def run(
+    backends: Sequence[str] = ("eager",),
+    batch_sizes: Sequence[int] = (1, 8, 16),
+    threads: Sequence[int] = (1,),
+    iterations: int = 20,
+    warmup: int = 3,
+    seed: int = 0,
+    model_path: str = "models/accident_detector.pt"
+) -> List[dict]:
+    """Time preprocessing and prediction for every backend, batch size and thread count
+
+    Throughput is images per second; latency is per call, so one batch.
+    A backend that fails to build or drifts from eager falls back to eager
+    inside AccidentDetector; the result's params record the backend that ran.
+    """
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        raise ValueError(f"Unknown inference backends: {', '.join(sorted(unknown))}")
+
+    frames = synthetic_frames(max(batch_sizes), seed)
+    previous_threads = torch.get_num_threads(), cv2.getNumThreads()
+    results = []
+    try:
+        for thread_count in threads:
+            set_threads(thread_count)
+            for backend in backends:
+                torch.manual_seed(seed)
+                detector = AccidentDetector(model_path, backend=backend)
+                for batch_size in batch_sizes:
+                    batch = frames[:batch_size]
+                    params = {"backend": backend, "batch_size": batch_size, "threads": thread_count}
+
+                    # Preprocessing doesn't depend on the backend; time it once per thread count
+                    if backend == backends[0]:
+                        name = f"detector.preprocess[batch={batch_size},threads={thread_count}]"
+                        preprocess = (lambda: detector.preprocess_image(batch[0])) if batch_size == 1 else (lambda: detector.preprocess_batch(batch))
+                        latencies, elapsed = time_calls(preprocess, iterations, warmup)
+                        preprocess_params = {"batch_size": batch_size, "threads": thread_count}
+                        results.append(summarize(name, "detector", preprocess_params, latencies, elapsed, batch_size * iterations))
+                        logger.info(f"{name}: {results[-1]['throughput']} images/s")
+
+                    name = f"detector.predict[backend={backend},batch={batch_size},threads={thread_count}]"
+                    predict = (lambda: detector.predict(batch[0])) if batch_size == 1 else (lambda: detector.predict_batch(batch))
+                    latencies, elapsed = time_calls(predict, iterations, warmup)
+                    params["backend_used"] = detector.backend.name
+                    results.append(summarize(name, "detector", params, latencies, elapsed, batch_size * iterations))
+                    logger.info(f"{name}: {results[-1]['throughput']} images/s")
+
+                # The default model's weights are large; free them before building the next backend
+                del detector
+                gc.collect()
+    finally:
+        torch.set_num_threads(previous_threads[0])
+        cv2.setNumThreads(previous_threads[1])
+    return results
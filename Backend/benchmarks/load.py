@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+import cv2
+import httpx
+from loguru import logger
+from .detector import synthetic_frames
+from .report import summarize
+
+# Settings forced for an in-process run: in-memory tables instead of Supabase,
+# no geocoding requests, media and journals kept in a scratch directory.
+# Anything else (executor, batching, caches) comes from the environment as usual.
+FAKE_SERVICES = {
+    "DATABASE_BACKEND": "memory",
+    "GEOCODER": "stub",
+    "GEOCODING_CACHE_PATH": "",
+    "PIPELINE_JOURNAL_PATH": "",
+    "MEDIA_STORAGE": "local",
+    "SOCKET_MANAGER": "memory",
+}
+# Cities the synthetic incidents cluster around, (latitude, longitude)
+CENTERS = [(6.9271, 79.8612), (7.2906, 80.6337), (6.0535, 80.2210), (9.6615, 80.0255)]
+SEVERITIES = ["low", "medium", "high", "critical"]
+STATUSES = ["pending", "in_progress", "resolved"]
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+def configure_environment(directory: str) -> Dict[str, str]:
+    """Point the app at fake services; must run before the app modules are imported"""
+    settings = dict(FAKE_SERVICES, UPLOAD_DIR=os.path.join(directory, "uploads"), MEDIA_LOCAL_DIR=os.path.join(directory, "media"))
+    os.environ.update(settings)
+    return settings
+
+def synthetic_incidents(count: int, seed: int = 0, days: int = 30) -> List[dict]:
+    """Incidents spread over the last days around a few cities, the same for a given seed"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    incidents = []
+    for _ in range(count):
+        latitude, longitude = rng.choice(CENTERS)
+        created_at = (now - timedelta(seconds=rng.uniform(0, days * 86400))).isoformat()
+        incidents.append({
+            "user_id": USER_ID,
+            "location": "Synthetic incident",
+            "latitude": round(latitude + rng.gauss(0, 0.02), 6),
+            "longitude": round(longitude + rng.gauss(0, 0.02), 6),
+            "description": "Benchmark incident",
+            "severity": rng.choice(SEVERITIES),
+            "status": rng.choice(STATUSES),
+            "image_url": None,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return incidents
+
+def synthetic_jpegs(count: int, seed: int = 0) -> List[bytes]:
+    return [cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes() for frame in synthetic_frames(count, seed)]
+
+def scenarios(images: List[bytes], seed: int = 0) -> Dict[str, Callable[[int], dict]]:
+    """Request builders by scenario name; each takes the request number and returns httpx.request arguments"""
+    rng = random.Random(seed)
+    latitude, longitude = CENTERS[0]
+    bbox = {"min_lat": latitude - 0.05, "min_lon": longitude - 0.05, "max_lat": latitude + 0.05, "max_lon": longitude + 0.05}
+
+    def predict(index: int) -> dict:
+        # A different image every request, so the prediction cache doesn't answer
+        return {
+            "method": "POST",
+            "url": "/api/incidents/predict",
+            "files": {"file": (f"frame-{index}.jpg", images[index % len(images)], "image/jpeg")},
+            "data": {"latitude": str(latitude), "longitude": str(longitude)},
+        }
+
+    def predict_cached(index: int) -> dict:
+        return {
+            "method": "POST",
+            "url": "/api/incidents/predict",
+            "files": {"file": ("frame.jpg", images[0], "image/jpeg")},
+        }
+
+    def create(index: int) -> dict:
+        center = rng.choice(CENTERS)
+        return {
+            "method": "POST",
+            "url": "/api/incidents/",
+            "json": {
+                "location": "Synthetic incident",
+                "latitude": center[0] + rng.gauss(0, 0.02),
+                "longitude": center[1] + rng.gauss(0, 0.02),
+                "severity": rng.choice(SEVERITIES),
+            },
+        }
+
+    return {
+        "api.predict": predict,
+        "api.predict.cached": predict_cached,
+        "api.incidents.create": create,
+        "api.incidents.list": lambda index: {"method": "GET", "url": "/api/incidents/", "params": {"limit": 100}},
+        "api.incidents.list.bbox": lambda index: {
+            "method": "GET", "url": "/api/incidents/", "params": dict(bbox, severity="high,critical", limit=100)
+        },
+        "api.analytics.hourly": lambda index: {"method": "GET", "url": "/api/analytics/hourly", "params": {"days": 7}},
+        "api.analytics.severity": lambda index: {"method": "GET", "url": "/api/analytics/severity", "params": {"days": 30}},
+        "api.analytics.hotspots": lambda index: {
+            "method": "GET", "url": "/api/analytics/location-hotspots", "params": {"days": 30, "radius_m": 500}
+        },
+        "api.analytics.nearby": lambda index: {
+            "method": "GET", "url": "/api/analytics/nearby", "params": {"latitude": latitude, "longitude": longitude, "radius_m": 1000}
+        },
+        "api.analytics.export": lambda index: {"method": "GET", "url": "/api/analytics/export", "params": {"format": "csv"}},
+    }
+
+async def drive(client: httpx.AsyncClient, build: Callable[[int], dict], requests: int, concurrency: int, offset: int = 0) -> tuple:
+    """Closed-loop load: concurrency workers send requests back to back until requests are done"""
+    counter = itertools.count(offset)
+    end = offset + requests
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            if index >= end:
+                return
+            arguments = build(index)
+            started = time.perf_counter()
+            try:
+                response = await client.request(**arguments)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started, errors
+
+async def wait_until(check: Callable[[], bool], what: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for {what}")
+        await asyncio.sleep(0.05)
+
+async def run_async(
+    names: Optional[Sequence[str]] = None,
+    requests: int = 200,
+    concurrency: Sequence[int] = (1, 16),
+    incidents: int = 5000,
+    warmup: int = 10,
+    seed: int = 0
+) -> List[dict]:
+    import main
+    from app.auth.auth import User, get_current_user
+    from app.db.database import db
+    from app.db.memory import InMemoryDatabase
+    from app.ml.lifecycle import model_manager
+    from app.services.rollups import incident_rollups
+
+    if not isinstance(db, InMemoryDatabase):
+        raise RuntimeError("Load tests need DATABASE_BACKEND=memory; configure the environment before importing the app")
+
+    # Every request is made by one admin; token checks would otherwise go to Supabase
+    user = User(id=USER_ID, email="benchmark@example.com", role="admin", is_active=True)
+    main.app.dependency_overrides[get_current_user] = lambda: user
+
+    random.seed(seed)
+    await db.insert("incidents", synthetic_incidents(incidents, seed))
+    images = synthetic_jpegs(warmup + requests * len(concurrency), seed)
+    builders = scenarios(images, seed)
+    unknown = set(names or ()) - set(builders)
+    if unknown:
+        raise ValueError(f"Unknown load scenarios: {', '.join(sorted(unknown))}")
+
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        await wait_until(lambda: model_manager.state in ("ready", "failed"), "the model", 300)
+        if not model_manager.ready:
+            raise RuntimeError(f"Model failed to load: {model_manager.error}")
+        await wait_until(lambda: incident_rollups.ready, "the incident rollups", 300)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", headers={"Authorization": "Bearer benchmark"}) as client:
+            for name in names or builders:
+                build = builders[name]
+                offset = 0
+                await drive(client, build, warmup, 1, offset)
+                offset += warmup
+                for workers in concurrency:
+                    latencies, elapsed, errors = await drive(client, build, requests, workers, offset)
+                    offset += requests
+                    params = {"requests": requests, "concurrency": workers, "incidents": incidents}
+                    label = f"{name}[concurrency={workers}]"
+                    results.append(summarize(label, "load", params, latencies, elapsed, len(latencies) - errors, errors))
+                    logger.info(f"{label}: {results[-1]['throughput']} requests/s, {errors} errors")
+    main.app.dependency_overrides.pop(get_current_user, None)
+    return results
+
+def run(**kwargs) -> List[dict]:
+    """Load-test the API in this process against fake services and synthetic data
+
+    Throughput is successful requests per second; latency is per request,
+    measured at the client, so it includes queueing behind other workers.
+    """
+    directory = tempfile.mkdtemp(prefix="sage_guard_bench_")
+    configure_environment(directory)
+    try:
+        return asyncio.run(run_async(**kwargs))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,130 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+# Result fields compared between runs: (key, higher is better)
+COMPARED = [("throughput", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("peak_rss_mb", False)]
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Linearly interpolated percentile (0-100) of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, or None where getrusage is unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def summarize(name: str, suite: str, params: dict, latencies: List[float], elapsed: float, items: int, errors: int = 0) -> dict:
+    """One result row: items per second over the timed run and per-call latency percentiles"""
+    ordered = sorted(latencies)
+    return {
+        "name": name,
+        "suite": suite,
+        "params": params,
+        "count": len(ordered),
+        "errors": errors,
+        "throughput": round(items / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(1000 * sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50_ms": round(1000 * percentile(ordered, 50), 3),
+        "p95_ms": round(1000 * percentile(ordered, 95), 3),
+        "p99_ms": round(1000 * percentile(ordered, 99), 3),
+        "max_ms": round(1000 * ordered[-1], 3) if ordered else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+def environment() -> dict:
+    """What a run depends on, so results from different machines or builds aren't mistaken for regressions"""
+    import numpy as np
+    import torch
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "numpy": np.__version__,
+    }
+
+def write_report(path: str, results: List[dict], settings: dict):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    report = {"environment": environment(), "settings": settings, "results": results}
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+def load_report(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> List[dict]:
+    """Relative change of every compared field for results present in both reports
+
+    A change is a regression when it is worse than threshold (0.1 = 10%).
+    """
+    previous: Dict[str, dict] = {result["name"]: result for result in baseline["results"]}
+    changes = []
+    for result in current["results"]:
+        before = previous.get(result["name"])
+        if before is None:
+            continue
+        for key, higher_is_better in COMPARED:
+            old, new = before.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            changes.append({
+                "name": result["name"],
+                "metric": key,
+                "baseline": old,
+                "current": new,
+                "change": round(change, 4),
+                "regression": worse > threshold,
+            })
+    return changes
+
+def format_results(results: List[dict]) -> str:
+    lines = [f"{'benchmark':<58} {'throughput':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'rss MB':>8}"]
+    for result in results:
+        lines.append(
+            f"{result['name']:<58} {result['throughput']:>12.2f} {result['p50_ms']:>10.2f} "
+            f"{result['p95_ms']:>10.2f} {result['p99_ms']:>10.2f} {result['peak_rss_mb'] or 0:>8.1f}"
+        )
+    return "\n".join(lines)
+
+def format_changes(changes: List[dict]) -> str:
+    lines = [f"{'benchmark':<58} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for change in changes:
+        flag = "  REGRESSION" if change["regression"] else ""
+        lines.append(
+            f"{change['name']:<58} {change['metric']:<12} {change['baseline']:>10.2f} "
+            f"{change['current']:>10.2f} {change['change']:>+8.1%}{flag}"
+        )
+    return "\n".join(lines)
@@ -1,14 +1,29 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
 from loguru import logger
 import socketio
 import uvicorn
+import asyncio
 from typing import List
 import os
+import time
 from dotenv import load_dotenv
+from app.ml.batching import inference_queue
+from app.ml.executor import inference_executor
+from app.ml.lifecycle import model_manager
+from app.ml.cache import prediction_cache
+from app.auth.cache import auth_cache
+from app.metrics import CONTENT_TYPE, REQUEST_SECONDS, stats_exporter
+from app.db.database import db
+from app.services.rollups import incident_rollups
+from app.services.geocoding import geocoding_service
+from app.services.pipeline import job_pipeline
+from app.services.storage import media_storage
+from app.socket import sio
 
 # Load environment variables
 load_dotenv()
@@ -26,15 +41,38 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("Static files directory not found, skipping mount")
     
-    # Initialize ML model
+    # Initialize ML model; /ready reports when loading and warm-up finish
+    model_task = asyncio.create_task(model_manager.start(inference_executor))
+    await inference_queue.start()
+    
     # Initialize database connections
+    try:
+        await db.ping()
+        logger.info("Successfully connected to the database")
+    except Exception as e:
+        logger.error(f"Error connecting to the database: {str(e)}")
+        raise
+    
     # Initialize other services
+    incident_rollups.start()
+    await geocoding_service.start()
+    await job_pipeline.start()
+    stats_exporter.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down Sage Guard API server...")
     # Clean up resources
+    model_task.cancel()
+    await job_pipeline.stop()
+    await sio.manager.scheduler.stop()
+    await inference_queue.stop()
+    await incident_rollups.stop()
+    await db.close()
+    geocoding_service.close()
+    await media_storage.close()
+    await stats_exporter.stop()
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(
@@ -51,6 +89,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+
+# Record request latency by route template, so /api/incidents/{id} is one series
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        template = route.path_format if route is not None else "unmatched"
+        REQUEST_SECONDS.labels(request.method, template, status_code).observe(time.perf_counter() - started)
+
+# Metrics read from the services' own counters at scrape time
+stats_exporter.register(
+    "sage_guard_cache_requests",
+    "Cache lookups by cache and result",
+    lambda: {
+        ("prediction", "hit"): prediction_cache.hits,
+        ("prediction", "near_hit"): prediction_cache.near_hits,
+        ("prediction", "miss"): prediction_cache.misses,
+        ("auth", "hit"): auth_cache.hits,
+        ("auth", "miss"): auth_cache.misses,
+        ("geocoding", "hit"): geocoding_service.cache.hits,
+        ("geocoding", "miss"): geocoding_service.cache.misses,
+        ("geocoding", "gazetteer"): geocoding_service.gazetteer_hits,
+    },
+    ("cache", "result"),
+    kind="counter"
+)
+stats_exporter.register(
+    "sage_guard_socketio_clients",
+    "Socket.IO clients connected to this worker",
+    lambda: len(sio.manager.rooms.get("/", {}).get(None, {}))
+)
+stats_exporter.register(
+    "sage_guard_queue_depth",
+    "Items waiting in each in-process queue",
+    lambda: {
+        ("inference",): inference_queue.depth,
+        ("pipeline",): job_pipeline.depth,
+        ("broadcast",): sio.manager.scheduler.depth,
+    },
+    ("queue",)
+)
+stats_exporter.register(
+    "sage_guard_pipeline_jobs",
+    "Background pipeline jobs by outcome",
+    lambda: {(outcome,): count for outcome, count in job_pipeline.stats.items()},
+    ("outcome",),
+    kind="counter"
+)
+stats_exporter.register(
+    "sage_guard_broadcast_events",
+    "Socket.IO events handled by the broadcast scheduler, by outcome",
+    lambda: {(outcome,): count for outcome, count in sio.manager.scheduler.stats.items()},
+    ("outcome",),
+    kind="counter"
 )
 
 # Configure logging
@@ -59,29 +159,6 @@ logger.add("logs/app.log", rotation="500 MB", retention="10 days")
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Initialize Socket.IO with custom event handlers
-sio = socketio.AsyncServer(
-    async_mode='asgi',
-    cors_allowed_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
-    logger=True,
-    engineio_logger=True
-)
-
-@sio.event
-async def connect(sid, environ):
-    logger.info(f"Client connected: {sid}")
-    await sio.emit('connected', {'data': 'Connected to Sage Guard Socket.IO server'}, room=sid)
-
-@sio.event
-async def disconnect(sid):
-    logger.info(f"Client disconnected: {sid}")
-
-@sio.event
-async def incident(sid, data):
-    logger.info(f"Received incident data from {sid}: {data}")
-    # Broadcast the incident to all connected clients except the sender
-    await sio.emit('incident', data, skip_sid=sid)
-
 # Create ASGI app with Socket.IO
 socket_app = socketio.ASGIApp(sio, app)
 
@@ -90,12 +167,36 @@ socket_app = socketio.ASGIApp(sio, app)
 async def health_check():
     return {"status": "healthy"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    return Response(stats_exporter.render(), media_type=CONTENT_TYPE)
+
+# Readiness check: ready once the model is loaded and warmed up
+@app.get("/ready")
+async def readiness_check():
+    status_code = 200 if model_manager.ready else 503
+    return JSONResponse(status_code=status_code, content=model_manager.status())
+
+# Inference executor load
+@app.get("/health/inference")
+async def inference_health():
+    stats = inference_executor.stats()
+    stats["batch_queue_depth"] = inference_queue.depth
+    stats["batches"] = inference_queue.stats["batches"]
+    stats["images"] = inference_queue.stats["images"]
+    stats["rejected"] = inference_queue.stats["rejected"]
+    stats["prediction_cache"] = prediction_cache.stats()
+    stats["pipeline"] = dict(job_pipeline.stats, queue_depth=job_pipeline.depth)
+    return stats
+
 # Import and include routers
 from app.routers import incidents, analytics, media
 
-app.include_router(incidents.router, prefix="/api/incidents", tags=["incidents"])
-app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
-app.include_router(media.router, prefix="/api/media", tags=["media"])
+# Routers carry their own prefix, so route path templates are complete for metrics
+app.include_router(incidents.router, tags=["incidents"])
+app.include_router(analytics.router, tags=["analytics"])
+app.include_router(media.router, tags=["media"])
 
 if __name__ == "__main__":
     uvicorn.run(socket_app, host="0.0.0.0", port=3001) 
\ No newline at end of file
@@ -0,0 +1,12 @@
+import os
+
+# Keep the app off Supabase, Nominatim and the shared disk while tests import it;
+# load_dotenv never overrides variables that are already set
+os.environ.update({
+    "DATABASE_BACKEND": "memory",
+    "GEOCODER": "stub",
+    "GEOCODING_CACHE_PATH": "",
+    "PIPELINE_JOURNAL_PATH": "",
+    "MEDIA_STORAGE": "local",
+    "SOCKET_MANAGER": "memory",
+})
@@ -0,0 +1,41 @@
+import asyncio
+from app.auth.cache import AuthCache
+
+def test_lookup_in_flight_during_invalidation_is_not_cached():
+    async def run():
+        cache = AuthCache(ttl=60)
+        release = asyncio.Event()
+        roles = iter(["user", "admin"])
+        loads = []
+
+        async def loader():
+            role = next(roles)
+            loads.append(role)
+            if role == "user":
+                await release.wait()
+            return role
+
+        stale = asyncio.create_task(cache.get_or_load("token", "u1", None, loader))
+        await asyncio.sleep(0)
+        # The role changes while the first lookup is still reading the old one
+        cache.invalidate_user("u1")
+        fresh = await cache.get_or_load("token", "u1", None, loader)
+        release.set()
+        return await stale, fresh, await cache.get_or_load("token", "u1", None, loader), loads
+
+    assert asyncio.run(run()) == ("user", "admin", "admin", ["user", "admin"])
+
+def test_concurrent_lookups_share_one_load():
+    async def run():
+        cache = AuthCache(ttl=60)
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            await asyncio.sleep(0)
+            return "user"
+
+        results = await asyncio.gather(*(cache.get_or_load("token", "u1", None, loader) for _ in range(5)))
+        return results, len(loads), cache.stats()["misses"]
+
+    assert asyncio.run(run()) == (["user"] * 5, 1, 1)
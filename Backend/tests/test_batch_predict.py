@@ -0,0 +1,72 @@
+import io
+import json
+import zipfile
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+import main
+from app.auth.auth import User, get_current_user
+from app.ml.batching import InferenceQueueFull
+from app.routers import incidents
+
+USER = User(id="u1", email="user@example.com", role="user", is_active=True)
+
+@pytest.fixture
+def client():
+    main.app.dependency_overrides[get_current_user] = lambda: USER
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.pop(get_current_user, None)
+
+def junk(count):
+    return [("files", (f"{n}.jpg", b"not an image", "image/jpeg")) for n in range(count)]
+
+def archive(count):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for n in range(count):
+            zip_file.writestr(f"{n}.jpg", b"not an image")
+    return [("files", ("images.zip", buffer.getvalue(), "application/zip"))]
+
+def lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_too_many_images_is_a_bad_request(client, monkeypatch):
+    monkeypatch.setattr(incidents, "PREDICT_BATCH_MAX_ITEMS", 2)
+    assert client.post("/api/incidents/predict/batch", files=junk(3)).status_code == 400
+
+def test_archive_over_the_image_limit_fails_before_streaming(client, monkeypatch):
+    monkeypatch.setattr(incidents, "PREDICT_BATCH_MAX_ITEMS", 2)
+    response = client.post("/api/incidents/predict/batch?stream=true", files=archive(3))
+    assert response.status_code == 400
+
+def test_stream_ends_with_a_summary(client):
+    response = client.post("/api/incidents/predict/batch?stream=true", files=junk(2))
+    assert response.status_code == 200
+    *results, summary = lines(response)
+    assert [result["error"] for result in results] == ["Invalid image file"] * 2
+    assert summary == {"summary": {"images": 2, "errors": 2, "complete": True}}
+
+def test_limit_reached_mid_stream_is_reported_in_the_summary(client, monkeypatch):
+    monkeypatch.setattr(incidents, "PREDICT_BATCH_MAX_ITEMS", 2)
+    monkeypatch.setattr(incidents, "PREDICT_BATCH_CHUNK_SIZE", 1)
+    response = client.post("/api/incidents/predict/batch?stream=true", files=junk(3))
+    assert response.status_code == 200
+    summary = lines(response)[-1]["summary"]
+    assert summary["images"] == 2 and not summary["complete"]
+    assert summary["error"] == "Too many images, limit is 2"
+
+@pytest.mark.parametrize("stream", ["false", "true"])
+def test_full_inference_queue_sheds_the_batch(client, monkeypatch, stream):
+    class FullQueue:
+        async def submit_many(self, images):
+            raise InferenceQueueFull("full")
+
+    monkeypatch.setattr(incidents, "inference_queue", FullQueue())
+    ok, image = cv2.imencode(".png", np.random.default_rng(0).integers(0, 255, (8, 8, 3), dtype=np.uint8))
+    files = [("files", ("scene.png", image.tobytes(), "image/png"))]
+    response = client.post(f"/api/incidents/predict/batch?stream={stream}", files=files)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from app.ml.batching import BatchInferenceQueue, InferenceQueueFull
+
+class Executor:
+    """Runs batches only once released, so tests can fill the queue"""
+
+    workers = 1
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.batches = []
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    async def predict_batch(self, images):
+        await self.release.wait()
+        self.batches.append(list(images))
+        return [{"image": image} for image in images]
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_images_submitted_together_are_all_or_nothing():
+    async def run():
+        executor = Executor()
+        queue = BatchInferenceQueue(executor, max_batch_size=1, max_wait_ms=0, max_queue_size=3)
+        await queue.start()
+        # The first image is taken into a batch, which then waits for the executor
+        first = asyncio.create_task(queue.submit_many([0]))
+        await settle()
+        waiting = asyncio.create_task(queue.submit_many([1, 2]))
+        await settle()
+        with pytest.raises(InferenceQueueFull):
+            await queue.submit_many([3, 4])
+        assert queue.depth == 2 and queue.stats["rejected"] == 2
+
+        executor.release.set()
+        assert await first == [{"image": 0}]
+        assert await waiting == [{"image": 1}, {"image": 2}]
+        await queue.stop()
+        return executor.batches
+
+    assert asyncio.run(run()) == [[0], [1], [2]]
+
+def test_full_queue_sheds_new_requests():
+    async def run():
+        executor = Executor()
+        queue = BatchInferenceQueue(executor, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+        await queue.start()
+        # One request is taken into a batch, two more fill the queue
+        waiting = [asyncio.create_task(queue.submit(0))]
+        await settle()
+        waiting += [asyncio.create_task(queue.submit(n)) for n in (1, 2)]
+        await settle()
+        with pytest.raises(InferenceQueueFull):
+            await queue.submit(3)
+        assert queue.stats["rejected"] == 1
+
+        executor.release.set()
+        assert await asyncio.gather(*waiting) == [{"image": n} for n in range(3)]
+        await queue.stop()
+
+    asyncio.run(run())
+
+def test_stop_fails_requests_being_collected_and_queued():
+    async def run():
+        executor = Executor()
+        # A long wait keeps the worker collecting the first request's batch
+        queue = BatchInferenceQueue(executor, max_batch_size=4, max_wait_ms=10000, max_queue_size=8)
+        await queue.start()
+        collecting = asyncio.create_task(queue.submit(0))
+        await settle()
+        await queue.stop()
+        with pytest.raises(RuntimeError, match="stopped"):
+            await asyncio.wait_for(collecting, 1)
+        assert executor.batches == []
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+import asyncio
+from app.services.broadcast import BroadcastScheduler
+
+class Participants:
+    """Just the part of a Socket.IO manager the scheduler reads: who is in a room"""
+
+    server = None
+
+    def __init__(self, sids):
+        self.sids = sids
+
+    def get_participants(self, namespace, room):
+        return [(sid, f"eio-{sid}") for sid in self.sids]
+
+class RecordingScheduler(BroadcastScheduler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    async def _deliver(self, event, data, namespace, sid):
+        self.stats["messages"] += 1
+        self.sent.append((sid, event, data))
+
+def run(scheduler, enqueue):
+    async def go():
+        enqueue()
+        await scheduler.stop()
+    asyncio.run(go())
+    return scheduler.sent
+
+def test_newer_event_for_an_incident_replaces_the_queued_one():
+    scheduler = RecordingScheduler(Participants(["a"]), window=60)
+    sent = run(scheduler, lambda: [
+        scheduler.enqueue("incident", {"id": 1, "status": "pending"}, "/"),
+        scheduler.enqueue("incident", {"id": 1, "status": "resolved"}, "/"),
+        scheduler.enqueue("incident", {"id": 2, "status": "pending"}, "/"),
+    ])
+    assert sent == [("a", "incident", {"id": 1, "status": "resolved"}), ("a", "incident", {"id": 2, "status": "pending"})]
+    assert scheduler.stats["merged"] == 1
+
+def test_full_queue_drops_the_oldest_and_reports_it():
+    scheduler = RecordingScheduler(Participants(["a"]), window=60, max_queue=2)
+    sent = run(scheduler, lambda: [scheduler.enqueue("new_incident", {"id": i}, "/") for i in range(4)])
+    assert sent == [
+        ("a", "events_dropped", {"count": 2}),
+        ("a", "new_incident", {"id": 2}),
+        ("a", "new_incident", {"id": 3}),
+    ]
+    assert scheduler.stats["dropped"] == 2
+
+def test_batching_clients_get_one_message_per_event():
+    scheduler = RecordingScheduler(Participants(["a", "b"]), window=60)
+    scheduler.configure("a", batch=True)
+    sent = run(scheduler, lambda: [scheduler.enqueue("new_incident", {"id": i}, "/", skip_sid="c") for i in range(3)])
+    assert ("a", "new_incident_batch", [{"id": 0}, {"id": 1}, {"id": 2}]) in sent
+    assert [event for sid, event, _ in sent if sid == "b"] == ["new_incident"] * 3
+
+def test_skipped_sender_gets_nothing():
+    scheduler = RecordingScheduler(Participants(["a", "b"]), window=60)
+    sent = run(scheduler, lambda: scheduler.enqueue("new_incident", {"id": 1}, "/", skip_sid="a"))
+    assert [sid for sid, _, _ in sent] == ["b"]
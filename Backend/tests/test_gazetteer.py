@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from app.services.gazetteer import Gazetteer
+from app.services.hotspots import haversine_m
+
+PLACES = [
+    # name, latitude, longitude, feature class, country, population
+    ("Colombo", 6.9271, 79.8612, "P", "LK", 648034),
+    ("Dehiwala", 6.8511, 79.8659, "P", "LK", 245974),
+    ("Kandy", 7.2906, 80.6337, "P", "LK", 125400),
+    ("Adams Peak", 6.8096, 80.4994, "T", "LK", 0),
+    ("Suva", -18.1416, 178.4419, "P", "FJ", 93970),
+    ("Taveuni", -16.85, -179.95, "P", "FJ", 12000),
+]
+
+def geonames_line(name, latitude, longitude, feature_class, country, population):
+    fields = [""] * 19
+    fields[1], fields[4], fields[5], fields[6], fields[8], fields[14] = name, str(latitude), str(longitude), feature_class, country, str(population)
+    return "\t".join(fields) + "\n"
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    path = tmp_path / "cities.txt"
+    path.write_text("".join(geonames_line(*place) for place in PLACES), encoding="utf-8")
+    return Gazetteer.load(str(path), str(tmp_path / "index"), cell_deg=0.25)
+
+def test_nearest_matches_a_full_scan(gazetteer):
+    populated = [place for place in PLACES if place[3] == "P"]
+    latitude = np.array([place[1] for place in populated])
+    longitude = np.array([place[2] for place in populated])
+    rng = np.random.default_rng(0)
+    for query_lat, query_lon in zip(rng.uniform(6.7, 7.4, 50), rng.uniform(79.7, 80.8, 50)):
+        distances = haversine_m(latitude, longitude, query_lat, query_lon)
+        place = gazetteer.nearest(query_lat, query_lon)
+        expected = int(np.argmin(distances))
+        if distances[expected] > gazetteer.max_distance_m:
+            assert place is None
+        else:
+            assert place["name"] == populated[expected][0]
+
+def test_nearest_skips_places_that_are_not_populated(gazetteer):
+    # Adams Peak itself is a mountain, not a place
+    place = gazetteer.nearest(6.8096, 80.4994)
+    assert place is None or place["name"] != "Adams Peak"
+
+def test_nearest_looks_across_the_antimeridian(gazetteer):
+    place = gazetteer.nearest(-16.85, 179.99)
+    assert place["name"] == "Taveuni" and place["country"] == "FJ"
+    assert place["distance_km"] < 10
+
+def test_nothing_within_the_maximum_distance(gazetteer):
+    assert gazetteer.nearest(0.0, 0.0) is None
@@ -0,0 +1,31 @@
+import asyncio
+import time
+from app.services.geocoding import TokenBucket
+
+def test_burst_is_immediate():
+    async def run():
+        bucket = TokenBucket(rate=1, burst=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - started
+    assert asyncio.run(run()) < 0.1
+
+def test_calls_past_the_burst_wait_for_tokens():
+    async def run():
+        bucket = TokenBucket(rate=20, burst=1)
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+        return time.monotonic() - started
+    # Four refills at 20 per second
+    assert 0.18 <= asyncio.run(run()) < 0.5
+
+def test_tokens_refill_up_to_the_burst():
+    async def run():
+        bucket = TokenBucket(rate=100, burst=2)
+        await bucket.acquire()
+        await bucket.acquire()
+        await asyncio.sleep(0.1)
+        await bucket.acquire()
+        return bucket.tokens
+    assert asyncio.run(run()) <= 1
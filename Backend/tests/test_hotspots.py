@@ -0,0 +1,73 @@
+import numpy as np
+from app.services.hotspots import HotspotEngine, cluster, haversine_m
+
+def offsets(latitude, longitude, metres):
+    """Points due north of a location at the given distances"""
+    return np.full(len(metres), latitude) + np.array(metres) / 111195.0, np.full(len(metres), longitude)
+
+def test_nearby_points_form_one_cluster():
+    latitude, longitude = offsets(6.9271, 79.8612, [0, 20, 40, 60])
+    labels = cluster(latitude, longitude, radius_m=50, min_incidents=3)
+    assert len(set(labels)) == 1 and labels[0] >= 0
+
+def test_distant_groups_are_separate_clusters():
+    lat_a, lon_a = offsets(6.9271, 79.8612, [0, 10, 20])
+    lat_b, lon_b = offsets(7.2906, 80.6337, [0, 10, 20])
+    labels = cluster(np.concatenate([lat_a, lat_b]), np.concatenate([lon_a, lon_b]), radius_m=50, min_incidents=3)
+    assert len(set(labels[:3])) == 1 and len(set(labels[3:])) == 1
+    assert labels[0] != labels[3]
+    assert (labels >= 0).all()
+
+def test_isolated_point_is_noise():
+    latitude, longitude = offsets(6.9271, 79.8612, [0, 10, 20, 5000])
+    labels = cluster(latitude, longitude, radius_m=50, min_incidents=3)
+    assert labels[3] == -1
+    assert (labels[:3] >= 0).all()
+
+def test_no_points():
+    assert len(cluster(np.empty(0), np.empty(0), radius_m=50, min_incidents=1)) == 0
+
+def test_haversine_matches_a_known_distance():
+    # One degree of latitude
+    assert abs(haversine_m(np.array([0.0]), np.array([0.0]), 1.0, 0.0)[0] - 111195) < 5
+
+def engine_with_points(count, seed=0):
+    rng = np.random.default_rng(seed)
+    latitude = 6.9271 + rng.normal(0, 0.01, count)
+    longitude = 79.8612 + rng.normal(0, 0.01, count)
+    timestamp = rng.uniform(0, 1000, count)
+    engine = HotspotEngine(radius_m=50, min_incidents=3)
+    for n in range(count):
+        engine.add(str(n), latitude[n], longitude[n], timestamp[n], "Colombo")
+    return engine, latitude, longitude, timestamp
+
+def test_nearby_matches_a_full_scan():
+    # More points than INDEX_TAIL_MIN, so both the sorted index and its unsorted tail are queried
+    engine, latitude, longitude, timestamp = engine_with_points(3000)
+    for n in range(0, 3000, 300):
+        engine.remove(str(n))
+    live = np.ones(3000, dtype=bool)
+    live[::300] = False
+    for radius in (30, 250, 2000):
+        for center in range(5):
+            in_window = live & (timestamp >= 100) & (timestamp <= 900)
+            distances = haversine_m(latitude[in_window], longitude[in_window], latitude[center], longitude[center])
+            expected = int(np.count_nonzero(distances <= radius))
+            assert engine.nearby(latitude[center], longitude[center], radius, 100, 900) == expected
+
+def test_compaction_keeps_the_index_consistent():
+    engine, latitude, longitude, _ = engine_with_points(1500)
+    for n in range(0, 1500, 2):
+        engine.remove(str(n))
+    engine.compact()
+    distances = haversine_m(latitude[1::2], longitude[1::2], latitude[1], longitude[1])
+    assert engine.nearby(latitude[1], longitude[1], 500, 0, 1000) == int(np.count_nonzero(distances <= 500))
+
+def test_bounding_box_hotspots_cluster_only_the_points_inside():
+    engine, latitude, longitude, _ = engine_with_points(2000)
+    bbox = (6.92, 79.855, 6.935, 79.87)
+    hotspots = engine.hotspots(0, 1000, limit=1000, bbox=bbox)
+    inside = (latitude >= bbox[0]) & (latitude <= bbox[2]) & (longitude >= bbox[1]) & (longitude <= bbox[3])
+    labels = cluster(latitude[inside], longitude[inside], radius_m=50, min_incidents=3)
+    assert sum(hotspot["count"] for hotspot in hotspots) == int(np.count_nonzero(labels >= 0))
+    assert len(hotspots) == len(set(labels[labels >= 0]))
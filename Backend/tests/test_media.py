@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+from pathlib import Path
+import pytest
+from fastapi.testclient import TestClient
+import main
+from app.auth.auth import User, get_current_user
+from app.db.memory import InMemoryDatabase
+from app.db.repositories import MediaRepository
+from app.services.media import MediaLibrary
+from app.services.storage import LocalStorage
+from app.services.uploads import SpooledUpload
+
+USER = User(id="u1", email="user@example.com", role="user", is_active=True)
+
+@pytest.fixture
+def client():
+    main.app.dependency_overrides[get_current_user] = lambda: USER
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.pop(get_current_user, None)
+
+@pytest.mark.parametrize("path", ["u1/zz.jpg", "u1/", "u1/" + "A" * 64 + ".jpg", "u1/" + "0" * 63 + ".jpg"])
+def test_deleting_a_malformed_digest_is_not_found(client, path):
+    assert client.delete(f"/api/media/{path}").status_code == 404
+
+def test_describing_a_malformed_digest_is_not_found(client):
+    assert client.get("/api/media/objects/not-a-digest").status_code == 404
+
+class Pipeline:
+    def __init__(self):
+        self.jobs = []
+
+    def register(self, kind, stages, on_failure=None):
+        pass
+
+    async def submit(self, kind, payload):
+        self.jobs.append((kind, payload))
+
+@pytest.fixture
+def library(tmp_path):
+    storage = LocalStorage(str(tmp_path / "storage"))
+    return MediaLibrary(MediaRepository(InMemoryDatabase()), storage, Pipeline(), str(tmp_path / "derivatives"))
+
+def spooled(tmp_path, name, content=b"same bytes"):
+    path = tmp_path / name
+    path.write_bytes(content)
+    digest = hashlib.sha256(content).hexdigest()
+    return SpooledUpload(str(path), len(content), digest, "image/jpeg", "jpg")
+
+def stored_files(library):
+    return [path for path in Path(library.storage.root).rglob("*") if path.is_file()]
+
+def test_shared_object_is_deleted_with_its_last_reference(library, tmp_path):
+    async def scenario():
+        first = await library.add(spooled(tmp_path, "a"), "u1", "a.jpg")
+        second = await library.add(spooled(tmp_path, "b"), "u2", "b.jpg")
+        assert first["created"] and not second["created"]
+        assert library.stats["stored"] == 1 and library.stats["deduplicated"] == 1
+        assert len(library.pipeline.jobs) == 1
+
+        assert await library.remove("u1", first["sha256"])
+        assert len(stored_files(library)) == 1
+        assert not await library.remove("u1", first["sha256"])
+        assert await library.remove("u2", first["sha256"])
+        assert stored_files(library) == []
+        assert await library.repository.get_object(first["sha256"]) is None
+
+    asyncio.run(scenario())
+
+def test_content_added_again_after_deletion_is_stored_under_a_new_key(library, tmp_path):
+    async def scenario():
+        first = await library.add(spooled(tmp_path, "a"), "u1", "a.jpg")
+        assert await library.remove("u1", first["sha256"])
+        second = await library.add(spooled(tmp_path, "b"), "u1", "b.jpg")
+        assert second["created"] and second["key"] != first["key"]
+        assert [path.name for path in stored_files(library)] == [second["key"].rsplit("/", 1)[1]]
+
+    asyncio.run(scenario())
+
+def test_object_deleted_by_another_worker_is_stored_again(library, tmp_path):
+    async def scenario():
+        upload = spooled(tmp_path, "a")
+        stale = await library.add(upload, "u1", "a.jpg")
+        # Another worker released the last reference after this one's lookup
+        add_ref = library.repository.add_ref
+        async def deleted_first(user_id, sha256, filename):
+            library.repository.add_ref = add_ref
+            await library.repository.delete_ref("u1", sha256)
+            await library.repository.delete_object(sha256)
+            return False
+        library.repository.add_ref = deleted_first
+
+        media_object = await library.add(spooled(tmp_path, "b"), "u2", "b.jpg")
+        assert media_object["created"] and media_object["key"] != stale["key"]
+        assert await library.repository.get_ref("u2", upload.sha256) is not None
+
+    asyncio.run(scenario())
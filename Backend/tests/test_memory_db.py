@@ -0,0 +1,24 @@
+import asyncio
+import pytest
+from app.db.database import DatabaseError
+from app.db.memory import InMemoryDatabase
+
+def test_duplicate_id_is_a_conflict():
+    async def run():
+        db = InMemoryDatabase()
+        await db.insert("incidents", [{"id": "a"}])
+        with pytest.raises(DatabaseError) as error:
+            await db.insert("incidents", [{"id": "b"}, {"id": "a"}])
+        return error.value.status_code, [row["id"] for row in db.tables["incidents"]]
+
+    # The failed insert stores none of its rows
+    assert asyncio.run(run()) == (409, ["a"])
+
+def test_duplicate_ids_within_one_insert_conflict():
+    async def run():
+        db = InMemoryDatabase()
+        with pytest.raises(DatabaseError) as error:
+            await db.insert("incidents", [{"id": "a"}, {"id": "a"}])
+        return error.value.status_code, db.tables.get("incidents", [])
+
+    assert asyncio.run(run()) == (409, [])
@@ -0,0 +1,41 @@
+import asyncio
+import base64
+import json
+import pytest
+from fastapi.testclient import TestClient
+import main
+from app.auth.auth import User, get_current_user
+from app.db.repositories import incident_repository
+from app.routers.incidents import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2024-05-01T10:00:00+00:00", "3f2a")
+    assert decode_cursor(cursor) == ("2024-05-01T10:00:00+00:00", "3f2a")
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor("2024-05-01T10:00:00.123456+00:00", "a" * 36)
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b"{}").decode(),
+    base64.urlsafe_b64encode(b'["only one"]').decode(),
+    base64.urlsafe_b64encode(b'[1, "id"]').decode(),
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_projected_page_returns_only_the_requested_fields():
+    main.app.dependency_overrides[get_current_user] = lambda: User(id="u1", email="user@example.com", role="user", is_active=True)
+    try:
+        client = TestClient(main.app)
+        asyncio.run(incident_repository.db.insert("incidents", [{"user_id": "u1", "severity": "high", "status": "reported"}]))
+        response = client.get("/api/incidents/", params={"fields": "severity", "limit": 1})
+        documented = client.get("/openapi.json").json()["paths"]["/api/incidents/"]["get"]["responses"]["200"]
+    finally:
+        main.app.dependency_overrides.pop(get_current_user, None)
+    assert response.status_code == 200
+    assert [set(incident) for incident in response.json()] == [{"id", "created_at", "severity"}]
+    assert "IncidentResponse" in json.dumps(documented) and "requested fields" in documented["description"]
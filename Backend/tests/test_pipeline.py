@@ -0,0 +1,150 @@
+import asyncio
+from app.services.pipeline import Job, JobJournal, JobPipeline
+
+async def until(check, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not check():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_failed_stage_is_retried_and_later_stages_run_once():
+    calls = {"flaky": 0, "after": 0}
+
+    async def flaky(job):
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise RuntimeError("not yet")
+
+    async def after(job):
+        calls["after"] += 1
+
+    async def run():
+        pipeline = JobPipeline(workers=1, backoff=0.001)
+        pipeline.register("job", [("flaky", flaky), ("after", after)])
+        await pipeline.start()
+        await pipeline.submit("job", {})
+        await until(lambda: pipeline.stats["completed"] == 1)
+        await pipeline.stop()
+        return pipeline.stats
+
+    stats = asyncio.run(run())
+    assert calls == {"flaky": 3, "after": 1}
+    assert stats["retried"] == 2 and stats["failed"] == 0
+
+def test_exhausted_job_calls_its_failure_handler():
+    failed = []
+
+    async def broken(job):
+        raise RuntimeError("always")
+
+    async def on_failure(job):
+        failed.append(job.payload)
+
+    async def run():
+        pipeline = JobPipeline(workers=1, max_attempts=2, backoff=0.001)
+        pipeline.register("job", [("broken", broken)], on_failure=on_failure)
+        await pipeline.start()
+        await pipeline.submit("job", {"n": 1})
+        await until(lambda: pipeline.stats["failed"] == 1)
+        await pipeline.stop()
+
+    asyncio.run(run())
+    assert failed == [{"n": 1}]
+
+def test_cancelled_stage_does_not_stop_the_worker():
+    async def cancelled(job):
+        if job.payload["cancel"]:
+            raise asyncio.CancelledError()
+
+    async def run():
+        pipeline = JobPipeline(workers=1, max_attempts=1, backoff=0.001)
+        pipeline.register("job", [("cancelled", cancelled)])
+        await pipeline.start()
+        await pipeline.submit("job", {"cancel": True})
+        await pipeline.submit("job", {"cancel": False})
+        await until(lambda: pipeline.stats["completed"] == 1)
+        await pipeline.stop()
+        return pipeline.stats
+
+    assert asyncio.run(run())["failed"] == 1
+
+def test_journaled_job_resumes_at_its_stage(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    journal = JobJournal(path)
+    # A job whose first stage finished before the process stopped
+    journal.save(Job("job", {"uploaded": True}, id="resumed", stage=1))
+    journal.release()
+    journal.close()
+    ran = []
+
+    async def upload(job):
+        ran.append(("upload", job.id))
+
+    async def insert(job):
+        ran.append(("insert", job.id, job.payload["uploaded"]))
+
+    async def run():
+        pipeline = JobPipeline(workers=1, journal_path=path)
+        pipeline.register("job", [("upload", upload), ("insert", insert)])
+        await pipeline.start()
+        await until(lambda: pipeline.stats["completed"] == 1)
+        await pipeline.stop()
+
+    asyncio.run(run())
+    assert ran == [("insert", "resumed", True)]
+    journal = JobJournal(path)
+    assert journal.pending() == []
+    journal.close()
+
+def test_failed_job_stays_in_the_journal_but_is_not_replayed(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def broken(job):
+        raise RuntimeError("always")
+
+    async def run():
+        pipeline = JobPipeline(workers=1, max_attempts=1, journal_path=path)
+        pipeline.register("job", [("broken", broken)])
+        await pipeline.start()
+        await pipeline.submit("job", {})
+        await until(lambda: pipeline.stats["failed"] == 1)
+        await pipeline.stop()
+
+    asyncio.run(run())
+    journal = JobJournal(path)
+    assert journal.pending() == []
+    assert journal._db.execute("select count(*) from jobs where failed = 1").fetchone()[0] == 1
+    journal.close()
+
+def test_workers_sharing_a_journal_replay_each_job_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    journal = JobJournal(path, owner="crashed", lease=-1)
+    for n in range(6):
+        journal.save(Job("job", {"n": n}))
+    journal.close()
+    ran = []
+
+    async def record(job):
+        ran.append(job.payload["n"])
+
+    async def run():
+        pipelines = [JobPipeline(workers=1, journal_path=path) for _ in range(3)]
+        for pipeline in pipelines:
+            pipeline.register("job", [("record", record)])
+        await asyncio.gather(*(pipeline.start() for pipeline in pipelines))
+        await until(lambda: len(ran) == 6)
+        await asyncio.gather(*(pipeline.stop() for pipeline in pipelines))
+
+    asyncio.run(run())
+    assert sorted(ran) == list(range(6))
+
+def test_jobs_of_a_live_worker_are_not_claimed(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    live = JobJournal(path, owner="live")
+    live.save(Job("job", {}, id="held"))
+    other = JobJournal(path, owner="other")
+    assert other.claim() == []
+    live.release()
+    assert [job.id for job in other.claim()] == ["held"]
+    live.close()
+    other.close()
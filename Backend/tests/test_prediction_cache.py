@@ -0,0 +1,70 @@
+import time
+import pytest
+from app.ml.cache import PredictionCache, location_scope
+
+PREDICTION = {"isAccident": True, "confidence": 0.9, "label": "Accident"}
+PHASH = 0x0123456789ABCDEF
+
+def test_exact_duplicate_hits():
+    cache = PredictionCache()
+    cache.put("digest", PHASH, PREDICTION)
+    assert cache.get("digest", PHASH).prediction == PREDICTION
+    assert (cache.hits, cache.misses) == (1, 0)
+
+def test_near_duplicate_matches_within_scope_only():
+    cache = PredictionCache(max_distance=4)
+    scope = location_scope(6.9271, 79.8612)
+    cache.put("first", PHASH, PREDICTION, scope)
+    similar = PHASH ^ 0b101
+
+    assert cache.get("second", similar, scope) is not None
+    assert cache.near_hits == 1
+    assert cache.get("second", similar, location_scope(7.2906, 80.6337)) is None
+    assert cache.get("second", similar) is None
+
+def test_distant_hash_misses():
+    cache = PredictionCache(max_distance=4)
+    scope = location_scope(6.9271, 79.8612)
+    cache.put("first", PHASH, PREDICTION, scope)
+    assert cache.get("second", PHASH ^ 0xFF, scope) is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_size=2)
+    cache.put("a", 1, PREDICTION)
+    cache.put("b", 2, PREDICTION)
+    cache.get("a", 1)
+    cache.put("c", 3, PREDICTION)
+    assert cache.get("b", 2) is None
+    assert cache.get("a", 1) is not None
+    assert cache.evictions == 1
+
+def test_expired_entry_misses():
+    cache = PredictionCache(ttl=0.01)
+    cache.put("digest", PHASH, PREDICTION)
+    time.sleep(0.02)
+    assert cache.get("digest", PHASH) is None
+
+def test_incident_is_reserved_once_and_kept_after_confirm():
+    cache = PredictionCache()
+    entry = cache.put("digest", PHASH, PREDICTION)
+    incident_id, new = cache.reserve_incident(entry)
+    assert new
+    assert cache.reserve_incident(entry) == (incident_id, False)
+
+    cache.confirm_incident(entry.key, incident_id)
+    assert entry.incident_id == incident_id
+    cache.release_incident(entry.key, incident_id)
+    assert cache.reserve_incident(entry) == (incident_id, False)
+
+def test_released_incident_is_reserved_again():
+    cache = PredictionCache()
+    entry = cache.put("digest", PHASH, PREDICTION)
+    incident_id, _ = cache.reserve_incident(entry)
+    cache.release_incident(entry.key, incident_id)
+    retry_id, new = cache.reserve_incident(entry)
+    assert new and retry_id != incident_id
+    assert entry.incident_id is None
+
+def test_max_distance_must_fit_the_bands():
+    with pytest.raises(ValueError):
+        PredictionCache(max_distance=8)
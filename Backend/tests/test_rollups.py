@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from app.db.repositories import IncidentRepository
+from app.db.memory import InMemoryDatabase
+from app.services.hotspots import HotspotEngine
+from app.services.rollups import IncidentRollups
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+def incident(id, minutes_ago, severity="high"):
+    return {
+        "id": id, "created_at": (NOW - timedelta(minutes=minutes_ago)).isoformat(), "severity": severity,
+        "latitude": 6.9271, "longitude": 79.8612, "location": "Colombo",
+    }
+
+def setup(*rows):
+    db = InMemoryDatabase({"incidents": list(rows)})
+    rollups = IncidentRollups(IncidentRepository(db), HotspotEngine(), overlap_seconds=600)
+    return db, rollups
+
+def severities(rollups):
+    return {row["severity"]: row["count"] for row in rollups.severity_counts(NOW - timedelta(days=1), NOW)}
+
+def test_refresh_counts_late_rows_inside_the_overlap_once():
+    async def run():
+        db, rollups = setup(incident("a", 60), incident("b", 5))
+        await rollups.reconcile()
+        # Only the ids inside the 10 minute overlap are remembered
+        assert set(rollups._recent) == {"b"}
+
+        # Another worker commits a row created before the high-water mark
+        db.tables["incidents"].append(incident("c", 8, "low"))
+        await rollups.refresh()
+        await rollups.refresh()
+        return severities(rollups)
+
+    assert asyncio.run(run()) == {"high": 2, "low": 1}
+
+def test_local_writes_are_not_counted_again_by_scans():
+    async def run():
+        db, rollups = setup(incident("a", 60))
+        await rollups.reconcile()
+        created = incident("b", 1)
+        db.tables["incidents"].append(created)
+        rollups.record_created([created])
+        await rollups.refresh()
+
+        updated = dict(created, severity="low")
+        db.tables["incidents"][-1] = updated
+        rollups.record_updated(created, updated)
+        await rollups.refresh()
+        counts = severities(rollups)
+
+        db.tables["incidents"].pop(0)
+        rollups.record_deleted(incident("a", 60))
+        await rollups.refresh()
+        return counts, severities(rollups)
+
+    assert asyncio.run(run()) == ({"high": 1, "low": 1}, {"low": 1})
+
+def test_reconcile_drops_rows_deleted_elsewhere():
+    async def run():
+        db, rollups = setup(incident("a", 60), incident("b", 30, "low"))
+        await rollups.reconcile()
+        db.tables["incidents"] = [row for row in db.tables["incidents"] if row["id"] != "a"]
+        await rollups.reconcile()
+        return severities(rollups), rollups.hotspots.nearby(6.9271, 79.8612, 10, 0, NOW.timestamp())
+
+    assert asyncio.run(run()) == ({"low": 1}, 1)
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import time
+import pytest
+from app.services.uploads import UploadError, UploadSessions, spool
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(24)
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+def spool_error(tmp_path, *chunks, max_size=None):
+    with pytest.raises(UploadError) as error:
+        asyncio.run(spool(stream(*chunks), max_size, str(tmp_path)))
+    # A rejected stream leaves no spooled file behind
+    assert os.listdir(tmp_path) == []
+    return error.value.status_code
+
+def test_spool_hashes_and_sniffs(tmp_path):
+    upload = asyncio.run(spool(stream(PNG[:10], PNG[10:]), directory=str(tmp_path)))
+    assert (upload.content_type, upload.extension, upload.size) == ("image/png", "png", len(PNG))
+    assert open(upload.path, "rb").read() == PNG
+
+def test_spool_rejects_unknown_content(tmp_path):
+    assert spool_error(tmp_path, b"plain text, not an image") == 415
+
+def test_spool_rejects_short_unknown_content(tmp_path):
+    assert spool_error(tmp_path, b"tiny") == 415
+
+def test_spool_rejects_a_stream_past_the_limit(tmp_path):
+    assert spool_error(tmp_path, PNG, PNG, max_size=len(PNG)) == 413
+
+def test_session_being_appended_to_does_not_expire(tmp_path):
+    sessions = UploadSessions(str(tmp_path), ttl=60)
+    active = sessions.create("u1", "clip.mp4", 100)
+    idle = sessions.create("u1", "clip.mp4", 100)
+    asyncio.run(sessions.append(active["id"], "u1", 0, stream(b"x" * 10)))
+    # Both sidecars were written long ago; only the active session's partial file is recent
+    old = time.time() - 120
+    for session in (active, idle):
+        os.utime(sessions._paths(session["id"])[1], (old, old))
+    os.utime(sessions._paths(idle["id"])[0], (old, old))
+
+    sessions.expire()
+    assert sessions.get(active["id"], "u1")["offset"] == 10
+    with pytest.raises(UploadError):
+        sessions.get(idle["id"], "u1")
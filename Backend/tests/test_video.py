@@ -0,0 +1,45 @@
+import asyncio
+import cv2
+import numpy as np
+from app.ml.batching import InferenceQueueFull
+from app.ml.video import AdaptiveFrameSampler, VideoStreamAnalyzer
+
+class BusyQueue:
+    """Turns away the first batches, then scores every frame as an accident"""
+
+    def __init__(self, rejections):
+        self.rejections = rejections
+        self.frames = 0
+
+    async def submit_many(self, images):
+        if self.rejections:
+            self.rejections -= 1
+            raise InferenceQueueFull("full")
+        self.frames += len(images)
+        return [{"confidence": 0.9} for _ in images]
+
+def video(path, frames=40):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (16, 16))
+    for n in range(frames):
+        writer.write(np.full((16, 16, 3), n, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+def test_full_queue_drops_frames_and_widens_the_stride(tmp_path):
+    queue = BusyQueue(rejections=2)
+    analyzer = VideoStreamAnalyzer(queue, batch_size=2, backoff_ms=1)
+    sampler = AdaptiveFrameSampler(frame_skip=0, max_frame_skip=8)
+    strides = []
+    original = sampler.widen
+
+    def widen():
+        original()
+        strides.append(sampler.skip)
+    sampler.widen = widen
+
+    async def run():
+        return [event async for event in analyzer.analyze(video(tmp_path / "feed.avi"), sampler=sampler)]
+
+    events = asyncio.run(run())
+    assert strides == [2, 4]
+    assert queue.frames > 0 and len(events) == 1